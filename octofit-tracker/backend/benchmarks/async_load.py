@@ -0,0 +1,98 @@
+"""
+Load test: async motor views under uvicorn vs the sync WSGI path.
+
+Fires the same number of GET requests at each target with a fixed number in
+flight, and reports throughput and latency percentiles. The client is plain
+asyncio sockets, so it adds no dependencies and does not become the
+bottleneck at a few hundred concurrent requests.
+
+Seed a database and start both servers first (needs a local mongod):
+    python manage.py populate_db --users 2000
+    uvicorn octofit_tracker.asgi:application --port 8001
+    uvicorn octofit_tracker.wsgi:application --interface wsgi --port 8002
+
+Then, from the backend directory:
+    python benchmarks/async_load.py --concurrency 200 --requests 5000
+
+The sync team, leaderboard and workout lists are answered from the response
+cache after the first request; activities compares the uncached paths.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+ENDPOINTS = ['leaderboard', 'activities', 'teams', 'workouts']
+
+
+async def fetch(url):
+    """GET `url` over a fresh connection; returns (status code, seconds)."""
+    parts = urlsplit(url)
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: close\r\n\r\n'.encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    status = int(response.split(b' ', 2)[1]) if response else 0
+    return status, time.perf_counter() - started
+
+
+async def run(url, concurrency, total):
+    timings, failures = [], 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal failures
+        for _ in remaining:
+            try:
+                status, elapsed = await fetch(url)
+            except OSError:
+                failures += 1
+                continue
+            if status == 200:
+                timings.append(elapsed)
+            else:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return timings, failures, time.perf_counter() - started
+
+
+def report(label, timings, failures, elapsed):
+    if len(timings) < 2:
+        print(f'{label:<34} no successful requests ({failures} failed)')
+        return
+    p50, p95, p99 = (statistics.quantiles(timings, n=100)[index] * 1000 for index in (49, 94, 98))
+    print(
+        f'{label:<34} {len(timings) / elapsed:>9.0f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {failures:>7}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--asgi', default='http://127.0.0.1:8001', help='Base URL of the uvicorn ASGI server')
+    parser.add_argument('--wsgi', default='http://127.0.0.1:8002', help='Base URL of the WSGI server')
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=5000, help='Requests per endpoint and target')
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--endpoint', action='append', choices=ENDPOINTS, help='Default: all of them')
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<34} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'failed':>7}")
+    for endpoint in args.endpoint or ENDPOINTS:
+        targets = [
+            (f'{endpoint} (wsgi, sync)', f'{args.wsgi}/api/{endpoint}/'),
+            (f'{endpoint} (asgi, async)', f'{args.asgi}/api/async/{endpoint}/'),
+        ]
+        for label, url in targets:
+            url += f'?page_size={args.page_size}'
+            report(label, *asyncio.run(run(url, args.concurrency, args.requests)))
+
+
+if __name__ == '__main__':
+    main()
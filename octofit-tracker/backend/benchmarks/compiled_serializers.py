@@ -0,0 +1,111 @@
+"""
+Rows/sec of the DRF serializers vs the compiled serializers.
+
+Pure CPU: names are pre-resolved for both paths, so no database is needed.
+The DRF side renders model instances row by row exactly like
+NameLookupListSerializer does; the compiled side renders the equivalent raw
+documents.
+
+Usage:
+    python benchmarks/compiled_serializers.py --rows 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from bson import ObjectId  # noqa: E402
+
+from octofit_tracker.compiled import compiled_activities, compiled_leaderboard, compiled_workouts  # noqa: E402
+from octofit_tracker.models import Activity, Leaderboard, Workout  # noqa: E402
+from octofit_tracker.serializers import (  # noqa: E402
+    ActivitySerializer, LeaderboardSerializer, NameLookup, WorkoutSerializer
+)
+
+
+def synthetic_documents(rows, users, teams):
+    now = datetime.now(timezone.utc)
+    activities, leaderboard, workouts = [], [], []
+    for i in range(rows):
+        activities.append({
+            '_id': ObjectId(),
+            'user_id': random.choice(users),
+            'activity_type': 'Running',
+            'duration': 30 + i % 60,
+            'calories_burned': 240 + i % 500,
+            'date': (now - timedelta(minutes=i)).replace(microsecond=0),
+            'notes': f'Session {i}',
+        })
+        leaderboard.append({
+            '_id': ObjectId(),
+            'user_id': random.choice(users),
+            'team_id': random.choice(teams),
+            'total_activities': i % 40,
+            'total_calories': i * 7,
+            'total_duration': i * 3,
+            'rank': i + 1,
+            'updated_at': now.replace(microsecond=0),
+        })
+        workouts.append({
+            '_id': ObjectId(),
+            'name': f'Workout {i}',
+            'description': 'Synthetic workout',
+            'activity_type': 'Cycling',
+            'difficulty': 'Intermediate',
+            'duration': 45,
+            'calories_estimate': 400,
+        })
+    return activities, leaderboard, workouts
+
+
+def rows_per_second(render, rows, repeat):
+    best = min(_timed(render) for _ in range(repeat))
+    return rows / best
+
+
+def _timed(render):
+    started = time.perf_counter()
+    render()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    users = [str(ObjectId()) for _ in range(200)]
+    teams = [str(ObjectId()) for _ in range(10)]
+    names = NameLookup({user_id: f'User {i}' for i, user_id in enumerate(users)},
+                       {team_id: f'Team {i}' for i, team_id in enumerate(teams)})
+    context = {'user_names': names.user_names, 'team_names': names.team_names}
+    activities, leaderboard, workouts = synthetic_documents(args.rows, users, teams)
+
+    cases = [
+        ('activities', ActivitySerializer, Activity, activities, compiled_activities),
+        ('leaderboard', LeaderboardSerializer, Leaderboard, leaderboard, compiled_leaderboard),
+        ('workouts', WorkoutSerializer, Workout, workouts, compiled_workouts),
+    ]
+    print(f"{'serializer':<12} {'DRF rows/s':>12} {'compiled rows/s':>16} {'speedup':>8}")
+    for label, serializer_class, model, documents, compiled in cases:
+        instances = [model(**document) for document in documents]
+        serializer = serializer_class()
+        serializer.name_lookup = names
+        drf = rows_per_second(lambda: [serializer.to_representation(obj) for obj in instances], args.rows, args.repeat)
+        fast = rows_per_second(lambda: compiled.render(documents, context), args.rows, args.repeat)
+        print(f'{label:<12} {drf:12,.0f} {fast:16,.0f} {fast / drf:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Weekly leaderboard: merging daily buckets vs aggregating raw activities.
+
+Seeds a scratch database with synthetic activities (1M by default), rolls
+them up into daily buckets with the same pipeline the app uses, then times
+both ways of computing the weekly leaderboard.
+
+Usage (needs a local mongod):
+    python benchmarks/leaderboard_periods.py --activities 1000000 --users 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from pymongo import ASCENDING, MongoClient  # noqa: E402
+
+from octofit_tracker.leaderboard import bucket_rollup_pipeline, period_pipeline  # noqa: E402
+
+ACTIVITY_TYPES = ['Running', 'Swimming', 'Cycling', 'Weight Training', 'Yoga', 'Boxing']
+
+
+def raw_period_pipeline(start):
+    return [
+        {'$match': {'date': {'$gte': start}}},
+        {'$group': {
+            '_id': '$user_id',
+            'total_activities': {'$sum': 1},
+            'total_calories': {'$sum': '$calories_burned'},
+            'total_duration': {'$sum': '$duration'},
+        }},
+        {'$sort': {'total_calories': -1, '_id': 1}},
+    ]
+
+
+def seed(db, activities, users, days, batch_size):
+    now = datetime.now(timezone.utc)
+    user_ids = [f'{i:024x}' for i in range(users)]
+    batch = []
+    for _ in range(activities):
+        duration = random.randint(10, 120)
+        batch.append({
+            'user_id': random.choice(user_ids),
+            'activity_type': random.choice(ACTIVITY_TYPES),
+            'duration': duration,
+            'calories_burned': duration * random.randint(5, 12),
+            'date': now - timedelta(seconds=random.randint(0, days * 86400)),
+            'notes': '',
+        })
+        if len(batch) == batch_size:
+            db.activities.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db.activities.insert_many(batch, ordered=False)
+
+    db.activities.create_index([('date', ASCENDING)])
+    db.leaderboard_buckets.create_index([('bucket_start', ASCENDING), ('user_id', ASCENDING)])
+    db.activities.aggregate(bucket_rollup_pipeline() + [{'$out': 'leaderboard_buckets'}], allowDiskUse=True)
+
+
+def timed(collection, pipeline, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = list(collection.aggregate(pipeline, allowDiskUse=True))
+        timings.append(time.perf_counter() - started)
+    return min(timings), len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--activities', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=90, help='spread activities over this many days')
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database', default='octofit_benchmark')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch database afterwards')
+    args = parser.parse_args()
+
+    client_settings = settings.DATABASES['default']['CLIENT']
+    client = MongoClient(client_settings['host'], client_settings['port'])
+    client.drop_database(args.database)
+    db = client[args.database]
+
+    try:
+        started = time.perf_counter()
+        seed(db, args.activities, args.users, args.days, args.batch_size)
+        print(f'Seeded {args.activities} activities, {db.leaderboard_buckets.estimated_document_count()} '
+              f'daily buckets in {time.perf_counter() - started:.1f}s')
+
+        start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=6)
+        raw_time, raw_rows = timed(db.activities, raw_period_pipeline(start), args.repeat)
+        bucket_time, bucket_rows = timed(db.leaderboard_buckets, period_pipeline(start), args.repeat)
+
+        print(f'raw activities aggregation: {raw_time * 1000:8.1f} ms ({raw_rows} users)')
+        print(f'daily bucket merge:         {bucket_time * 1000:8.1f} ms ({bucket_rows} users)')
+        print(f'speedup:                    {raw_time / bucket_time:8.1f}x')
+    finally:
+        if not args.keep:
+            client.drop_database(args.database)
+
+
+if __name__ == '__main__':
+    main()
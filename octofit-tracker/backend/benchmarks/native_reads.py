@@ -0,0 +1,77 @@
+"""
+Microbenchmark: djongo/serializer read path vs the native pymongo path.
+
+Creates a throwaway test database, seeds it with populate_db's synthetic
+mode, then times the list and retrieve endpoints of every viewset through
+the DRF test client with OCTOFIT_NATIVE_READS off and on.
+
+Usage (needs a local mongod):
+    python benchmarks/native_reads.py --users 500 --activities-per-user 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from io import StringIO
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings, setup_test_environment  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from octofit_tracker.cache import get_response_cache  # noqa: E402
+
+ENDPOINTS = ['users', 'teams', 'activities', 'leaderboard', 'workouts']
+
+
+def measure(client, url, native, repeat):
+    timings = []
+    with override_settings(OCTOFIT_NATIVE_READS=native):
+        for _ in range(repeat):
+            get_response_cache().clear()
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append(time.perf_counter() - started)
+            assert response.status_code == 200, (url, response.status_code)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--activities-per-user', type=int, default=20)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        call_command(
+            'populate_db', users=args.users, activities_per_user=args.activities_per_user,
+            seed=1, stdout=StringIO(),
+        )
+        client = APIClient()
+        print(f"{'request':<34} {'djongo':>10} {'native':>10} {'speedup':>8}")
+        for endpoint in ENDPOINTS:
+            list_url = f'/api/{endpoint}/?page_size={args.page_size}'
+            first_id = client.get(list_url).json()['results'][0]['id']
+            for label, url in (('list', list_url), ('retrieve', f'/api/{endpoint}/{first_id}/')):
+                orm = measure(client, url, False, args.repeat)
+                native = measure(client, url, True, args.repeat)
+                print(f'{endpoint + " " + label:<34} {orm * 1000:8.2f}ms {native * 1000:8.2f}ms {orm / native:7.1f}x')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
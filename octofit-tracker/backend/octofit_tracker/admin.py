@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Team, Activity, Leaderboard, Workout
+from .models import User, Team, Activity, ActivityTombstone, Job, Leaderboard, LeaderboardBucket, PeriodRank, UserStats, Workout
 
 
 @admin.register(User)
@@ -26,14 +26,54 @@ class ActivityAdmin(admin.ModelAdmin):
     ordering = ('-date',)
 
 
+@admin.register(ActivityTombstone)
+class ActivityTombstoneAdmin(admin.ModelAdmin):
+    list_display = ('activity_id', 'user_id', 'deleted_at')
+    search_fields = ('activity_id', 'user_id')
+    ordering = ('-deleted_at',)
+
+
 @admin.register(Leaderboard)
 class LeaderboardAdmin(admin.ModelAdmin):
-    list_display = ('user_id', 'team_id', 'rank', 'total_activities', 'total_calories', 'total_duration', 'updated_at')
+    list_display = (
+        'user_id', 'team_id', 'rank', 'dense_rank', 'team_rank',
+        'total_activities', 'total_calories', 'total_duration', 'updated_at',
+    )
     search_fields = ('user_id', 'team_id')
     list_filter = ('rank', 'updated_at')
     ordering = ('rank',)
 
 
+@admin.register(LeaderboardBucket)
+class LeaderboardBucketAdmin(admin.ModelAdmin):
+    list_display = ('user_id', 'team_id', 'bucket_start', 'total_activities', 'total_calories', 'total_duration')
+    search_fields = ('user_id', 'team_id')
+    list_filter = ('bucket_start',)
+    ordering = ('-bucket_start',)
+
+
+@admin.register(PeriodRank)
+class PeriodRankAdmin(admin.ModelAdmin):
+    list_display = ('period', 'user_id', 'team_id', 'rank', 'dense_rank', 'team_rank', 'total_calories', 'computed_at')
+    search_fields = ('user_id', 'team_id')
+    list_filter = ('period',)
+    ordering = ('period', 'rank')
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'status', 'requests', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    ordering = ('-created_at',)
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ('user_id', 'total_activities', 'total_calories', 'total_duration', 'updated_at')
+    search_fields = ('user_id',)
+    ordering = ('-updated_at',)
+
+
 @admin.register(Workout)
 class WorkoutAdmin(admin.ModelAdmin):
     list_display = ('name', 'activity_type', 'difficulty', 'duration', 'calories_estimate')
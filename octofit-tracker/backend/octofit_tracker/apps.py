@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+from pymongo import monitoring
+
+from .metrics import command_listener
+from .pool import pool_listener
+
+
+class OctofitTrackerConfig(AppConfig):
+    name = 'octofit_tracker'
+
+    def ready(self):
+        # Before any MongoClient exists, so every client reports to them
+        monitoring.register(pool_listener)
+        monitoring.register(command_listener)
@@ -0,0 +1,151 @@
+"""
+Async read views for ASGI deployments.
+
+The DRF viewsets are synchronous, so under ASGI every request holds a worker
+thread while pymongo waits on the server. These views serve the hot list
+endpoints (activities, leaderboard, teams, workouts) through motor instead,
+and run independent lookups, such as the user and team names of a
+leaderboard page, concurrently with `asyncio.gather`.
+
+Rows are rendered by the same compiled serializers and formatters as the sync
+lists, and pages use the same cursors, so /api/async/<endpoint>/ returns what
+/api/<endpoint>/ does for an unfiltered list.
+"""
+import asyncio
+from functools import wraps
+
+from django.http import JsonResponse
+from rest_framework.exceptions import APIException, MethodNotAllowed
+from rest_framework.pagination import _reverse_ordering
+from rest_framework.utils.encoders import JSONEncoder
+
+from .compiled import compiled_activities, compiled_leaderboard, compiled_workouts, unnamed_ids
+from .models import Activity, Leaderboard, Team, User, Workout
+from .mongo import get_async_collection, object_ids
+from .native import CODEC_OPTIONS, NativeQuery, _mongo_ordering, format_teams
+from .pagination import ActivityCursorPagination, LeaderboardCursorPagination, ObjectIdCursorPagination
+
+
+def async_api_view(view):
+    """GET-only async view that renders DRF exceptions the way DRF does."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            if request.method != 'GET':
+                raise MethodNotAllowed(request.method)
+            data = await view(request, *args, **kwargs)
+        except APIException as exc:
+            return JsonResponse({'detail': exc.detail}, status=exc.status_code, encoder=JSONEncoder)
+        return JsonResponse(data, encoder=JSONEncoder)
+    return wrapper
+
+
+class _PaginatorRequest:
+    """The part of a DRF Request that CursorPagination reads."""
+
+    def __init__(self, request):
+        self.query_params = request.GET
+
+
+async def paginate(request, model, pagination_class, projection=None):
+    """
+    Fetch one page of raw documents with motor. Mirrors
+    `CursorPagination.paginate_queryset`, so the returned paginator builds
+    the same next/previous links.
+    """
+    paginator = pagination_class()
+    paginator_request = _PaginatorRequest(request)
+    paginator.page_size = paginator.get_page_size(paginator_request)
+    paginator.base_url = request.build_absolute_uri()
+    paginator.ordering = pagination_class.ordering
+    paginator.cursor = paginator.decode_cursor(paginator_request)
+    offset, reverse, current_position = paginator.cursor or (0, False, None)
+
+    ordering = _reverse_ordering(paginator.ordering) if reverse else paginator.ordering
+    query = NativeQuery(model, projection=projection, ordering=ordering)
+    if current_position is not None:
+        order = paginator.ordering[0]
+        lookup = '__lt' if reverse != order.startswith('-') else '__gt'
+        query = query.filter(**{order.lstrip('-') + lookup: current_position})
+
+    cursor = get_async_collection(model, CODEC_OPTIONS).find(query.query, projection)
+    cursor = cursor.sort(_mongo_ordering(ordering)).skip(offset).limit(paginator.page_size + 1)
+    results = await cursor.to_list(length=None)
+    paginator.page = results[:paginator.page_size]
+
+    following_position = None
+    if len(results) > len(paginator.page):
+        following_position = paginator._get_position_from_instance(results[-1], paginator.ordering)
+    if reverse:
+        paginator.page.reverse()
+        paginator.has_next = current_position is not None or offset > 0
+        paginator.has_previous = following_position is not None
+        paginator.next_position = current_position
+        paginator.previous_position = following_position
+    else:
+        paginator.has_next = following_position is not None
+        paginator.has_previous = current_position is not None or offset > 0
+        paginator.next_position = following_position
+        paginator.previous_position = current_position
+    return paginator
+
+
+def page_response(paginator, rows):
+    return {
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
+        'results': rows,
+    }
+
+
+async def resolve_names(model, ids):
+    """{id: name} for the given string ids, in one `$in` query."""
+    ids = object_ids(ids)
+    if not ids:
+        return {}
+    documents = await get_async_collection(model).find(
+        {'_id': {'$in': list(ids)}}, {'name': 1}
+    ).to_list(length=None)
+    return {str(document['_id']): document.get('name') for document in documents}
+
+
+async def count_team_members(team_ids):
+    if not team_ids:
+        return {}
+    pipeline = [
+        {'$match': {'team_id': {'$in': team_ids}}},
+        {'$group': {'_id': '$team_id', 'count': {'$sum': 1}}},
+    ]
+    rows = await get_async_collection(User).aggregate(pipeline).to_list(length=None)
+    return {row['_id']: row['count'] for row in rows}
+
+
+@async_api_view
+async def activity_list(request):
+    paginator = await paginate(request, Activity, ActivityCursorPagination)
+    user_names = await resolve_names(User, unnamed_ids(paginator.page, 'user_id', 'user_name'))
+    return page_response(paginator, compiled_activities.render(paginator.page, {'user_names': user_names}))
+
+
+@async_api_view
+async def leaderboard_list(request):
+    paginator = await paginate(request, Leaderboard, LeaderboardCursorPagination)
+    user_names, team_names = await asyncio.gather(
+        resolve_names(User, unnamed_ids(paginator.page, 'user_id', 'user_name')),
+        resolve_names(Team, unnamed_ids(paginator.page, 'team_id', 'team_name')),
+    )
+    context = {'user_names': user_names, 'team_names': team_names}
+    return page_response(paginator, compiled_leaderboard.render(paginator.page, context))
+
+
+@async_api_view
+async def team_list(request):
+    paginator = await paginate(request, Team, ObjectIdCursorPagination)
+    member_counts = await count_team_members([str(document['_id']) for document in paginator.page])
+    return page_response(paginator, format_teams(paginator.page, member_counts))
+
+
+@async_api_view
+async def workout_list(request):
+    paginator = await paginate(request, Workout, ObjectIdCursorPagination)
+    return page_response(paginator, compiled_workouts.render(paginator.page, {}))
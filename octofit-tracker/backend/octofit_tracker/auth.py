@@ -0,0 +1,123 @@
+"""
+Password hashing and token authentication for `User`.
+
+Passwords are hashed when a user is written, with the hasher named by
+`settings.OCTOFIT_PASSWORD_HASHER` (one of `PASSWORD_HASHERS`, default
+PBKDF2). A hash check costs ~100ms of CPU by design, so it happens once, at
+login: /api/auth/login/ verifies the password and returns a token signed
+with the SECRET_KEY. `TokenAuthentication` accepts `Authorization: Bearer
+<token>` on every later request by checking the token's HMAC and age, which
+takes microseconds and no database query.
+
+Tokens expire after `settings.OCTOFIT_TOKEN_MAX_AGE` seconds and cannot be
+revoked earlier, which is why they are short-lived.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.core import signing
+from django.utils.crypto import constant_time_compare
+from rest_framework import authentication, exceptions
+
+from .models import User
+from .mongo import get_collection
+
+TOKEN_SALT = 'octofit_tracker.auth.token'
+
+
+def password_hasher():
+    return getattr(settings, 'OCTOFIT_PASSWORD_HASHER', None) or 'default'
+
+
+def hash_password(raw_password):
+    return make_password(raw_password, hasher=password_hasher())
+
+
+def _is_hashed(encoded):
+    try:
+        identify_hasher(encoded)
+    except ValueError:
+        return False
+    return True
+
+
+def verify_password(user_id, raw_password, encoded):
+    """
+    Check `raw_password` against a stored password. Hashes made with a
+    different hasher or weaker settings, and plain text stored before
+    passwords were hashed, are rehashed on a successful check.
+    """
+    if _is_hashed(encoded):
+        setter = partial(_store_password, user_id)
+        return check_password(raw_password, encoded, setter, preferred=password_hasher())
+    if encoded and constant_time_compare(raw_password, encoded):
+        _store_password(user_id, raw_password)
+        return True
+    return False
+
+
+def _store_password(user_id, raw_password):
+    get_collection(User).update_one({'_id': user_id}, {'$set': {'password': hash_password(raw_password)}})
+
+
+def authenticate_credentials(email, password):
+    """The id of the user with this email and password, or None."""
+    document = get_collection(User).find_one({'email': email}, {'password': 1})
+    if document is None:
+        # Hash anyway, so response times do not reveal which emails exist
+        hash_password(password)
+        return None
+    if not verify_password(document['_id'], password, document.get('password') or ''):
+        return None
+    return str(document['_id'])
+
+
+def token_max_age():
+    return getattr(settings, 'OCTOFIT_TOKEN_MAX_AGE', 3600)
+
+
+def issue_token(user_id):
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(user_id)
+
+
+def token_user_id(token):
+    """The user id a valid, unexpired token was issued for; raises signing.BadSignature."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=token_max_age())
+
+
+class TokenUser:
+    """
+    The user behind a token. Only the id is known: loading the `User` would
+    cost the query the token exists to avoid.
+    """
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+    is_staff = False
+    is_superuser = False
+
+    def __init__(self, user_id):
+        self.id = self.pk = user_id
+
+    def __str__(self):
+        return self.id
+
+
+class TokenAuthentication(authentication.BaseAuthentication):
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        parts = authentication.get_authorization_header(request).split()
+        if not parts or parts[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(parts) != 2:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+        try:
+            user_id = token_user_id(parts[1].decode())
+        except (signing.BadSignature, UnicodeError):
+            raise exceptions.AuthenticationFailed("Invalid or expired token.")
+        return TokenUser(user_id), parts[1].decode()
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,180 @@
+"""
+API benchmark suite, run by `manage.py benchmark_api`.
+
+Every endpoint registered on the router in urls.py is measured through the
+DRF test client: list, retrieve of an existing row and create. Given a
+user's credentials, the suite also compares logging in, which checks the
+password hash, with a request authenticated by the resulting token. The data is
+seeded with populate_db's synthetic mode from a fixed seed, so runs on
+different commits measure the same dataset and their JSON reports compare
+directly.
+
+The command creates and destroys its own test database on the configured
+mongod. No network access is needed beyond that server, and a mongod whose
+--dbpath is on a tmpfs such as /dev/shm works as an in-memory stand-in.
+djongo talks the Mongo wire protocol, so a Python-level mock cannot replace
+the server.
+"""
+import platform
+import statistics
+import subprocess
+import time
+from itertools import count
+
+import django
+import rest_framework
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .cache import get_response_cache
+from .urls import router
+
+ACTIONS = ('list', 'retrieve', 'create')
+
+
+def _create_payloads(ids):
+    """Per basename, a function from a sequence number to a valid create payload."""
+    now = timezone.now().isoformat()
+    return {
+        'user': lambda n: {'name': f"Bench User {n}", 'email': f'bench{n}@example.com', 'password': 'benchpass123'},
+        'team': lambda n: {'name': f"Bench Team {n}", 'description': "Benchmark team"},
+        'activity': lambda n: {
+            'user_id': ids['user'], 'activity_type': 'Running', 'duration': 30,
+            'calories_burned': 300, 'date': now, 'notes': f"Benchmark run {n}",
+        },
+        'leaderboard': lambda n: {
+            'user_id': ids['user'], 'team_id': ids['team'], 'total_activities': 1,
+            'total_calories': 100, 'total_duration': 30, 'rank': 0,
+        },
+        'workout': lambda n: {
+            'name': f"Bench Workout {n}", 'description': "Benchmark workout", 'activity_type': 'Running',
+            'difficulty': 'Beginner', 'duration': 30, 'calories_estimate': 300,
+        },
+    }
+
+
+def query_count(response):
+    """Mongo commands the request issued, from the metrics middleware's Server-Timing header."""
+    for part in response.get('Server-Timing', '').split(','):
+        if part.strip().startswith('db;') and 'desc="' in part:
+            return int(part.split('desc="')[1].split(' ')[0])
+    return None
+
+
+def summarize(timings, queries):
+    milliseconds = sorted(timing * 1000 for timing in timings)
+    cuts = statistics.quantiles(milliseconds, n=100) if len(milliseconds) > 1 else milliseconds * 99
+    queries = [value for value in queries if value is not None]
+    return {
+        'requests': len(timings),
+        'throughput_rps': round(len(timings) / sum(timings), 1),
+        'latency_ms': {
+            'mean': round(statistics.fmean(milliseconds), 3),
+            'min': round(milliseconds[0], 3),
+            'p50': round(cuts[49], 3),
+            'p95': round(cuts[94], 3),
+            'p99': round(cuts[98], 3),
+            'max': round(milliseconds[-1], 3),
+        },
+        'queries_p50': statistics.median(queries) if queries else None,
+    }
+
+
+class ApiBenchmark:
+    def __init__(self, repeat=50, warmup=5, page_size=100, warm_cache=False):
+        self.repeat = repeat
+        self.warmup = warmup
+        self.page_size = page_size
+        self.warm_cache = warm_cache
+        self.client = APIClient()
+        self.sequence = count()
+
+    def request(self, method, url, data=None):
+        if not self.warm_cache:
+            get_response_cache().clear()
+        started = time.perf_counter()
+        response = getattr(self.client, method)(url, data, format='json') if data else getattr(self.client, method)(url)
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method.upper()} {url} returned {response.status_code}: {response.content[:200]!r}')
+        return response, elapsed
+
+    def measure(self, method, url, payload=None):
+        for _ in range(self.warmup):
+            self.request(method, url, payload(next(self.sequence)) if payload else None)
+        timings, queries = [], []
+        for _ in range(self.repeat):
+            response, elapsed = self.request(method, url, payload(next(self.sequence)) if payload else None)
+            timings.append(elapsed)
+            queries.append(query_count(response))
+        return summarize(timings, queries)
+
+    def first_id(self, prefix):
+        response, _ = self.request('get', f'/api/{prefix}/?page_size=1')
+        results = response.json()['results']
+        return results[0]['id'] if results else None
+
+    def run_auth(self, email, password):
+        credentials = lambda n: {'email': email, 'password': password}
+        results = [dict({'endpoint': 'auth', 'action': 'login'}, **self.measure('post', '/api/auth/login/', credentials))]
+        response, _ = self.request('post', '/api/auth/login/', credentials(0))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['token']}")
+        try:
+            results.append(dict({'endpoint': 'auth', 'action': 'token'}, **self.measure('get', '/api/auth/me/')))
+        finally:
+            self.client.credentials()
+        return results
+
+    def run(self, endpoints=None, actions=ACTIONS, credentials=None):
+        registry = [(prefix, basename) for prefix, _, basename in router.registry]
+        ids = {basename: self.first_id(prefix) for prefix, basename in registry}
+        payloads = _create_payloads(ids)
+
+        results = []
+        for prefix, basename in registry:
+            if endpoints and prefix not in endpoints:
+                continue
+            requests = {
+                'list': ('get', f'/api/{prefix}/?page_size={self.page_size}', None),
+                'retrieve': ('get', f'/api/{prefix}/{ids[basename]}/', None) if ids[basename] else None,
+                'create': ('post', f'/api/{prefix}/', payloads[basename]) if basename in payloads else None,
+            }
+            for action in actions:
+                if requests[action] is None:
+                    continue
+                method, url, payload = requests[action]
+                results.append(dict({'endpoint': prefix, 'action': action}, **self.measure(method, url, payload)))
+        if credentials and (not endpoints or 'auth' in endpoints):
+            results.extend(self.run_auth(*credentials))
+        return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'commit': git_revision(),
+        'timestamp': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'djangorestframework': rest_framework.VERSION,
+        'machine': platform.machine(),
+    }
+
+
+def compare(previous, current):
+    """(endpoint, action, previous p50, current p50, change) for results present in both reports."""
+    baseline = {(row['endpoint'], row['action']): row for row in previous['results']}
+    for row in current['results']:
+        before = baseline.get((row['endpoint'], row['action']))
+        if before is None:
+            continue
+        old, new = before['latency_ms']['p50'], row['latency_ms']['p50']
+        yield row['endpoint'], row['action'], old, new, (new - old) / old if old else None
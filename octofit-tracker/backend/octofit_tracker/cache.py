@@ -0,0 +1,181 @@
+"""
+Response cache for read-heavy list endpoints.
+
+List responses are cached per viewset namespace, keyed on path plus query
+string, together with an ETag so a client that already holds the current
+version gets a 304 without any query or serialization. Writes invalidate a
+namespace by bumping its generation number, which orphans every key built
+with the old one; the backend's LRU/TTL policy then reclaims them.
+
+The backend is pluggable through `settings.OCTOFIT_RESPONSE_CACHE`; it only
+needs `get`, `set` and `clear`.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class LocMemLRUCache:
+    """Process-local cache bounded by entry count, with a per-entry TTL."""
+
+    def __init__(self, max_entries=512, timeout=60):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        expires = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoCache:
+    """Adapter for one of the caches in `settings.CACHES`, e.g. to share it between processes."""
+
+    def __init__(self, alias='default', timeout=60):
+        self.alias = alias
+        self.timeout = timeout
+
+    def get(self, key, default=None):
+        return caches[self.alias].get(key, default)
+
+    def set(self, key, value, timeout=None):
+        caches[self.alias].set(key, value, self.timeout if timeout is None else timeout)
+
+    def clear(self):
+        caches[self.alias].clear()
+
+
+# Generation tokens outlive the cached responses; losing one is just a miss
+GENERATION_TIMEOUT = 24 * 60 * 60
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                config = getattr(settings, 'OCTOFIT_RESPONSE_CACHE', {})
+                backend = import_string(config.get('BACKEND', 'octofit_tracker.cache.LocMemLRUCache'))
+                _response_cache = backend(**config.get('OPTIONS', {}))
+    return _response_cache
+
+
+def _generation_key(namespace):
+    return f'response:{namespace}:generation'
+
+
+def invalidate(*namespaces):
+    """Drop every cached response of the given namespaces."""
+    cache = get_response_cache()
+    for namespace in namespaces:
+        # A fresh token rather than a counter, so concurrent writers never collide
+        cache.set(_generation_key(namespace), time.time_ns(), timeout=GENERATION_TIMEOUT)
+
+
+def response_key(namespace, request):
+    cache = get_response_cache()
+    generation = cache.get(_generation_key(namespace))
+    if generation is None:
+        generation = time.time_ns()
+        cache.set(_generation_key(namespace), generation, timeout=GENERATION_TIMEOUT)
+    return f'response:{namespace}:{generation}:{request.get_full_path()}'
+
+
+def compute_etag(data):
+    body = json.dumps(data, cls=JSONEncoder, sort_keys=True).encode()
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    candidates = {candidate.strip().removeprefix('W/') for candidate in header.split(',')}
+    return '*' in candidates or etag in candidates
+
+
+class CacheInvalidationMixin:
+    """
+    Invalidates `cache_namespace` and every namespace in `invalidates` after
+    each create, update and destroy performed by the viewset.
+    """
+    cache_namespace = None
+    invalidates = ()
+
+    def get_invalidated_namespaces(self):
+        namespaces = list(self.invalidates)
+        if self.cache_namespace:
+            namespaces.append(self.cache_namespace)
+        return namespaces
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        invalidate(*self.get_invalidated_namespaces())
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate(*self.get_invalidated_namespaces())
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        invalidate(*self.get_invalidated_namespaces())
+
+
+class CachedListMixin(CacheInvalidationMixin):
+    """Serves `list` from the response cache, answering 304 to a matching If-None-Match."""
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedListMixin, self).list(request, *args, **kwargs))
+
+    def cached_response(self, request, build_response):
+        cache = get_response_cache()
+        key = response_key(self.cache_namespace, request)
+        cached = cache.get(key)
+        if cached is None:
+            response = build_response()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cached = (compute_etag(response.data), response.data)
+            cache.set(key, cached)
+        etag, data = cached
+
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
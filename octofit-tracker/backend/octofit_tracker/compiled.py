@@ -0,0 +1,136 @@
+"""
+Compiled read-only serializers for hot list responses.
+
+A `CompiledSerializer` inspects its DRF serializer once, at import time, and
+turns every readable field into a plain `extract(document, context)`
+function. Rendering a page is then one dict comprehension per raw pymongo
+document: no field binding, `get_attribute`, `SkipField` checks or
+`OrderedDict` per row. `SerializerMethodField`s are supplied as document
+extractors by each subclass, with anything they need for the whole page
+(e.g. resolved names) computed once in `prepare`. Names are read from the
+documents' denormalized copies and only looked up for documents without one.
+Passing `fields` renders a sparse fieldset and skips the page context the
+other fields would need.
+"""
+from rest_framework import serializers
+
+from .leaderboard import total_points
+from .models import Team, User
+from .mongo import resolve_names
+from .native import format_datetime
+from .serializers import ActivitySerializer, LeaderboardSerializer, WorkoutSerializer
+
+
+def field_extractor(field):
+    source = field.source
+    if isinstance(field, serializers.DateTimeField):
+        return lambda document, context: format_datetime(document.get(source))
+    if isinstance(field, (serializers.CharField, serializers.IntegerField)):
+        # BSON strings and integers are already in their output form
+        return lambda document, context: document.get(source)
+
+    to_representation = field.to_representation
+
+    def extract(document, context):
+        value = document.get(source)
+        return None if value is None else to_representation(value)
+    return extract
+
+
+class CompiledSerializer:
+    serializer_class = None
+    # field name -> extract(document, context) for the SerializerMethodFields
+    method_fields = {}
+
+    def __init__(self):
+        self.extractors = tuple(self.compile())
+
+    def compile(self):
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                yield name, self.method_fields[name]
+            else:
+                yield name, field_extractor(field)
+
+    def prepare(self, documents, fields=None):
+        """Per-page context shared by every row, e.g. batch-resolved names."""
+        return {}
+
+    def render(self, documents, context, fields=None):
+        extractors = self.extractors
+        if fields is not None:
+            extractors = tuple((name, extract) for name, extract in extractors if name in fields)
+        return [
+            {name: extract(document, context) for name, extract in extractors}
+            for document in documents
+        ]
+
+    def to_representation(self, documents, fields=None):
+        documents = list(documents)
+        return self.render(documents, self.prepare(documents, fields), fields)
+
+
+def _document_id(document, context):
+    return str(document['_id'])
+
+
+def unnamed_ids(documents, id_field, name_field):
+    """The `id_field` values of the documents without a denormalized name."""
+    return [document.get(id_field) for document in documents if not document.get(name_field)]
+
+
+def _user_name(document, context):
+    return document.get('user_name') or context['user_names'].get(document.get('user_id')) or "Unknown User"
+
+
+def _team_name(document, context):
+    return document.get('team_name') or context['team_names'].get(document.get('team_id'))
+
+
+class CompiledActivitySerializer(CompiledSerializer):
+    serializer_class = ActivitySerializer
+    method_fields = {
+        'id': _document_id,
+        'user': _user_name,
+    }
+
+    def prepare(self, documents, fields=None):
+        if fields is not None and 'user' not in fields:
+            return {}
+        return {'user_names': resolve_names(User, unnamed_ids(documents, 'user_id', 'user_name'))}
+
+
+class CompiledLeaderboardSerializer(CompiledSerializer):
+    serializer_class = LeaderboardSerializer
+    method_fields = {
+        'id': _document_id,
+        'user': _user_name,
+        'team': _team_name,
+        'total_points': lambda document, context: total_points(
+            document.get('total_activities', 0), document.get('total_calories', 0)
+        ),
+        # Stored entries are all-time totals; period views are built from buckets
+        'period': lambda document, context: LeaderboardSerializer.PERIOD_LABELS['all'],
+    }
+
+    def prepare(self, documents, fields=None):
+        context = {}
+        if fields is None or 'user' in fields:
+            context['user_names'] = resolve_names(User, unnamed_ids(documents, 'user_id', 'user_name'))
+        if fields is None or 'team' in fields:
+            context['team_names'] = resolve_names(Team, unnamed_ids(documents, 'team_id', 'team_name'))
+        return context
+
+
+class CompiledWorkoutSerializer(CompiledSerializer):
+    serializer_class = WorkoutSerializer
+    method_fields = {
+        'id': _document_id,
+    }
+
+
+compiled_activities = CompiledActivitySerializer()
+compiled_leaderboard = CompiledLeaderboardSerializer()
+compiled_workouts = CompiledWorkoutSerializer()
@@ -0,0 +1,109 @@
+"""
+Denormalized user and team names.
+
+Activity and leaderboard documents carry a copy of their user's name
+(`user_name`) and leaderboard documents their team's name (`team_name`), so
+lists render without looking the names up. The copies are written when a
+document is inserted and fanned out to every referencing document when a
+user or team is renamed. Documents written before the fields existed have no
+copy: readers fall back to the lookup, and `backfill_names` fills them in.
+"""
+import time
+
+from django.utils import timezone
+
+from .models import Activity, Leaderboard, Team, User
+from .mongo import get_collection, resolve_names
+
+# Documents updated per update_many by the fan-out and the backfill
+BATCH_SIZE = 1000
+
+# Denormalized field -> (id field it is keyed by, model the name comes from)
+NAME_FIELDS = {
+    Activity: {'user_name': ('user_id', User)},
+    Leaderboard: {'user_name': ('user_id', User), 'team_name': ('team_id', Team)},
+}
+
+
+def denormalized_names(model, values):
+    """
+    The name fields of a `model` document whose ids are in `values`. Only
+    the names whose id is present are returned, so a partial update refreshes
+    just the names it affects.
+    """
+    names = {}
+    for field, (id_field, source) in NAME_FIELDS[model].items():
+        if id_field in values:
+            names[field] = resolve_names(source, [values[id_field]]).get(values[id_field])
+    return names
+
+
+def fan_out(model, query, values, batch_size=BATCH_SIZE):
+    """
+    `$set` `values` on every document matching `query`, `batch_size`
+    documents per update_many, walking the matches in `_id` order. Each batch
+    is a short write, so a popular user's rename never holds the collection
+    for long. Returns the number of documents changed.
+    """
+    collection = get_collection(model)
+    updated, last_id = 0, None
+    while True:
+        batch_query = dict(query, _id={'$gt': last_id}) if last_id is not None else query
+        ids = [
+            document['_id']
+            for document in collection.find(batch_query, {'_id': 1}).sort('_id', 1).limit(batch_size)
+        ]
+        if not ids:
+            return updated
+        updated += collection.update_many({'_id': {'$in': ids}}, {'$set': values}).modified_count
+        last_id = ids[-1]
+
+
+def propagate_user_name(user_id, name, batch_size=BATCH_SIZE):
+    # Renames bump updated_at, so delta syncs and the in-memory leaderboard
+    # index re-read the documents
+    values = {'user_name': name, 'updated_at': timezone.now()}
+    return (
+        fan_out(Activity, {'user_id': user_id}, values, batch_size)
+        + fan_out(Leaderboard, {'user_id': user_id}, values, batch_size)
+    )
+
+
+def propagate_team_name(team_id, name, batch_size=BATCH_SIZE):
+    return fan_out(Leaderboard, {'team_id': team_id}, {'team_name': name, 'updated_at': timezone.now()}, batch_size)
+
+
+def backfill_names(model, batch_size=BATCH_SIZE, pause=0.0):
+    """
+    Copy the names onto `model` documents that have none, one chunk of
+    `batch_size` documents at a time in `_id` order, sleeping `pause` seconds
+    between chunks. Every chunk is one indexed find and one update_many per
+    distinct user or team, so the backfill runs against a live database
+    without locking the collection. Documents whose user or team no longer
+    exists are left without a name. Returns the number of names written.
+    """
+    fields = NAME_FIELDS[model]
+    collection = get_collection(model)
+    # {field: None} matches both null and missing fields
+    missing = {'$or': [{field: None} for field in fields]}
+    projection = dict.fromkeys(list(fields) + [id_field for id_field, _ in fields.values()], 1)
+
+    updated, last_id = 0, None
+    while True:
+        query = dict(missing, _id={'$gt': last_id}) if last_id is not None else missing
+        documents = list(collection.find(query, projection).sort('_id', 1).limit(batch_size))
+        if not documents:
+            return updated
+        for field, (id_field, source) in fields.items():
+            names = resolve_names(source, [document.get(id_field) for document in documents])
+            pending = {}
+            for document in documents:
+                source_id = document.get(id_field)
+                if document.get(field) is None and names.get(source_id) is not None:
+                    pending.setdefault(source_id, []).append(document['_id'])
+            for source_id, ids in pending.items():
+                result = collection.update_many({'_id': {'$in': ids}}, {'$set': {field: names[source_id]}})
+                updated += result.modified_count
+        last_id = documents[-1]['_id']
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,105 @@
+"""
+Streaming activity export.
+
+Activities are read from a server-side pymongo cursor in fixed-size chunks,
+rendered with the compiled serializer and written out as they go, so memory
+use stays flat however many rows match.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from .compiled import compiled_activities
+from .models import Activity, User
+from .native import native_collection
+
+EXPORT_FORMATS = {
+    'json': ('application/json', 'json'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+CHUNK_SIZE = 1000
+
+_date_field = serializers.DateTimeField()
+
+
+def export_query(params):
+    """Translate the export query parameters into a Mongo filter."""
+    query = {}
+    if params.get('user_id'):
+        query['user_id'] = params['user_id']
+    if params.get('team_id'):
+        member_ids = [str(user_id) for user_id in User.objects.filter(
+            team_id=params['team_id']).values_list('_id', flat=True)]
+        if 'user_id' in query:
+            member_ids = [user_id for user_id in member_ids if user_id == query['user_id']]
+        query['user_id'] = {'$in': member_ids}
+
+    date_range = {}
+    for param, operator in (('date__gte', '$gte'), ('date__lte', '$lte')):
+        if params.get(param):
+            try:
+                date_range[operator] = _date_field.to_internal_value(params[param])
+            except serializers.ValidationError as exc:
+                raise ValidationError({param: exc.detail})
+    if date_range:
+        query['date'] = date_range
+    return query
+
+
+def export_rows(query, chunk_size=CHUNK_SIZE):
+    """Yield rendered activity dicts, oldest first, one chunk of documents at a time."""
+    cursor = native_collection(Activity).find(query).sort([('date', 1), ('_id', 1)]).batch_size(chunk_size)
+    while True:
+        documents = list(islice(cursor, chunk_size))
+        if not documents:
+            return
+        yield from compiled_activities.to_representation(documents)
+
+
+class _Echo:
+    """File-like object whose `write` returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_json(rows):
+    yield '['
+    for index, row in enumerate(rows):
+        yield (',' if index else '') + json.dumps(row)
+    yield ']\n'
+
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+def stream_csv(rows):
+    fields = [name for name, _ in compiled_activities.extractors]
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fields])
+
+
+STREAMERS = {'json': stream_json, 'ndjson': stream_ndjson, 'csv': stream_csv}
+
+
+def export_response(params):
+    output = params.get('output', 'json')
+    if output not in EXPORT_FORMATS:
+        raise ValidationError({'output': "Expected one of: json, ndjson, csv."})
+    content_type, extension = EXPORT_FORMATS[output]
+    response = StreamingHttpResponse(
+        STREAMERS[output](export_rows(export_query(params))),
+        content_type=content_type,
+    )
+    response['Content-Disposition'] = f'attachment; filename="activities.{extension}"'
+    return response
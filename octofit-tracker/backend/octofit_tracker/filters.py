@@ -0,0 +1,94 @@
+from datetime import datetime
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from .serializers import requested_fields, source_columns
+
+
+class QueryParamFilterBackend(BaseFilterBackend):
+    """
+    Exact and range filters from query parameters. Viewsets list the lookups
+    they accept in `filterset_fields` (e.g. 'user_id', 'date__gte'); a
+    viewset method `filter_<param>(queryset, value)` handles a parameter that
+    does not map onto a model field. Works on querysets and NativeQuery alike.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        for param in getattr(view, 'filterset_fields', ()):
+            value = request.query_params.get(param)
+            if value in (None, ''):
+                continue
+            custom_filter = getattr(view, f'filter_{param}', None)
+            if custom_filter is not None:
+                queryset = custom_filter(queryset, value)
+                continue
+            field = queryset.model._meta.get_field(param.split('__')[0])
+            try:
+                value = field.to_python(value)
+            except DjangoValidationError as exc:
+                raise ValidationError({param: exc.messages})
+            if isinstance(value, datetime) and timezone.is_naive(value):
+                value = timezone.make_aware(value)
+            queryset = queryset.filter(**{param: value})
+        return queryset
+
+
+class StableOrderingFilter(OrderingFilter):
+    """`?ordering=` that always ends on `_id`, so equal sort keys page deterministically."""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(super().get_ordering(request, queryset, view) or ())
+        if not any(field.lstrip('-') == '_id' for field in ordering):
+            direction = '-' if ordering and ordering[0].startswith('-') else ''
+            ordering += (direction + '_id',)
+        return ordering
+
+
+class SparseFieldsetMixin:
+    """
+    Backs `?fields=a,b` on reads: rejects unknown names and restricts the
+    queryset to the columns the requested fields read, plus the ordering
+    keys the pagination cursor needs.
+    """
+
+    def get_requested_fields(self):
+        requested = requested_fields(self.request)
+        if requested is None:
+            return None
+        readable = {
+            name for name, field in self.get_serializer_class()().fields.items()
+            if not field.write_only
+        }
+        unknown = requested - readable
+        if unknown:
+            raise ValidationError({'fields': [f"Unknown field(s): {', '.join(sorted(unknown))}."]})
+        return requested
+
+    def get_required_columns(self):
+        requested = self.get_requested_fields()
+        if requested is None:
+            return None
+        columns = source_columns(self.get_serializer_class(), requested)
+        columns.update(self.get_ordering_columns())
+        columns.add('_id')
+        return columns
+
+    def get_ordering_columns(self):
+        """The fields the page is sorted on, which the cursor position reads."""
+        param = self.request.query_params.get(StableOrderingFilter.ordering_param, '')
+        columns = {term.strip().lstrip('-') for term in param.split(',')}
+        columns &= set(self.ordering_fields or ())
+        if not columns:
+            ordering = self.ordering if isinstance(self.ordering, (list, tuple)) else (self.ordering,)
+            columns = {name.lstrip('-') for name in ordering if name}
+        return columns
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        columns = self.get_required_columns() if self.request is not None else None
+        if columns:
+            queryset = queryset.only(*columns)
+        return queryset
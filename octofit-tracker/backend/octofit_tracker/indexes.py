@@ -0,0 +1,100 @@
+"""
+MongoDB index management.
+
+The indexes are declared on the models (`Meta.indexes`, unique fields and
+unique constraints) and created directly through pymongo, so they exist
+whether or not djongo's schema editor ever ran. `query_patterns()` lists the
+main API queries; their `explain()` plans show which index, if any, serves
+each one.
+"""
+from datetime import timedelta
+
+from django.apps import apps
+from django.db.models import UniqueConstraint
+from django.utils import timezone
+from pymongo import ASCENDING, DESCENDING
+
+from .mongo import get_collection
+
+SAMPLE_ID = '0' * 24
+
+
+def model_index_specs(model):
+    """(name, keys, options) for every index declared on `model`."""
+    specs = []
+    for field in model._meta.fields:
+        if field.unique and not field.primary_key:
+            # Nullable unique fields are unique only among the documents that set them
+            options = {'unique': True, 'sparse': True} if field.null else {'unique': True}
+            specs.append((f'{model._meta.db_table}_{field.column}_unique', [(field.column, ASCENDING)], options))
+    for constraint in model._meta.constraints:
+        if isinstance(constraint, UniqueConstraint):
+            specs.append((constraint.name, [(name, ASCENDING) for name in constraint.fields], {'unique': True}))
+    for index in model._meta.indexes:
+        keys = [
+            (name.lstrip('-'), DESCENDING if name.startswith('-') else ASCENDING)
+            for name in index.fields
+        ]
+        specs.append((index.name, keys, {}))
+    return specs
+
+
+def ensure_indexes(models=None):
+    """Create any missing declared index. Returns {collection: [index names]}."""
+    created = {}
+    for model in models or apps.get_app_config('octofit_tracker').get_models():
+        collection = get_collection(model)
+        existing = collection.index_information()
+        existing_keys = [[tuple(key) for key in info['key']] for info in existing.values()]
+        for name, keys, options in model_index_specs(model):
+            # djongo may already have built the same index under its own name
+            if name not in existing and keys not in existing_keys:
+                collection.create_index(keys, name=name, background=True, **options)
+                created.setdefault(collection.name, []).append(name)
+    return created
+
+
+def query_patterns():
+    """(label, model name, filter, sort) for the queries the API issues most."""
+    since = timezone.now() - timedelta(days=7)
+    return [
+        ('activity list', 'Activity', {}, [('date', DESCENDING), ('_id', DESCENDING)]),
+        ('activities of a user', 'Activity', {'user_id': SAMPLE_ID, 'date': {'$gte': since}}, None),
+        ('activities by type', 'Activity', {'activity_type': 'Running'}, [('date', DESCENDING), ('_id', DESCENDING)]),
+        ('activities of a team', 'Activity', {'user_id': {'$in': [SAMPLE_ID]}}, [('date', DESCENDING), ('_id', DESCENDING)]),
+        ('leaderboard of a team', 'Leaderboard', {'team_id': SAMPLE_ID}, [('rank', ASCENDING), ('_id', ASCENDING)]),
+        ('team members', 'User', {'team_id': SAMPLE_ID}, None),
+        ('user stats', 'UserStats', {'user_id': SAMPLE_ID}, None),
+        ('user by email', 'User', {'email': 'someone@example.com'}, None),
+        ('leaderboard list', 'Leaderboard', {}, [('rank', ASCENDING), ('_id', ASCENDING)]),
+        ('leaderboard entry of a user', 'Leaderboard', {'user_id': SAMPLE_ID}, None),
+        ('rank shift', 'Leaderboard', {'total_points': {'$gte': 10, '$lt': 20}}, None),
+        ('period buckets', 'LeaderboardBucket', {'bucket_start': {'$gte': since}}, None),
+        ('workouts by type', 'Workout', {'activity_type': 'Running', 'difficulty': 'Beginner'}, None),
+    ]
+
+
+def _winning_stages(plan):
+    while plan:
+        yield plan
+        plan = plan.get('inputStage') or (plan.get('inputStages') or [None])[0]
+
+
+def explain_queries():
+    """The winning plan of every query pattern: scan stage and index used."""
+    report = []
+    for label, model_name, query, sort in query_patterns():
+        model = apps.get_model('octofit_tracker', model_name)
+        cursor = get_collection(model).find(query).limit(100)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()['queryPlanner']['winningPlan']
+        stages = list(_winning_stages(plan))
+        index_names = [stage['indexName'] for stage in stages if 'indexName' in stage]
+        report.append({
+            'query': label,
+            'collection': model._meta.db_table,
+            'stage': 'IXSCAN' if index_names else 'COLLSCAN',
+            'index': index_names[0] if index_names else None,
+        })
+    return report
@@ -0,0 +1,182 @@
+"""
+Background jobs.
+
+Recomputing every leaderboard rank or rebuilding the rollups scans whole
+collections, so request threads never do it: they `enqueue` a job and return.
+Jobs are documents in the `jobs` collection, so they survive restarts and
+any process can report on them. A pending job holds its kind in
+`pending_key`, which has a unique index: enqueueing a kind that is already
+pending returns the pending job instead of queueing a duplicate. Claiming a
+job moves its `pending_key` to the job's own id, which frees the kind while
+keeping every key distinct.
+
+Each process runs one worker thread, started by its first enqueue, that
+claims pending jobs oldest first and polls for jobs queued by other
+processes. `manage.py jobs --run` drains the queue from the command line
+instead.
+"""
+import logging
+import threading
+import traceback
+
+from django.conf import settings
+from django.utils import timezone
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from .indexes import ensure_indexes
+from .leaderboard import rebuild_buckets
+from .models import Job
+from .mongo import get_collection
+from .ranking import rank_leaderboard, rank_periods
+from .stats import rebuild_user_stats
+
+logger = logging.getLogger(__name__)
+
+# Seconds the worker waits for a wake-up before checking the table again
+POLL_INTERVAL = 5
+
+
+def recompute_leaderboard():
+    return {'leaderboard': rank_leaderboard(), 'periods': rank_periods()}
+
+
+def rebuild_rollups():
+    rebuild_buckets()
+    return {'user_stats': rebuild_user_stats()}
+
+
+# Job kind -> function the worker runs; its return value is stored as the result
+JOB_KINDS = {
+    'recompute_leaderboard': recompute_leaderboard,
+    'rebuild_rollups': rebuild_rollups,
+}
+
+
+def enqueue(kind):
+    """Queue a `kind` job, or coalesce into the pending one. Returns the job document."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    collection = get_collection(Job)
+    job = None
+    while job is None:
+        try:
+            job = collection.find_one_and_update(
+                {'pending_key': kind},
+                {
+                    '$inc': {'requests': 1},
+                    '$setOnInsert': {
+                        'kind': kind, 'status': Job.PENDING, 'result': None, 'error': '',
+                        'created_at': timezone.now(), 'started_at': None, 'finished_at': None,
+                    },
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # A concurrent enqueue inserted the pending job first; coalesce
+            # into it, or insert again if a worker claimed it meanwhile
+            job = collection.find_one_and_update(
+                {'pending_key': kind}, {'$inc': {'requests': 1}}, return_document=ReturnDocument.AFTER,
+            )
+    worker.notify()
+    return job
+
+
+def claim():
+    """Mark the oldest pending job running and return it, or None."""
+    collection = get_collection(Job)
+    while True:
+        pending = collection.find_one({'status': Job.PENDING}, {'_id': 1}, sort=[('created_at', 1)])
+        if pending is None:
+            return None
+        job = collection.find_one_and_update(
+            {'_id': pending['_id'], 'status': Job.PENDING},
+            {'$set': {'status': Job.RUNNING, 'started_at': timezone.now(), 'pending_key': str(pending['_id'])}},
+            return_document=ReturnDocument.AFTER,
+        )
+        # None when another worker claimed it first; try the next one
+        if job is not None:
+            return job
+
+
+def run_job(job):
+    try:
+        result = JOB_KINDS[job['kind']]()
+    except Exception:
+        logger.exception("Job %s (%s) failed", job['_id'], job['kind'])
+        update = {'status': Job.FAILED, 'error': traceback.format_exc()}
+    else:
+        update = {'status': Job.DONE, 'result': result}
+    update['finished_at'] = timezone.now()
+    get_collection(Job).update_one({'_id': job['_id']}, {'$set': update})
+
+
+def run_pending():
+    """Run pending jobs in the calling thread until none is left. Returns how many ran."""
+    ran = 0
+    while True:
+        job = claim()
+        if job is None:
+            return ran
+        run_job(job)
+        ran += 1
+
+
+class JobWorker:
+    """
+    The per-process worker thread. It is started lazily, so management
+    commands and processes that never enqueue run no thread, and not at all
+    when `settings.OCTOFIT_JOB_WORKER` is off.
+    """
+
+    def __init__(self, poll_interval=POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def notify(self):
+        if not getattr(settings, 'OCTOFIT_JOB_WORKER', True):
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='octofit-jobs', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        # Coalescing relies on the unique pending_key index
+        ensure_indexes([Job])
+        while True:
+            self._wake.clear()
+            try:
+                run_pending()
+            except Exception:
+                logger.exception("Job worker could not reach the job table")
+            self._wake.wait(self.poll_interval)
+
+
+worker = JobWorker()
+
+
+def format_job(document):
+    return {
+        'id': str(document['_id']),
+        'kind': document.get('kind'),
+        'status': document.get('status'),
+        'requests': document.get('requests', 1),
+        'result': document.get('result'),
+        'error': document.get('error') or None,
+        'created_at': document.get('created_at'),
+        'started_at': document.get('started_at'),
+        'finished_at': document.get('finished_at'),
+    }
+
+
+def recent_jobs(limit=50, status=None):
+    query = {'status': status} if status else {}
+    return [
+        format_job(document)
+        for document in get_collection(Job).find(query).sort('created_at', -1).limit(limit)
+    ]
@@ -0,0 +1,334 @@
+"""
+Incremental leaderboard maintenance.
+
+Every activity write adjusts the owning user's totals with an atomic `$inc`
+and then shifts the rank of only the entries the user overtook or fell
+behind, so the leaderboard never needs a full recomputation.
+
+Ranks follow standard competition ranking on total points (see
+`total_points`), the key every leaderboard view ranks by: an entry's rank is
+1 + the number of entries with strictly more points. Each entry stores its
+`total_points` so the range queries below can use an index.
+
+The same writes also maintain per-user daily buckets (`LeaderboardBucket`),
+so daily, weekly and monthly leaderboards are a merge of at most 30 small
+documents per user instead of a scan of the raw activities.
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+from bson import ObjectId
+from django.core.cache import cache
+from django.utils import timezone
+from pymongo import ReturnDocument
+
+from .cache import invalidate
+from .denormalize import denormalized_names
+from .models import Activity, Leaderboard, LeaderboardBucket, Team, User
+from .mongo import get_collection, object_ids
+from .stats import apply_stats_changes
+
+# Rolling window length, in daily buckets, of each leaderboard period
+PERIOD_DAYS = {'day': 1, 'week': 7, 'month': 30}
+
+# Points: activities * 10 + calories / 10
+POINTS_PER_ACTIVITY = 10
+CALORIES_PER_POINT = 10
+
+# total_points() as an aggregation expression over a leaderboard document;
+# $toInt because $divide yields a double, and stored points compare as ints
+POINTS_EXPRESSION = {'$toInt': {'$add': [
+    {'$multiply': ['$total_activities', POINTS_PER_ACTIVITY]},
+    {'$floor': {'$divide': ['$total_calories', CALORIES_PER_POINT]}},
+]}}
+
+TEAM_LEADERBOARD_CACHE_KEY = 'leaderboard:teams'
+TEAM_LEADERBOARD_CACHE_TIMEOUT = 300  # seconds; activity writes invalidate it sooner
+
+
+def total_points(total_activities, total_calories):
+    return (total_activities * POINTS_PER_ACTIVITY) + (total_calories // CALORIES_PER_POINT)
+
+
+def _user_team_ids(user_ids):
+    """{user_id: team_id} of the given string user ids, in one `$in` query."""
+    ids = object_ids(user_ids)
+    if not ids:
+        return {}
+    documents = get_collection(User).find({'_id': {'$in': list(ids)}}, {'team_id': 1})
+    return {str(document['_id']): document.get('team_id') for document in documents}
+
+
+def _shift_ranks(collection, user_id, old_points, new_points):
+    others = {'user_id': {'$ne': user_id}}
+    if new_points > old_points:
+        # Entries the user has just overtaken drop one place
+        collection.update_many(
+            dict(others, total_points={'$gte': old_points, '$lt': new_points}),
+            {'$inc': {'rank': 1}},
+        )
+    elif new_points < old_points:
+        # Entries the user has fallen behind move up one place
+        collection.update_many(
+            dict(others, total_points={'$gte': new_points, '$lt': old_points}),
+            {'$inc': {'rank': -1}},
+        )
+    rank = 1 + collection.count_documents({'total_points': {'$gt': new_points}})
+    collection.update_one({'user_id': user_id}, {'$set': {'rank': rank}})
+
+
+def apply_delta(user_id, activities=0, calories=0, duration=0, team_id=None):
+    """
+    Adjust one user's leaderboard totals and re-rank the affected slice.
+    `team_id` is the user's team, recorded when this creates their entry.
+    """
+    if not user_id or not (activities or calories or duration):
+        return
+    collection = get_collection(Leaderboard)
+    before = collection.find_one_and_update(
+        {'user_id': user_id},
+        {
+            '$inc': {
+                'total_activities': activities,
+                'total_calories': calories,
+                'total_duration': duration,
+            },
+            '$set': {'updated_at': timezone.now()},
+            '$setOnInsert': {'team_id': team_id, 'rank': 0},
+        },
+        upsert=True,
+        return_document=ReturnDocument.BEFORE,
+        projection={'total_activities': 1, 'total_calories': 1},
+    )
+    old_activities = before.get('total_activities', 0) if before else 0
+    old_calories = before.get('total_calories', 0) if before else 0
+    old_points = total_points(old_activities, old_calories)
+    new_points = total_points(old_activities + activities, old_calories + calories)
+    update = {'total_points': new_points}
+    if before is None:
+        # New entry: copy the names only now, so updates never look them up
+        update.update(denormalized_names(Leaderboard, {'user_id': user_id, 'team_id': team_id}))
+    # Matching the totals leaves the points to a concurrent write that has moved them on
+    collection.update_one(
+        {
+            'user_id': user_id,
+            'total_activities': old_activities + activities,
+            'total_calories': old_calories + calories,
+        },
+        {'$set': update},
+    )
+    _shift_ranks(collection, user_id, old_points, new_points)
+
+
+def bucket_start(value):
+    """Midnight UTC of the day `value` falls on."""
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value.astimezone(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def activity_deltas(added=(), removed=(), key=lambda activity: activity.user_id):
+    """Net (activities, calories, duration) change per `key` for a set of activity writes."""
+    deltas = {}
+    for sign, activities in ((1, added), (-1, removed)):
+        for activity in activities:
+            count, calories, duration = deltas.get(key(activity), (0, 0, 0))
+            deltas[key(activity)] = (
+                count + sign,
+                calories + sign * activity.calories_burned,
+                duration + sign * activity.duration,
+            )
+    return deltas
+
+
+def apply_bucket_delta(user_id, start, activities=0, calories=0, duration=0, team_id=None):
+    if not user_id or not (activities or calories or duration):
+        return
+    get_collection(LeaderboardBucket).update_one(
+        {'user_id': user_id, 'bucket_start': start},
+        {
+            '$inc': {
+                'total_activities': activities,
+                'total_calories': calories,
+                'total_duration': duration,
+            },
+            '$setOnInsert': {'team_id': team_id},
+        },
+        upsert=True,
+    )
+
+
+def apply_activity_changes(added=(), removed=()):
+    """
+    Apply the leaderboard effect of activities being created (`added`),
+    deleted (`removed`) or updated (old version removed, new one added).
+    Each affected user, and each affected daily bucket, is updated once,
+    and so is each owner's statistics rollup (see stats.py).
+    """
+    deltas = activity_deltas(added, removed)
+    team_ids = _user_team_ids(deltas)
+    for user_id, (count, calories, duration) in deltas.items():
+        apply_delta(user_id, count, calories, duration, team_ids.get(user_id))
+    cache.delete(TEAM_LEADERBOARD_CACHE_KEY)
+    invalidate('leaderboard')
+
+    bucket_deltas = activity_deltas(
+        added, removed, key=lambda activity: (activity.user_id, bucket_start(activity.date))
+    )
+    for (user_id, start), (count, calories, duration) in bucket_deltas.items():
+        apply_bucket_delta(user_id, start, count, calories, duration, team_ids.get(user_id))
+
+    apply_stats_changes(added, removed)
+
+
+def bucket_rollup_pipeline():
+    """Aggregation that rolls raw activities up into daily buckets."""
+    return [
+        {'$group': {
+            '_id': {
+                'user_id': '$user_id',
+                'bucket_start': {'$dateFromParts': {
+                    'year': {'$year': '$date'},
+                    'month': {'$month': '$date'},
+                    'day': {'$dayOfMonth': '$date'},
+                }},
+            },
+            'total_activities': {'$sum': 1},
+            'total_calories': {'$sum': '$calories_burned'},
+            'total_duration': {'$sum': '$duration'},
+        }},
+        {'$project': {
+            '_id': 0,
+            'user_id': '$_id.user_id',
+            'team_id': {'$literal': None},
+            'bucket_start': '$_id.bucket_start',
+            'total_activities': 1,
+            'total_calories': 1,
+            'total_duration': 1,
+        }},
+    ]
+
+
+def rebuild_buckets():
+    """Recompute every daily bucket from the raw activities (backfill)."""
+    pipeline = bucket_rollup_pipeline() + [{'$out': LeaderboardBucket._meta.db_table}]
+    list(get_collection(Activity).aggregate(pipeline, allowDiskUse=True))
+
+    buckets = get_collection(LeaderboardBucket)
+    for team in Team.objects.all():
+        member_ids = [str(user._id) for user in User.objects.filter(team_id=str(team._id))]
+        if member_ids:
+            buckets.update_many({'user_id': {'$in': member_ids}}, {'$set': {'team_id': str(team._id)}})
+
+
+def period_window_start(period, now=None):
+    return bucket_start(now or timezone.now()) - timedelta(days=PERIOD_DAYS[period] - 1)
+
+
+def period_pipeline(start, limit=None, after=None):
+    """
+    Merge the daily buckets since `start` into per-user totals, best first.
+    With `after`, the (points, user_id) of the last entry already read, the
+    merge resumes right behind that entry.
+    """
+    pipeline = [
+        {'$match': {'bucket_start': {'$gte': start}}},
+        {'$group': {
+            '_id': '$user_id',
+            'team_id': {'$last': '$team_id'},
+            'total_activities': {'$sum': '$total_activities'},
+            'total_calories': {'$sum': '$total_calories'},
+            'total_duration': {'$sum': '$total_duration'},
+        }},
+        {'$match': {'total_activities': {'$gt': 0}}},
+        {'$addFields': {'total_points': POINTS_EXPRESSION}},
+    ]
+    if after is not None:
+        points, user_id = after
+        pipeline.append({'$match': {'$or': [
+            {'total_points': {'$lt': points}},
+            {'total_points': points, '_id': {'$gt': user_id}},
+        ]}})
+    pipeline.append({'$sort': {'total_points': -1, '_id': 1}})
+    if limit:
+        pipeline.append({'$limit': limit})
+    return pipeline
+
+
+def period_leaderboard(period, limit=None, after=None):
+    """
+    Ranked, unsaved `Leaderboard` entries for a rolling day/week/month window,
+    computed from the daily buckets. `after` is the (position, rank, points,
+    user_id) of the last entry of the previous page; the ranking carries on
+    from it.
+    """
+    position, rank, previous_points, key = 0, 0, None, None
+    if after is not None:
+        position, rank, previous_points, user_id = after
+        key = (previous_points, user_id)
+    rows = get_collection(LeaderboardBucket).aggregate(
+        period_pipeline(period_window_start(period), limit, key)
+    )
+    entries = []
+    for position, row in enumerate(rows, start=position + 1):
+        points = int(row['total_points'])
+        if points != previous_points:
+            rank, previous_points = position, points
+        entries.append(Leaderboard(
+            user_id=row['_id'],
+            team_id=row['team_id'],
+            total_activities=row['total_activities'],
+            total_calories=row['total_calories'],
+            total_duration=row['total_duration'],
+            total_points=points,
+            rank=rank,
+        ))
+    return entries
+
+
+def team_points_pipeline():
+    """Sum every member's entry per team, with points computed like `total_points`."""
+    return [
+        {'$match': {'team_id': {'$nin': [None, '']}}},
+        {'$group': {
+            '_id': '$team_id',
+            'members': {'$sum': 1},
+            'total_activities': {'$sum': '$total_activities'},
+            'total_calories': {'$sum': '$total_calories'},
+            'total_duration': {'$sum': '$total_duration'},
+            'total_points': {'$sum': POINTS_EXPRESSION},
+        }},
+        {'$sort': {'total_points': -1, '_id': 1}},
+    ]
+
+
+def team_leaderboard():
+    """Teams ranked by total points, cached until the next activity write."""
+    rows = cache.get(TEAM_LEADERBOARD_CACHE_KEY)
+    if rows is not None:
+        return rows
+
+    groups = list(get_collection(Leaderboard).aggregate(team_points_pipeline()))
+    team_ids = [ObjectId(group['_id']) for group in groups if ObjectId.is_valid(group['_id'])]
+    team_names = {
+        str(team._id): team.name
+        for team in Team.objects.filter(_id__in=team_ids).only('_id', 'name')
+    } if team_ids else {}
+
+    rows = []
+    rank, previous_points = 0, None
+    for position, group in enumerate(groups, start=1):
+        points = int(group['total_points'])
+        if points != previous_points:
+            rank, previous_points = position, points
+        rows.append({
+            'rank': rank,
+            'team_id': group['_id'],
+            'team': team_names.get(group['_id']),
+            'members': group['members'],
+            'total_activities': group['total_activities'],
+            'total_calories': group['total_calories'],
+            'total_duration': group['total_duration'],
+            'total_points': points,
+        })
+    cache.set(TEAM_LEADERBOARD_CACHE_KEY, rows, TEAM_LEADERBOARD_CACHE_TIMEOUT)
+    return rows
@@ -0,0 +1,198 @@
+"""
+In-memory ordered index of the leaderboard by total points.
+
+Serves the two home screen queries, the top K entries and one user's rank,
+without scanning the collection: the index keeps every entry's
+(-points, user_id) key in a `SortedList` (blocks of sorted lists, so an
+insert or removal costs O(log n) rather than the O(n) shift of one flat
+list), which makes the top K a slice and a rank a binary search. Ranks are
+standard competition ranks on points: 1 + the number of entries with
+strictly more points.
+
+The index is built from Mongo on its first use in a process, so that first
+query pays for reading every entry; it is not warmed at startup, which would
+also run for every management command. After that it follows writes by
+polling: every write bumps the entry's `updated_at`, and a query made
+`SYNC_INTERVAL` or more after the last sync first reads the entries changed
+since the newest `updated_at` seen (through the `leaderboard_updated` index).
+A write, made by this process or any other, therefore shows up in queries
+at most `SYNC_INTERVAL` seconds later. Deletions are only seen by the full
+rebuild every `REBUILD_INTERVAL`, or at once in the process that made them.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from sortedcontainers import SortedList
+
+from .leaderboard import POINTS_EXPRESSION, total_points
+from .models import Leaderboard, Team, User
+from .mongo import get_collection, resolve_names
+
+# Seconds between incremental syncs; queries in between read the index as is
+SYNC_INTERVAL = 1.0
+
+# Seconds between full rebuilds, which also drop entries deleted elsewhere
+REBUILD_INTERVAL = 600
+
+# Writes whose `updated_at` is this much older than the newest one seen are
+# still re-read, covering clock skew between processes and slow writes
+SYNC_OVERLAP = timedelta(seconds=5)
+
+PROJECTION = {
+    '_id': 0, 'user_id': 1, 'team_id': 1, 'user_name': 1, 'team_name': 1,
+    'total_activities': 1, 'total_calories': 1, 'total_duration': 1, 'updated_at': 1,
+}
+
+
+def _entry(document):
+    total_activities = document.get('total_activities', 0)
+    total_calories = document.get('total_calories', 0)
+    return {
+        'user_id': document['user_id'],
+        'user_name': document.get('user_name'),
+        'team_id': document.get('team_id'),
+        'team_name': document.get('team_name'),
+        'total_activities': total_activities,
+        'total_calories': total_calories,
+        'total_duration': document.get('total_duration', 0),
+        'total_points': total_points(total_activities, total_calories),
+    }
+
+
+def _key(entry):
+    return (-entry['total_points'], entry['user_id'])
+
+
+class LeaderboardIndex:
+    def __init__(self, sync_interval=SYNC_INTERVAL, rebuild_interval=REBUILD_INTERVAL):
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._keys = SortedList()
+        self._entries = {}
+        self._high_water = None
+        self._built_at = None
+        self._synced_at = None
+
+    def invalidate(self):
+        """Rebuild from Mongo on the next query."""
+        with self._lock:
+            self._built_at = None
+
+    def rebuild(self):
+        entries, high_water = {}, None
+        for document in get_collection(Leaderboard).find({'user_id': {'$nin': [None, '']}}, PROJECTION):
+            entries[document['user_id']] = _entry(document)
+            if document.get('updated_at') and (high_water is None or document['updated_at'] > high_water):
+                high_water = document['updated_at']
+        self._entries = entries
+        self._keys = SortedList(_key(entry) for entry in entries.values())
+        self._high_water = high_water
+        self._built_at = self._synced_at = time.monotonic()
+
+    def apply(self, document):
+        """Insert or move one entry, in O(log n) amortized."""
+        entry = _entry(document)
+        previous = self._entries.get(entry['user_id'])
+        if previous is not None:
+            self._keys.remove(_key(previous))
+        self._keys.add(_key(entry))
+        self._entries[entry['user_id']] = entry
+
+    def sync(self):
+        now = time.monotonic()
+        if self._built_at is None or now - self._built_at >= self.rebuild_interval:
+            self.rebuild()
+            return
+        if now - self._synced_at < self.sync_interval:
+            return
+        query = {'user_id': {'$nin': [None, '']}}
+        if self._high_water is not None:
+            query['updated_at'] = {'$gte': self._high_water - SYNC_OVERLAP}
+        for document in get_collection(Leaderboard).find(query, PROJECTION):
+            self.apply(document)
+            if document.get('updated_at') and (self._high_water is None or document['updated_at'] > self._high_water):
+                self._high_water = document['updated_at']
+        self._synced_at = now
+
+    def _rank(self, points):
+        # Entries with more points sort before (-points,)
+        return self._keys.bisect_left((-points,)) + 1
+
+    def top(self, k):
+        with self._lock:
+            self.sync()
+            entries = [self._entries[user_id] for _, user_id in self._keys.islice(0, k)]
+            return [dict(entry, rank=self._rank(entry['total_points'])) for entry in entries]
+
+    def rank(self, user_id):
+        """The user's entry with its rank, or None if the user has none."""
+        with self._lock:
+            self.sync()
+            entry = self._entries.get(user_id)
+            return None if entry is None else dict(entry, rank=self._rank(entry['total_points']))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def check(self, limit=10):
+        """
+        Compare the index with ranks computed from scratch by Mongo. Returns
+        the number of entries checked and, per kind of mismatch, its count and
+        up to `limit` examples.
+        """
+        with self._lock:
+            self.sync()
+            problems = {'wrong_rank': [], 'missing': [], 'extra': [], 'inconsistent': []}
+            if len(self._keys) != len(self._entries):
+                problems['inconsistent'].append(len(self._keys))
+            pipeline = [
+                {'$match': {'user_id': {'$nin': [None, '']}}},
+                {'$project': {'_id': 0, 'user_id': 1, 'points': POINTS_EXPRESSION}},
+                {'$sort': {'points': -1}},
+            ]
+            seen, checked = set(), 0
+            rank, previous_points = 0, None
+            for position, row in enumerate(get_collection(Leaderboard).aggregate(pipeline, allowDiskUse=True), start=1):
+                points = int(row['points'])
+                if points != previous_points:
+                    rank, previous_points = position, points
+                seen.add(row['user_id'])
+                checked += 1
+                entry = self._entries.get(row['user_id'])
+                if entry is None:
+                    problems['missing'].append(row['user_id'])
+                elif entry['total_points'] != points or self._rank(entry['total_points']) != rank:
+                    problems['wrong_rank'].append({
+                        'user_id': row['user_id'], 'rank': rank,
+                        'indexed_rank': self._rank(entry['total_points']),
+                    })
+            problems['extra'] = [user_id for user_id in self._entries if user_id not in seen]
+            return {'checked': checked, 'problems': {
+                name: {'count': len(examples), 'examples': examples[:limit]}
+                for name, examples in problems.items() if examples
+            }}
+
+
+leaderboard_index = LeaderboardIndex()
+
+
+def format_ranked(entries):
+    """API rows for index entries, looking up only the names not denormalized."""
+    user_names = resolve_names(User, [entry['user_id'] for entry in entries if not entry['user_name']])
+    team_names = resolve_names(Team, [entry['team_id'] for entry in entries if not entry['team_name']])
+    return [
+        {
+            'rank': entry['rank'],
+            'user_id': entry['user_id'],
+            'user': entry['user_name'] or user_names.get(entry['user_id']) or "Unknown User",
+            'team_id': entry['team_id'],
+            'team': entry['team_name'] or team_names.get(entry['team_id']),
+            'total_activities': entry['total_activities'],
+            'total_calories': entry['total_calories'],
+            'total_duration': entry['total_duration'],
+            'total_points': entry['total_points'],
+        }
+        for entry in entries
+    ]
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from octofit_tracker.denormalize import BATCH_SIZE, NAME_FIELDS, backfill_names
+
+
+class Command(BaseCommand):
+    help = 'Copy user and team names onto activity and leaderboard documents that have none (backfill)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Documents per chunk')
+        parser.add_argument(
+            '--sleep', type=float, default=0.0,
+            help='Seconds to pause between chunks, to throttle the backfill on a busy server',
+        )
+
+    def handle(self, *args, **options):
+        for model in NAME_FIELDS:
+            self.stdout.write(f'Backfilling names on {model._meta.db_table}...')
+            written = backfill_names(model, batch_size=options['batch_size'], pause=options['sleep'])
+            self.stdout.write(self.style.SUCCESS(f'✓ Wrote {written} names on {model._meta.db_table}'))
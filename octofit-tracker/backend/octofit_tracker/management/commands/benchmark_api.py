@@ -0,0 +1,106 @@
+import json
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from octofit_tracker.benchmark import ACTIONS, ApiBenchmark, compare, environment
+from octofit_tracker.management.commands.populate_db import SAMPLE_PASSWORD
+
+RESULTS_DIR = Path(settings.BASE_DIR) / 'benchmarks' / 'results'
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database with synthetic data, then measure list, retrieve and create '
+        'on every API endpoint and write the results as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--activities-per-user', type=int, default=20)
+        parser.add_argument('--teams', type=int, default=10)
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument('--seed', type=int, default=42, help='Random seed of the synthetic dataset')
+        parser.add_argument('--repeat', type=int, default=50, help='Measured requests per endpoint and action')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests before each measurement')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument(
+            '--endpoint', action='append',
+            help='Only benchmark this router prefix, e.g. activities, or "auth" for login vs token requests',
+        )
+        parser.add_argument('--action', action='append', choices=ACTIONS, help='Only benchmark this action')
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='Keep the response cache between requests (default: clear it, to measure the full read path)',
+        )
+        parser.add_argument('--output', help=f'JSON report path (default: {RESULTS_DIR}/<commit>.json, "-" for stdout)')
+        parser.add_argument('--compare', help='Previous JSON report to compare p50 latencies against')
+
+    def handle(self, *args, **options):
+        dataset = {
+            key: options[key] for key in ('users', 'activities_per_user', 'teams', 'days', 'seed')
+        }
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            self.stderr.write(f'Seeding {dataset["users"]} users in {connection.settings_dict["NAME"]}...')
+            call_command('populate_db', batch_size=5000, stdout=StringIO(), **dataset)
+            benchmark = ApiBenchmark(
+                repeat=options['repeat'], warmup=options['warmup'],
+                page_size=options['page_size'], warm_cache=options['warm_cache'],
+            )
+            # Synthetic users all have the sample password
+            credentials = ('user1@octofit.test', SAMPLE_PASSWORD)
+            results = benchmark.run(options['endpoint'], options['action'] or ACTIONS, credentials)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'environment': environment(),
+            'dataset': dataset,
+            'options': {key: options[key] for key in ('repeat', 'warmup', 'page_size', 'warm_cache')},
+            'results': results,
+        }
+        self.write_report(report, options['output'])
+
+        self.stderr.write(f"\n{'request':<28} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+        for row in results:
+            latency = row['latency_ms']
+            self.stderr.write(
+                f"{row['endpoint'] + ' ' + row['action']:<28} {row['throughput_rps']:>8} "
+                f"{latency['p50']:>8} {latency['p95']:>8} {latency['p99']:>8} {row['queries_p50'] or '-':>8}"
+            )
+
+        if options['compare']:
+            self.print_comparison(options['compare'], report)
+
+    def write_report(self, report, output):
+        body = json.dumps(report, indent=2)
+        if output == '-':
+            self.stdout.write(body)
+            return
+        path = Path(output) if output else RESULTS_DIR / f"{report['environment']['commit'] or 'results'}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(body + '\n')
+        self.stderr.write(self.style.SUCCESS(f'✓ Wrote {path}'))
+
+    def print_comparison(self, previous_path, report):
+        try:
+            previous = json.loads(Path(previous_path).read_text())
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Cannot read {previous_path}: {exc}')
+        if previous.get('dataset') != report['dataset']:
+            self.stderr.write(self.style.WARNING('The reports were measured on different datasets'))
+        self.stderr.write(f"\nvs {previous['environment'].get('commit') or previous_path}")
+        for endpoint, action, old, new, change in compare(previous, report):
+            line = f"{endpoint + ' ' + action:<28} {old:>8} -> {new:>8} ms"
+            if change is not None:
+                line += f' ({change:+.0%})'
+            style = self.style.WARNING if change and change > 0.1 else self.style.SUCCESS
+            self.stderr.write(style(line))
@@ -0,0 +1,28 @@
+import json
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+
+from octofit_tracker.management.remote import add_remote_arguments, get_json
+
+
+class Command(BaseCommand):
+    help = (
+        'Check the in-memory leaderboard index of a running server (--url) against '
+        'ranks computed by MongoDB'
+    )
+
+    def add_arguments(self, parser):
+        add_remote_arguments(parser)
+        parser.add_argument('--examples', type=int, default=10, help='Mismatches to show per kind')
+
+    def handle(self, *args, **options):
+        if not options['url']:
+            # An index built here would only be compared with the data it was just built from
+            raise CommandError('--url is required: the index to check lives in the server process')
+        query = urlencode({'examples': options['examples']})
+        report = get_json(options, f'/api/leaderboard/index-check/?{query}')
+        if report['problems']:
+            self.stdout.write(json.dumps(report['problems'], indent=2, default=str))
+            raise CommandError(f"Leaderboard index is inconsistent ({report['checked']} entries checked)")
+        self.stdout.write(self.style.SUCCESS(f"✓ Leaderboard index matches {report['checked']} entries"))
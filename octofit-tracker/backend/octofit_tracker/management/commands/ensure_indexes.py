@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from octofit_tracker.indexes import ensure_indexes, explain_queries
+
+
+class Command(BaseCommand):
+    help = 'Create the MongoDB indexes declared on the models and report how the main API queries use them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-explain', action='store_true',
+            help='Only create the indexes, skip the explain() report',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Ensuring indexes...')
+        created = ensure_indexes()
+        for collection, names in created.items():
+            for name in names:
+                self.stdout.write(self.style.SUCCESS(f'✓ Created {collection}.{name}'))
+        if not created:
+            self.stdout.write(self.style.SUCCESS('✓ All indexes already exist'))
+
+        if options['no_explain']:
+            return
+
+        self.stdout.write('\nIndex usage of the main API queries:')
+        for row in explain_queries():
+            line = f"{row['query']:<30} {row['collection']:<20} {row['stage']:<9} {row['index'] or '-'}"
+            if row['stage'] == 'COLLSCAN':
+                self.stdout.write(self.style.WARNING(line))
+            else:
+                self.stdout.write(line)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from octofit_tracker.jobs import JOB_KINDS, enqueue, recent_jobs, run_pending
+
+
+def format_time(value):
+    return f'{value:%Y-%m-%d %H:%M:%S}' if value else '-'
+
+
+class Command(BaseCommand):
+    help = 'Show background jobs, queue one, or run the pending ones in this process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enqueue', choices=sorted(JOB_KINDS), help='Queue a job of this kind')
+        parser.add_argument('--run', action='store_true', help='Run every pending job here, then exit')
+        parser.add_argument('--status', help='Only list jobs with this status')
+        parser.add_argument('--limit', type=int, default=20, help='Jobs to list')
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            job = enqueue(options['enqueue'])
+            self.stdout.write(self.style.SUCCESS(
+                f"✓ Job {job['_id']} ({job['kind']}) is pending, requested {job['requests']} time(s)"
+            ))
+        if options['run']:
+            ran = run_pending()
+            self.stdout.write(self.style.SUCCESS(f'✓ Ran {ran} job(s)'))
+
+        jobs = recent_jobs(options['limit'], options['status'])
+        if not jobs:
+            self.stdout.write('No jobs.')
+            return
+        self.stdout.write(f"{'id':<26}{'kind':<24}{'status':<10}{'requests':>9}  {'created':<21}finished")
+        for job in jobs:
+            self.stdout.write(
+                f"{job['id']:<26}{job['kind']:<24}{job['status']:<10}{job['requests']:>9}  "
+                f"{format_time(job['created_at']):<21}{format_time(job['finished_at'])}"
+            )
+            if job['error']:
+                self.stdout.write(self.style.ERROR(job['error'].strip().splitlines()[-1]))
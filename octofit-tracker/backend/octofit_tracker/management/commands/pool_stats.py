@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from octofit_tracker.management.remote import add_remote_arguments, get_json
+from octofit_tracker.models import User
+from octofit_tracker.mongo import get_collection
+from octofit_tracker.pool import pool_listener, pool_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Show the MongoDB connection pool settings and usage: of a running server '
+        '(--url), or of this process under a burst of concurrent queries (--burst)'
+    )
+
+    def add_arguments(self, parser):
+        add_remote_arguments(parser)
+        parser.add_argument('--burst', type=int, default=0, help='Run this many queries before reporting')
+        parser.add_argument('--threads', type=int, default=50, help='Concurrent threads for --burst')
+
+    def handle(self, *args, **options):
+        if options['url']:
+            stats = get_json(options, '/api/pool-stats/')
+        else:
+            collection = get_collection(User)
+            collection.find_one({}, {'_id': 1})
+            if options['burst']:
+                pool_listener.reset()
+                with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                    list(executor.map(
+                        lambda _: collection.find_one({}, {'_id': 1}), range(options['burst'])
+                    ))
+            stats = pool_stats(connection.settings_dict.get('CLIENT', {}))
+
+        self.stdout.write('Pool settings:')
+        for option, value in stats['settings'].items():
+            self.stdout.write(f'  {option:<26} {value if value is not None else "-"}')
+
+        for address, server in stats['servers'].items():
+            self.stdout.write(f'\n{address}')
+            wait = server['wait_ms']
+            self.stdout.write(
+                f"  open {server['open']}, checked out {server['checked_out']} "
+                f"(peak {server['max_checked_out']}), check-outs {server['check_outs']}"
+            )
+            self.stdout.write(
+                f"  wait ms: p50 {wait['p50']}, p95 {wait['p95']}, p99 {wait['p99']}, max {wait['max']}"
+            )
+            if server['failures']:
+                failures = ', '.join(f'{reason} {count}' for reason, count in server['failures'].items())
+                self.stdout.write(self.style.WARNING(f'  failed check-outs: {failures}'))
+            max_pool_size = stats['settings'].get('maxPoolSize')
+            if max_pool_size and server['max_checked_out'] >= max_pool_size:
+                self.stdout.write(self.style.WARNING('  pool was exhausted (peak reached maxPoolSize)'))
@@ -1,24 +1,77 @@
+import random
+from itertools import islice
+
+from bson import ObjectId
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
-from octofit_tracker.models import User, Team, Activity, Leaderboard, Workout
+from octofit_tracker.auth import hash_password
+from octofit_tracker.leaderboard import bucket_start, rebuild_buckets
+from octofit_tracker.models import (
+    User, Team, Activity, ActivityTombstone, Job, Leaderboard, LeaderboardBucket, PeriodRank, UserStats, Workout,
+)
+from octofit_tracker.mongo import get_collection
+from octofit_tracker.ranking import rank_leaderboard
+from octofit_tracker.stats import rebuild_user_stats
+
+# Password of every generated user, hashed once and shared, since each hash
+# costs ~100ms of CPU
+SAMPLE_PASSWORD = 'octofit123'
+
+ACTIVITY_TYPES = ['Running', 'Swimming', 'Cycling', 'Weight Training', 'Yoga', 'Boxing']
 
 
 class Command(BaseCommand):
     help = 'Populate the octofit_db database with test data'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int,
+            help='Generate this many synthetic users instead of the sample heroes',
+        )
+        parser.add_argument('--activities-per-user', type=int, default=20)
+        parser.add_argument('--teams', type=int, default=10)
+        parser.add_argument('--days', type=int, default=90, help='Spread synthetic activities over this many days')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Documents per insert_many call')
+        parser.add_argument('--seed', type=int, help='Random seed for reproducible synthetic data')
+
     def handle(self, *args, **options):
         self.stdout.write('Clearing existing data...')
         
-        # Delete all existing data
-        User.objects.all().delete()
-        Team.objects.all().delete()
-        Activity.objects.all().delete()
-        Leaderboard.objects.all().delete()
-        Workout.objects.all().delete()
+        # Delete all existing data, including ranks and jobs derived from it
+        models = (
+            User, Team, Activity, ActivityTombstone, Leaderboard, LeaderboardBucket, PeriodRank, UserStats, Workout,
+            Job,
+        )
+        for model in models:
+            get_collection(model).delete_many({})
         
         self.stdout.write(self.style.SUCCESS('✓ Cleared existing data'))
         
+        if options['users']:
+            self.create_synthetic_data(
+                users=options['users'],
+                activities_per_user=options['activities_per_user'],
+                teams=options['teams'],
+                days=options['days'],
+                batch_size=options['batch_size'],
+                seed=options['seed'],
+            )
+        else:
+            self.create_sample_data()
+        stats_created = rebuild_user_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Built {stats_created} user statistics rollups'))
+        self.create_workouts()
+        
+        self.stdout.write(self.style.SUCCESS('\n=== Database Population Complete ==='))
+        self.stdout.write(f'Teams: {Team.objects.count()}')
+        self.stdout.write(f'Users: {User.objects.count()}')
+        self.stdout.write(f'Activities: {Activity.objects.count()}')
+        self.stdout.write(f'Leaderboard Entries: {Leaderboard.objects.count()}')
+        self.stdout.write(f'Leaderboard Buckets: {LeaderboardBucket.objects.count()}')
+        self.stdout.write(f'Workouts: {Workout.objects.count()}')
+
+    def create_sample_data(self):
         # Create Teams
         self.stdout.write('Creating teams...')
         team_marvel = Team.objects.create(
@@ -33,35 +86,36 @@ class Command(BaseCommand):
         
         # Create Users
         self.stdout.write('Creating users...')
+        password = hash_password(SAMPLE_PASSWORD)
         marvel_users = [
             User.objects.create(
                 name='Spider-Man',
                 email='spiderman@marvel.com',
-                password='pbkdf2_sha256$390000$test',
+                password=password,
                 team_id=str(team_marvel._id),
             ),
             User.objects.create(
                 name='Iron Man',
                 email='ironman@marvel.com',
-                password='pbkdf2_sha256$390000$test',
+                password=password,
                 team_id=str(team_marvel._id),
             ),
             User.objects.create(
                 name='Captain America',
                 email='captainamerica@marvel.com',
-                password='pbkdf2_sha256$390000$test',
+                password=password,
                 team_id=str(team_marvel._id),
             ),
             User.objects.create(
                 name='Black Widow',
                 email='blackwidow@marvel.com',
-                password='pbkdf2_sha256$390000$test',
+                password=password,
                 team_id=str(team_marvel._id),
             ),
             User.objects.create(
                 name='Thor',
                 email='thor@marvel.com',
-                password='pbkdf2_sha256$390000$test',
+                password=password,
                 team_id=str(team_marvel._id),
             ),
         ]
@@ -70,31 +124,31 @@ class Command(BaseCommand):
             User.objects.create(
                 name='Batman',
                 email='batman@dc.com',
-                password='pbkdf2_sha256$390000$test',
+                password=password,
                 team_id=str(team_dc._id),
             ),
             User.objects.create(
                 name='Superman',
                 email='superman@dc.com',
-                password='pbkdf2_sha256$390000$test',
+                password=password,
                 team_id=str(team_dc._id),
             ),
             User.objects.create(
                 name='Wonder Woman',
                 email='wonderwoman@dc.com',
-                password='pbkdf2_sha256$390000$test',
+                password=password,
                 team_id=str(team_dc._id),
             ),
             User.objects.create(
                 name='Flash',
                 email='flash@dc.com',
-                password='pbkdf2_sha256$390000$test',
+                password=password,
                 team_id=str(team_dc._id),
             ),
             User.objects.create(
                 name='Aquaman',
                 email='aquaman@dc.com',
-                password='pbkdf2_sha256$390000$test',
+                password=password,
                 team_id=str(team_dc._id),
             ),
         ]
@@ -106,8 +160,10 @@ class Command(BaseCommand):
         self.stdout.write('Creating activities...')
         activity_types = ['Running', 'Swimming', 'Cycling', 'Weight Training', 'Yoga', 'Boxing']
         activities_created = 0
+        totals = {}
         
         for user in all_users:
+            totals[str(user._id)] = {'total_activities': 0, 'total_calories': 0, 'total_duration': 0}
             for i in range(5):
                 activity_type = activity_types[i % len(activity_types)]
                 duration = 30 + (i * 10)
@@ -115,6 +171,7 @@ class Command(BaseCommand):
                 
                 Activity.objects.create(
                     user_id=str(user._id),
+                    user_name=user.name,
                     activity_type=activity_type,
                     duration=duration,
                     calories_burned=calories,
@@ -122,41 +179,36 @@ class Command(BaseCommand):
                     notes=f'{user.name}\'s {activity_type.lower()} session',
                 )
                 activities_created += 1
+                totals[str(user._id)]['total_activities'] += 1
+                totals[str(user._id)]['total_calories'] += calories
+                totals[str(user._id)]['total_duration'] += duration
         
         self.stdout.write(self.style.SUCCESS(f'✓ Created {activities_created} activities'))
         
         # Create Leaderboard entries
         self.stdout.write('Creating leaderboard entries...')
-        leaderboard_data = []
+        team_names = {str(team._id): team.name for team in (team_marvel, team_dc)}
         
         for user in all_users:
-            user_activities = Activity.objects.filter(user_id=str(user._id))
-            total_activities = user_activities.count()
-            total_calories = sum([a.calories_burned for a in user_activities])
-            total_duration = sum([a.duration for a in user_activities])
-            
-            leaderboard_data.append({
-                'user': user,
-                'total_activities': total_activities,
-                'total_calories': total_calories,
-                'total_duration': total_duration,
-            })
-        
-        # Sort by total calories to assign ranks
-        leaderboard_data.sort(key=lambda x: x['total_calories'], reverse=True)
-        
-        for rank, data in enumerate(leaderboard_data, start=1):
             Leaderboard.objects.create(
-                user_id=str(data['user']._id),
-                team_id=data['user'].team_id,
-                total_activities=data['total_activities'],
-                total_calories=data['total_calories'],
-                total_duration=data['total_duration'],
-                rank=rank,
+                user_id=str(user._id),
+                team_id=user.team_id,
+                user_name=user.name,
+                team_name=team_names[user.team_id],
+                **totals[str(user._id)],
             )
         
-        self.stdout.write(self.style.SUCCESS(f'✓ Created {len(leaderboard_data)} leaderboard entries'))
-        
+        self.stdout.write(self.style.SUCCESS(f'✓ Created {len(all_users)} leaderboard entries'))
+        self.rank_entries()
+        rebuild_buckets()
+        self.stdout.write(self.style.SUCCESS('✓ Rebuilt daily leaderboard buckets'))
+
+    def rank_entries(self):
+        # Ranked by the server (see octofit_tracker/ranking.py); equal totals share a rank
+        method = rank_leaderboard()['method']
+        self.stdout.write(self.style.SUCCESS(f'✓ Ranked leaderboard entries ({method})'))
+
+    def create_workouts(self):
         # Create Workouts
         self.stdout.write('Creating workouts...')
         workouts = [
@@ -227,10 +279,117 @@ class Command(BaseCommand):
         ]
         
         self.stdout.write(self.style.SUCCESS(f'✓ Created {len(workouts)} workouts'))
-        
-        self.stdout.write(self.style.SUCCESS('\n=== Database Population Complete ==='))
-        self.stdout.write(f'Teams: {Team.objects.count()}')
-        self.stdout.write(f'Users: {User.objects.count()}')
-        self.stdout.write(f'Activities: {Activity.objects.count()}')
-        self.stdout.write(f'Leaderboard Entries: {Leaderboard.objects.count()}')
-        self.stdout.write(f'Workouts: {Workout.objects.count()}')
+
+    def insert_batched(self, model, documents, batch_size):
+        """Write `documents` with one insert_many per `batch_size` documents."""
+        collection = get_collection(model)
+        documents = iter(documents)
+        inserted = 0
+        while True:
+            batch = list(islice(documents, batch_size))
+            if not batch:
+                return inserted
+            collection.insert_many(batch, ordered=False)
+            inserted += len(batch)
+
+    def create_synthetic_data(self, users, activities_per_user, teams, days, batch_size, seed=None):
+        rng = random.Random(seed)
+        now = timezone.now()
+
+        self.stdout.write(f'Creating {teams} synthetic teams...')
+        team_ids = [ObjectId() for _ in range(teams)]
+        team_names = {str(team_id): f'Team {number}' for number, team_id in enumerate(team_ids, start=1)}
+        self.insert_batched(Team, (
+            {
+                '_id': team_id,
+                'name': team_names[str(team_id)],
+                'description': f'Synthetic team {number}',
+                'created_at': now,
+            }
+            for number, team_id in enumerate(team_ids, start=1)
+        ), batch_size)
+
+        self.stdout.write(f'Creating {users} synthetic users...')
+        password = hash_password(SAMPLE_PASSWORD)
+        user_ids = [ObjectId() for _ in range(users)]
+        user_names = {str(user_id): f'User {number}' for number, user_id in enumerate(user_ids, start=1)}
+        user_team_ids = {
+            str(user_id): str(team_ids[index % teams]) if teams else None
+            for index, user_id in enumerate(user_ids)
+        }
+        self.insert_batched(User, (
+            {
+                '_id': user_id,
+                'name': user_names[str(user_id)],
+                'email': f'user{number}@octofit.test',
+                'password': password,
+                'team_id': user_team_ids[str(user_id)],
+                'created_at': now,
+            }
+            for number, user_id in enumerate(user_ids, start=1)
+        ), batch_size)
+
+        # Totals are accumulated while the activities are generated, so the
+        # leaderboard never has to read them back
+        totals = {str(user_id): [0, 0, 0] for user_id in user_ids}
+        buckets = {}
+
+        def generate_activities():
+            for user_id in user_ids:
+                user_id = str(user_id)
+                for _ in range(activities_per_user):
+                    duration = rng.randint(10, 120)
+                    calories = duration * rng.randint(5, 12)
+                    date = now - timedelta(seconds=rng.randint(0, days * 86400))
+                    for key, counters in ((user_id, totals), ((user_id, bucket_start(date)), buckets)):
+                        row = counters.setdefault(key, [0, 0, 0])
+                        row[0] += 1
+                        row[1] += calories
+                        row[2] += duration
+                    yield {
+                        'user_id': user_id,
+                        'user_name': user_names[user_id],
+                        'activity_type': rng.choice(ACTIVITY_TYPES),
+                        'duration': duration,
+                        'calories_burned': calories,
+                        'date': date,
+                        'notes': '',
+                        'updated_at': now,
+                    }
+
+        self.stdout.write(f'Creating {users * activities_per_user} synthetic activities...')
+        activities_created = self.insert_batched(Activity, generate_activities(), batch_size)
+        self.stdout.write(self.style.SUCCESS(f'✓ Created {activities_created} activities'))
+
+        self.stdout.write('Creating leaderboard entries...')
+
+        def generate_entries():
+            for user_id, (count, calories, duration) in totals.items():
+                yield {
+                    'user_id': user_id,
+                    'team_id': user_team_ids[user_id],
+                    'user_name': user_names[user_id],
+                    'team_name': team_names.get(user_team_ids[user_id]),
+                    'total_activities': count,
+                    'total_calories': calories,
+                    'total_duration': duration,
+                    'rank': 0,
+                    'updated_at': now,
+                }
+
+        entries_created = self.insert_batched(Leaderboard, generate_entries(), batch_size)
+        self.stdout.write(self.style.SUCCESS(f'✓ Created {entries_created} leaderboard entries'))
+        self.rank_entries()
+
+        buckets_created = self.insert_batched(LeaderboardBucket, (
+            {
+                'user_id': user_id,
+                'team_id': user_team_ids[user_id],
+                'bucket_start': start,
+                'total_activities': count,
+                'total_calories': calories,
+                'total_duration': duration,
+            }
+            for (user_id, start), (count, calories, duration) in buckets.items()
+        ), batch_size)
+        self.stdout.write(self.style.SUCCESS(f'✓ Created {buckets_created} daily leaderboard buckets'))
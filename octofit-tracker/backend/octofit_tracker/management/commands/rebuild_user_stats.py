@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from octofit_tracker.stats import rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user statistics rollups from the raw activities (backfill)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', help='Only rebuild these users (default: everyone)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rollup documents per bulk_write call')
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids'] or None
+        self.stdout.write('Rebuilding user statistics...')
+        rebuilt = rebuild_user_stats(user_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Rebuilt {rebuilt} user statistics rollups'))
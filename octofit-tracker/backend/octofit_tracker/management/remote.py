@@ -0,0 +1,20 @@
+"""Reading the admin-only API endpoints of a running server from a management command."""
+import json
+from base64 import b64encode
+from urllib.request import Request, urlopen
+
+
+def add_remote_arguments(parser):
+    parser.add_argument('--url', help='Base URL of a running server, e.g. http://localhost:8000')
+    parser.add_argument('--username', help='Staff user to authenticate as with --url (HTTP Basic)')
+    parser.add_argument('--password', help='Password of --username')
+
+
+def get_json(options, path):
+    """GET `path` from the server at `options['url']` as the --username staff user."""
+    request = Request(options['url'].rstrip('/') + path)
+    if options.get('username'):
+        credentials = f"{options['username']}:{options.get('password') or ''}".encode()
+        request.add_header('Authorization', 'Basic ' + b64encode(credentials).decode())
+    with urlopen(request) as response:
+        return json.load(response)
@@ -0,0 +1,229 @@
+"""
+Per-request query and latency instrumentation.
+
+`RequestMetricsMiddleware` gives every request a `RequestMetrics` in a
+context variable. `command_listener`, registered with pymongo when the app
+loads, charges each Mongo command to the current request, so queries issued
+through djongo and straight through pymongo are counted alike.
+Serialization, turning documents or model instances into response data with
+a DRF or compiled serializer, is timed by `serialization_timer()` blocks
+around that work, less the Mongo time spent inside them (e.g. batched name
+lookups). Rendering that data to JSON is timed separately, from
+`process_template_response` to the end of `render()`.
+
+Each response carries the numbers in a `Server-Timing` header, and
+`metrics_registry` keeps per-route histograms of recent requests for
+/api/metrics/. Motor runs its commands on executor threads, outside the
+request's context, so queries made by the async views are not counted.
+
+`capture_commands()` records the same commands by name and collection, which
+is how the tests count queries: djongo's SQL log misses pymongo's.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from pymongo import monitoring
+
+from .timing import percentile
+
+# Recent requests kept per route for the percentiles
+ROUTE_SAMPLES = 1000
+
+# Upper bounds, in milliseconds, of the total-time histogram buckets
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_current = ContextVar('octofit_request_metrics', default=None)
+_captured = ContextVar('octofit_captured_commands', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'db_time', 'serialize_time', 'render_time', 'total_time', 'serializing')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.total_time = 0.0
+        self.serializing = False
+
+    def server_timing(self):
+        app_time = max(0.0, self.total_time - self.db_time - self.serialize_time - self.render_time)
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries"',
+            f'app;dur={app_time * 1000:.2f}',
+            f'serialize;dur={self.serialize_time * 1000:.2f}',
+            f'render;dur={self.render_time * 1000:.2f}',
+            f'total;dur={self.total_time * 1000:.2f}',
+        ])
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Charges every Mongo command to the request it runs for."""
+
+    def started(self, event):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.queries += 1
+        captured = _captured.get()
+        if captured is not None:
+            captured.append((event.command_name, event.command.get(event.command_name)))
+
+    def succeeded(self, event):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.db_time += event.duration_micros / 1e6
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+command_listener = CommandMetricsListener()
+
+
+@contextmanager
+def serialization_timer():
+    """
+    Charge the block to the current request's serialization time, less the
+    Mongo time spent inside it. Nested blocks, e.g. a serializer rendering
+    each row of a timed list, count once.
+    """
+    metrics = _current.get()
+    if metrics is None or metrics.serializing:
+        yield
+        return
+    metrics.serializing = True
+    started, db_time = time.perf_counter(), metrics.db_time
+    try:
+        yield
+    finally:
+        metrics.serializing = False
+        metrics.serialize_time += time.perf_counter() - started - (metrics.db_time - db_time)
+
+
+@contextmanager
+def capture_commands():
+    """Collect (command name, collection) for every Mongo command run in the block."""
+    captured = []
+    token = _captured.set(captured)
+    try:
+        yield captured
+    finally:
+        _captured.reset(token)
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.count = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.samples = deque(maxlen=ROUTE_SAMPLES)
+
+    def record(self, metrics):
+        total_ms = metrics.total_time * 1000
+        self.count += 1
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if total_ms <= bound), -1)
+        self.buckets[index] += 1
+        self.samples.append((
+            total_ms, metrics.db_time * 1000, metrics.serialize_time * 1000, metrics.render_time * 1000,
+            metrics.queries,
+        ))
+
+    def as_dict(self):
+        names = ('total_ms', 'db_ms', 'serialize_ms', 'render_ms', 'queries')
+        columns = list(zip(*self.samples)) or [()] * len(names)
+        summary = {}
+        for name, values in zip(names, columns):
+            ordered = sorted(values)
+            summary[name] = {
+                f'p{point}': None if not ordered else round(percentile(ordered, point / 100), 3)
+                for point in (50, 95, 99)
+            }
+        bounds = [str(bound) for bound in LATENCY_BUCKETS_MS] + ['+Inf']
+        summary['count'] = self.count
+        summary['histogram_ms'] = dict(zip(bounds, self.buckets))
+        return summary
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, route, metrics):
+        with self._lock:
+            if route not in self._routes:
+                self._routes[route] = RouteMetrics()
+            self._routes[route].record(metrics)
+
+    def snapshot(self):
+        with self._lock:
+            return {route: self._routes[route].as_dict() for route in sorted(self._routes)}
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+metrics_registry = MetricsRegistry()
+
+
+def route_name(request):
+    """'GET activity-list' style key: the method plus the URL name the request resolved to."""
+    match = getattr(request, 'resolver_match', None)
+    view_name = match.view_name if match is not None and match.view_name else 'unresolved'
+    return f'{request.method} {view_name}'
+
+
+class RequestMetricsMiddleware:
+    """Records query count, DB, serialization, render and total time of every request."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Mark the instance as a coroutine function, as MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    def process_template_response(self, request, response):
+        metrics = _current.get()
+        if metrics is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                metrics.render_time += time.perf_counter() - started
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, metrics, started):
+        metrics.total_time = time.perf_counter() - started
+        response['Server-Timing'] = metrics.server_timing()
+        metrics_registry.record(route_name(request), metrics)
+        return response
@@ -12,6 +12,9 @@ class User(djongo_models.Model):
 
     class Meta:
         db_table = 'users'
+        indexes = [
+            models.Index(fields=['team_id'], name='users_team_id'),
+        ]
 
     def __str__(self):
         return self.name
@@ -33,36 +36,193 @@ class Team(djongo_models.Model):
 class Activity(djongo_models.Model):
     _id = djongo_models.ObjectIdField(primary_key=True)
     user_id = models.CharField(max_length=24)
+    user_name = models.CharField(max_length=100, null=True, blank=True)  # denormalized, see denormalize.py
     activity_type = models.CharField(max_length=50)
     duration = models.IntegerField()  # in minutes
     calories_burned = models.IntegerField()
     date = models.DateTimeField()
     notes = models.TextField(blank=True)
+    # Bumped on every write; delta syncs (`?since=`, see sync.py) read by it
+    updated_at = models.DateTimeField(auto_now=True, null=True)
 
     class Meta:
         db_table = 'activities'
+        indexes = [
+            models.Index(fields=['user_id', '-date'], name='activities_user_date'),
+            models.Index(fields=['-date', '-_id'], name='activities_date'),
+            models.Index(fields=['activity_type', '-date'], name='activities_type_date'),
+            models.Index(fields=['updated_at', '_id'], name='activities_updated'),
+            models.Index(fields=['user_id', 'updated_at'], name='activities_user_updated'),
+        ]
 
     def __str__(self):
         return f"{self.activity_type} - {self.duration} mins"
 
 
+class ActivityTombstone(djongo_models.Model):
+    """
+    A deleted activity, kept so delta syncs can tell clients to drop it. An
+    activity moved to another user also leaves one under its previous user.
+    """
+    _id = djongo_models.ObjectIdField(primary_key=True)
+    activity_id = models.CharField(max_length=24)
+    user_id = models.CharField(max_length=24)
+    deleted_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'activity_tombstones'
+        indexes = [
+            models.Index(fields=['deleted_at'], name='tombstones_deleted'),
+            models.Index(fields=['user_id', 'deleted_at'], name='tombstones_user_deleted'),
+        ]
+
+    def __str__(self):
+        return f"{self.activity_id} deleted {self.deleted_at}"
+
+
 class Leaderboard(djongo_models.Model):
     _id = djongo_models.ObjectIdField(primary_key=True)
     user_id = models.CharField(max_length=24)
     team_id = models.CharField(max_length=24)
+    # Denormalized, see denormalize.py
+    user_name = models.CharField(max_length=100, null=True, blank=True)
+    team_name = models.CharField(max_length=100, null=True, blank=True)
     total_activities = models.IntegerField(default=0)
     total_calories = models.IntegerField(default=0)
     total_duration = models.IntegerField(default=0)  # in minutes
+    # total_points() of the totals, the key every rank is computed on
+    total_points = models.IntegerField(default=0)
     rank = models.IntegerField(default=0)
+    # Recomputed by the ranking job (see ranking.py), not on every write
+    dense_rank = models.IntegerField(default=0)
+    team_rank = models.IntegerField(default=0)
+    team_dense_rank = models.IntegerField(default=0)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'leaderboard'
+        indexes = [
+            models.Index(fields=['user_id'], name='leaderboard_user_id'),
+            models.Index(fields=['rank', '_id'], name='leaderboard_rank'),
+            models.Index(fields=['-total_points'], name='leaderboard_points'),
+            models.Index(fields=['team_id'], name='leaderboard_team_id'),
+            models.Index(fields=['updated_at'], name='leaderboard_updated'),
+        ]
 
     def __str__(self):
         return f"Rank {self.rank} - User {self.user_id}"
 
 
+class LeaderboardBucket(djongo_models.Model):
+    """Per-user activity totals for one UTC day, merged into period leaderboards."""
+    _id = djongo_models.ObjectIdField(primary_key=True)
+    user_id = models.CharField(max_length=24)
+    team_id = models.CharField(max_length=24, null=True, blank=True)
+    bucket_start = models.DateTimeField()  # midnight UTC
+    total_activities = models.IntegerField(default=0)
+    total_calories = models.IntegerField(default=0)
+    total_duration = models.IntegerField(default=0)  # in minutes
+
+    class Meta:
+        db_table = 'leaderboard_buckets'
+        indexes = [
+            models.Index(fields=['user_id', 'bucket_start'], name='buckets_user_start'),
+            models.Index(fields=['bucket_start', 'user_id'], name='buckets_start_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket_start:%Y-%m-%d} - User {self.user_id}"
+
+
+class PeriodRank(djongo_models.Model):
+    """
+    A user's totals and ranks over a rolling day/week/month window, as of
+    the last ranking job (see ranking.py).
+    """
+    _id = djongo_models.ObjectIdField(primary_key=True)
+    period = models.CharField(max_length=10)
+    user_id = models.CharField(max_length=24)
+    team_id = models.CharField(max_length=24, null=True, blank=True)
+    total_activities = models.IntegerField(default=0)
+    total_calories = models.IntegerField(default=0)
+    total_duration = models.IntegerField(default=0)  # in minutes
+    total_points = models.IntegerField(default=0)
+    rank = models.IntegerField(default=0)
+    dense_rank = models.IntegerField(default=0)
+    team_rank = models.IntegerField(default=0)
+    team_dense_rank = models.IntegerField(default=0)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'period_ranks'
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'user_id'], name='period_ranks_period_user'),
+        ]
+        indexes = [
+            models.Index(fields=['period', 'team_id', '-total_points'], name='period_ranks_team'),
+        ]
+
+    def __str__(self):
+        return f"{self.period} rank {self.rank} - User {self.user_id}"
+
+
+class Job(djongo_models.Model):
+    """
+    A background job run by the worker in jobs.py. `pending_key` is the job's
+    kind while it is pending and its own id once claimed; its unique index is
+    what coalesces duplicate requests for the same kind. It is never left
+    empty, so the index works whether djongo built it plain or we built it.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    _id = djongo_models.ObjectIdField(primary_key=True)
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, default=PENDING)
+    pending_key = models.CharField(max_length=50, unique=True)
+    requests = models.IntegerField(default=1)  # enqueue calls coalesced into this job
+    result = djongo_models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'jobs'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='jobs_status_created'),
+            models.Index(fields=['-created_at'], name='jobs_created'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} ({self.status})"
+
+
+class UserStats(djongo_models.Model):
+    """
+    Per-user activity rollup behind /api/users/{id}/stats/: lifetime totals,
+    plus per-activity-type and per-UTC-day counters keyed by type and by
+    'YYYY-MM-DD'. Maintained incrementally on activity writes.
+    """
+    _id = djongo_models.ObjectIdField(primary_key=True)
+    user_id = models.CharField(max_length=24, unique=True)
+    total_activities = models.IntegerField(default=0)
+    total_calories = models.IntegerField(default=0)
+    total_duration = models.IntegerField(default=0)  # in minutes
+    by_type = djongo_models.JSONField(default=dict)
+    by_day = djongo_models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'user_stats'
+        verbose_name_plural = 'user stats'
+
+    def __str__(self):
+        return f"Stats - User {self.user_id}"
+
+
 class Workout(djongo_models.Model):
     _id = djongo_models.ObjectIdField(primary_key=True)
     name = models.CharField(max_length=100)
@@ -74,6 +234,9 @@ class Workout(djongo_models.Model):
 
     class Meta:
         db_table = 'workouts'
+        indexes = [
+            models.Index(fields=['activity_type', 'difficulty'], name='workouts_type_difficulty'),
+        ]
 
     def __str__(self):
         return self.name
@@ -0,0 +1,48 @@
+import asyncio
+import weakref
+
+from bson import ObjectId
+from django.db import connection
+
+# Motor clients are bound to the event loop they are first used on
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_database():
+    """Return the pymongo database djongo is connected to."""
+    connection.ensure_connection()
+    return connection.connection
+
+
+def get_collection(model):
+    return get_database()[model._meta.db_table]
+
+
+def object_ids(values):
+    return {ObjectId(value) for value in values if value and ObjectId.is_valid(value)}
+
+
+def resolve_names(model, ids):
+    """{id: name} for the given string ids, in one `$in` query."""
+    ids = object_ids(ids)
+    if not ids:
+        return {}
+    documents = get_collection(model).find({'_id': {'$in': list(ids)}}, {'name': 1})
+    return {str(document['_id']): document.get('name') for document in documents}
+
+
+def get_async_database():
+    """Return the motor database for the running event loop, with djongo's client settings."""
+    # Imported here so the sync API does not depend on motor
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncIOMotorClient(**connection.settings_dict.get('CLIENT', {}))
+    return client[connection.settings_dict['NAME']]
+
+
+def get_async_collection(model, codec_options=None):
+    collection = get_async_database()[model._meta.db_table]
+    return collection.with_options(codec_options=codec_options) if codec_options else collection
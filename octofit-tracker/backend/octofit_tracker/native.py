@@ -0,0 +1,220 @@
+"""
+Opt-in native read path.
+
+With `settings.OCTOFIT_NATIVE_READS` enabled, the list and retrieve actions
+query the collections straight through pymongo, with projections, instead
+of having djongo render and re-parse SQL for every query. The documents are
+formatted into exactly the JSON the serializers produce; the equivalence
+tests in tests.py hold both paths to that.
+
+Viewsets whose list rendering is compiled (see compiled.py) set
+`compiled_list`, and their GET list always takes this path unless
+`settings.OCTOFIT_COMPILED_SERIALIZERS` is turned off.
+
+Filters, `?ordering=` and `?fields=` apply here as on the ORM path: the
+filter backends work on a NativeQuery, and a sparse fieldset becomes a
+projection.
+"""
+from datetime import timezone as dt_timezone
+
+from bson import ObjectId
+from bson.codec_options import CodecOptions
+from django.conf import settings
+from django.http import Http404
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .filters import SparseFieldsetMixin
+from .metrics import serialization_timer
+from .models import Team
+from .mongo import get_collection, resolve_names
+
+# Aware datetimes, like the ORM returns, so cursor positions match too
+CODEC_OPTIONS = CodecOptions(tz_aware=True, tzinfo=dt_timezone.utc)
+
+_datetime_field = serializers.DateTimeField()
+
+LOOKUP_OPERATORS = {'lt', 'lte', 'gt', 'gte', 'in'}
+
+
+def native_reads_enabled():
+    return getattr(settings, 'OCTOFIT_NATIVE_READS', False)
+
+
+def compiled_serializers_enabled():
+    return getattr(settings, 'OCTOFIT_COMPILED_SERIALIZERS', True)
+
+
+def native_collection(model):
+    return get_collection(model).with_options(codec_options=CODEC_OPTIONS)
+
+
+def format_datetime(value):
+    if value is None:
+        return None
+    if value.tzinfo is dt_timezone.utc and settings.TIME_ZONE == 'UTC' and api_settings.DATETIME_FORMAT == ISO_8601:
+        # What DRF renders for a UTC datetime, without its timezone conversion
+        value = value.isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return _datetime_field.to_representation(value)
+
+
+def _mongo_ordering(ordering):
+    return [(name.lstrip('-'), -1 if name.startswith('-') else 1) for name in ordering]
+
+
+class NativeQuery:
+    """
+    The part of the QuerySet API that CursorPagination relies on (`order_by`,
+    `filter` on the cursor position, slicing), executed with pymongo and
+    yielding raw documents.
+    """
+
+    def __init__(self, model, query=None, projection=None, ordering=()):
+        self.model = model
+        self.query = query or {}
+        self.projection = projection
+        self.ordering = tuple(ordering)
+
+    def _clone(self, **changes):
+        options = {
+            'query': self.query,
+            'projection': self.projection,
+            'ordering': self.ordering,
+        }
+        options.update(changes)
+        return NativeQuery(self.model, **options)
+
+    def order_by(self, *ordering):
+        return self._clone(ordering=ordering)
+
+    def filter(self, **lookups):
+        query = dict(self.query)
+        for lookup, value in lookups.items():
+            name, _, operator = lookup.partition('__')
+            field = self.model._meta.get_field(name)
+            if operator == 'in':
+                value = [field.to_python(item) for item in value]
+            else:
+                value = field.to_python(value)
+            if operator:
+                if operator not in LOOKUP_OPERATORS:
+                    raise ValueError(f'Unsupported lookup: {lookup}')
+                condition = dict(query.get(field.column) or {})
+                condition['$' + operator] = value
+                query[field.column] = condition
+            else:
+                query[field.column] = value
+        return self._clone(query=query)
+
+    def cursor(self):
+        cursor = native_collection(self.model).find(self.query, self.projection)
+        if self.ordering:
+            cursor = cursor.sort(_mongo_ordering(self.ordering))
+        return cursor
+
+    def __iter__(self):
+        return iter(self.cursor())
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice) or item.step is not None:
+            raise TypeError('NativeQuery only supports slicing without a step')
+        cursor = self.cursor()
+        start = item.start or 0
+        if start:
+            cursor = cursor.skip(start)
+        if item.stop is not None:
+            cursor = cursor.limit(item.stop - start)
+        return list(cursor)
+
+    def get(self, pk):
+        if not ObjectId.is_valid(pk):
+            raise Http404
+        document = native_collection(self.model).find_one({'_id': ObjectId(pk)}, self.projection)
+        if document is None:
+            raise Http404
+        return document
+
+
+def _select(rows, fields):
+    if fields is None:
+        return rows
+    return [{name: value for name, value in row.items() if name in fields} for row in rows]
+
+
+def format_users(documents, fields=None):
+    team_names = {}
+    if fields is None or 'team' in fields:
+        team_names = resolve_names(Team, [document.get('team_id') for document in documents])
+    return _select([
+        {
+            'id': str(document['_id']),
+            'name': document.get('name'),
+            'username': document.get('name'),
+            'email': document.get('email'),
+            'team_id': document.get('team_id'),
+            'team': team_names.get(document.get('team_id')),
+            'created_at': format_datetime(document.get('created_at')),
+        }
+        for document in documents
+    ], fields)
+
+
+def format_teams(documents, member_counts, fields=None):
+    return _select([
+        {
+            'id': str(document['_id']),
+            'name': document.get('name'),
+            'description': document.get('description'),
+            'created_at': format_datetime(document.get('created_at')),
+            'member_count': member_counts.get(str(document['_id']), 0),
+        }
+        for document in documents
+    ], fields)
+
+
+class NativeReadMixin(SparseFieldsetMixin):
+    """
+    Serves `list` and `retrieve` from pymongo when native reads are enabled.
+    Viewsets set `native_projection` and implement `format_documents`, which
+    renders only `fields` when a sparse fieldset was requested; callers go
+    through `render_documents`, which times it as serialization.
+    """
+    native_projection = None
+    compiled_list = False
+
+    def format_documents(self, documents, fields=None):
+        raise NotImplementedError
+
+    def render_documents(self, documents, fields=None):
+        with serialization_timer():
+            return self.format_documents(documents, fields)
+
+    def native_query(self):
+        model = self.get_queryset().model
+        projection = self.native_projection
+        columns = self.get_required_columns()
+        if columns:
+            projection = {model._meta.get_field(name).column: 1 for name in columns}
+        return NativeQuery(model, projection=projection)
+
+    def use_native_list(self):
+        return native_reads_enabled() or (self.compiled_list and compiled_serializers_enabled())
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_native_list():
+            return super().list(request, *args, **kwargs)
+        fields = self.get_requested_fields()
+        query = self.filter_queryset(self.native_query())
+        page = self.paginate_queryset(query)
+        if page is not None:
+            return self.get_paginated_response(self.render_documents(page, fields))
+        return Response(self.render_documents(list(query), fields))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not native_reads_enabled():
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        document = self.native_query().get(kwargs[lookup_url_kwarg])
+        return Response(self.render_documents([document], self.get_requested_fields())[0])
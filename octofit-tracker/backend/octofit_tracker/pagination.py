@@ -0,0 +1,46 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class ObjectIdCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the ObjectId primary key. ObjectIds are time-ordered,
+    so every page is an indexed range query on `_id` instead of a growing skip.
+    """
+    ordering = ('_id',)
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class ActivityCursorPagination(ObjectIdCursorPagination):
+    # Newest activities first; `_id` breaks ties between equal dates
+    ordering = ('-date', '-_id')
+
+
+class LeaderboardCursorPagination(ObjectIdCursorPagination):
+    # The leaderboard has to be read in rank order
+    ordering = ('rank', '_id')
+
+
+class ActivitySyncPagination(ObjectIdCursorPagination):
+    # Delta syncs read in write order, so writes made while a client pages
+    # through land after its position instead of being skipped
+    ordering = ('updated_at', '_id')
+
+
+def encode_period_cursor(position, rank, points, user_id):
+    """The `?cursor=` that resumes a period leaderboard after this entry."""
+    return urlsafe_b64encode(f'{position}:{rank}:{points}:{user_id}'.encode()).decode()
+
+
+def decode_period_cursor(value):
+    """(position, rank, points, user_id) from a period leaderboard cursor, or None without one."""
+    if not value:
+        return None
+    try:
+        position, rank, points, user_id = urlsafe_b64decode(value.encode()).decode().split(':')
+        return int(position), int(rank), int(points), user_id
+    except ValueError:
+        raise NotFound(CursorPagination.invalid_cursor_message)
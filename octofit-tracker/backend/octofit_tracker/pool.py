@@ -0,0 +1,160 @@
+"""
+MongoDB connection pool monitoring.
+
+`pool_listener` is registered with pymongo when the app loads, so it sees the
+pools of every client the process creates: djongo's and, under ASGI, motor's.
+Per server it tracks open and checked-out connections (with the peak), how
+long requests waited to check a connection out, and failed check-outs by
+reason; a `timeout` failure means the pool was exhausted for longer than
+`waitQueueTimeoutMS`.
+"""
+import threading
+import time
+from collections import deque
+
+from pymongo import monitoring
+
+from .timing import milliseconds, percentile
+
+# Check-out wait times kept per server for the percentiles
+WAIT_SAMPLES = 1000
+
+# Pool options read from DATABASES['default']['CLIENT'] for the report
+POOL_OPTIONS = (
+    'maxPoolSize', 'minPoolSize', 'maxIdleTimeMS', 'waitQueueTimeoutMS',
+    'serverSelectionTimeoutMS', 'connectTimeoutMS', 'socketTimeoutMS',
+)
+
+
+class ServerPoolStats:
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.check_outs = 0
+        self.failures = {}
+        self.clears = 0
+        self.max_wait = 0.0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+    def as_dict(self):
+        waits = sorted(self.waits)
+        return {
+            'open': self.open,
+            'checked_out': self.checked_out,
+            'max_checked_out': self.max_checked_out,
+            'check_outs': self.check_outs,
+            'failures': dict(self.failures),
+            'clears': self.clears,
+            'wait_ms': {
+                'p50': milliseconds(percentile(waits, 0.50)),
+                'p95': milliseconds(percentile(waits, 0.95)),
+                'p99': milliseconds(percentile(waits, 0.99)),
+                'max': milliseconds(self.max_wait),
+            },
+        }
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Aggregates pymongo's connection pool events per server address."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers = {}
+        # Check-outs block the calling thread, so the start time is per thread
+        self._started = threading.local()
+
+    def _server(self, address):
+        server = self._servers.get(address)
+        if server is None:
+            server = self._servers[address] = ServerPoolStats()
+        return server
+
+    def _wait(self, address):
+        started = getattr(self._started, 'times', {}).pop(address, None)
+        return None if started is None else time.perf_counter() - started
+
+    def pool_created(self, event):
+        with self._lock:
+            self._server(event.address)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._server(event.address).clears += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._servers.pop(event.address, None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._server(event.address).open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            server = self._server(event.address)
+            server.open = max(0, server.open - 1)
+
+    def connection_check_out_started(self, event):
+        if not hasattr(self._started, 'times'):
+            self._started.times = {}
+        self._started.times[event.address] = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        wait = self._wait(event.address)
+        with self._lock:
+            server = self._server(event.address)
+            server.failures[event.reason] = server.failures.get(event.reason, 0) + 1
+            if wait is not None:
+                server.max_wait = max(server.max_wait, wait)
+
+    def connection_checked_out(self, event):
+        wait = self._wait(event.address)
+        with self._lock:
+            server = self._server(event.address)
+            server.check_outs += 1
+            server.checked_out += 1
+            server.max_checked_out = max(server.max_checked_out, server.checked_out)
+            if wait is not None:
+                server.waits.append(wait)
+                server.max_wait = max(server.max_wait, wait)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            server = self._server(event.address)
+            server.checked_out = max(0, server.checked_out - 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                f'{host}:{port}': server.as_dict()
+                for (host, port), server in sorted(self._servers.items())
+            }
+
+    def reset(self):
+        """Restart the counters; open and checked-out connections are kept."""
+        with self._lock:
+            for server in self._servers.values():
+                server.check_outs = server.clears = 0
+                server.max_checked_out = server.checked_out
+                server.failures = {}
+                server.max_wait = 0.0
+                server.waits.clear()
+
+
+pool_listener = PoolStatsListener()
+
+
+def pool_settings(client_settings):
+    return {option: client_settings.get(option) for option in POOL_OPTIONS}
+
+
+def pool_stats(client_settings):
+    """Configured pool options plus the live per-server statistics."""
+    return {
+        'settings': pool_settings(client_settings),
+        'servers': pool_listener.snapshot(),
+    }
@@ -0,0 +1,208 @@
+"""
+Leaderboard ranking computed by MongoDB.
+
+Entries are ranked on total points (`POINTS_EXPRESSION`, the key the
+in-memory index and the incremental re-rank use too) two ways: standard
+competition ranks (1, 2, 2, 4), which `rank` also follows between
+recomputations, and dense ranks (1, 2, 2, 3). Each is computed globally (`rank`, `dense_rank`) and
+within the entry's team (`team_rank`, `team_dense_rank`).
+
+`rank_leaderboard` and `rank_periods` run the sort on the server with
+`$setWindowFields` and write the results back with `$merge`, so the Python
+process holds nothing per user. Both run as the `recompute_leaderboard`
+background job (see jobs.py). Servers older than MongoDB 5.0 lack window
+functions; on those, a batched fallback streams the entries in rank order
+instead and writes the changed ranks with one bulk_write per chunk.
+"""
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+from .cache import invalidate
+from .indexes import ensure_indexes
+from .leaderboard import POINTS_EXPRESSION, PERIOD_DAYS, period_pipeline, period_window_start
+from .models import Leaderboard, LeaderboardBucket, PeriodRank
+from .mongo import get_collection, get_database
+
+# Rank writes per bulk_write in the batched fallback
+CHUNK_SIZE = 1000
+
+RANK_FIELDS = ('rank', 'dense_rank', 'team_rank', 'team_dense_rank')
+
+
+def supports_window_functions():
+    """Whether the server has `$setWindowFields` (MongoDB 5.0+)."""
+    return tuple(get_database().client.server_info()['versionArray'][:2]) >= (5, 0)
+
+
+def window_rank_stages(score='total_points', team='$team_id'):
+    """Stages adding every RANK_FIELDS value to documents with a `score`."""
+    return [
+        {'$setWindowFields': {
+            'sortBy': {score: -1},
+            'output': {'rank': {'$rank': {}}, 'dense_rank': {'$denseRank': {}}},
+        }},
+        {'$setWindowFields': {
+            'partitionBy': team,
+            'sortBy': {score: -1},
+            'output': {'team_rank': {'$rank': {}}, 'team_dense_rank': {'$denseRank': {}}},
+        }},
+    ]
+
+
+def streamed_ranks(rows, score='total_points', partition=None):
+    """
+    Yield (row, rank, dense rank) for rows sorted by `partition`, then by
+    `score` descending; ranks restart with every partition. Holds one row.
+    """
+    started, current = False, None
+    for row in rows:
+        key = row.get(partition) if partition else None
+        if not started or key != current:
+            started, current = True, key
+            position, rank, dense_rank, previous = 0, 0, 0, object()
+        position += 1
+        if row.get(score) != previous:
+            rank, previous = position, row.get(score)
+            dense_rank += 1
+        yield row, rank, dense_rank
+
+
+class ChunkedWriter:
+    """Collects update operations and writes them with one bulk_write per chunk."""
+
+    def __init__(self, collection, chunk_size=CHUNK_SIZE):
+        self.collection = collection
+        self.chunk_size = chunk_size
+        self.operations = []
+        self.modified = 0
+
+    def add(self, operation):
+        self.operations.append(operation)
+        if len(self.operations) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.operations:
+            self.modified += self.collection.bulk_write(self.operations, ordered=False).modified_count
+            self.operations = []
+        return self.modified
+
+
+def _rank_leaderboard_with_windows():
+    # Stores the points too, filling them in on entries written before they were kept
+    pipeline = [{'$set': {'total_points': POINTS_EXPRESSION}}] + window_rank_stages() + [
+        {'$project': dict.fromkeys(RANK_FIELDS + ('total_points',), 1)},
+        {'$merge': {
+            'into': Leaderboard._meta.db_table, 'on': '_id',
+            'whenMatched': 'merge', 'whenNotMatched': 'discard',
+        }},
+    ]
+    list(get_collection(Leaderboard).aggregate(pipeline, allowDiskUse=True))
+
+
+def _rank_leaderboard_batched(chunk_size=CHUNK_SIZE):
+    collection = get_collection(Leaderboard)
+    writer = ChunkedWriter(collection, chunk_size)
+    def ranked_rows(fields, sort):
+        # Points are computed rather than read, so entries without stored ones rank right
+        projection = dict.fromkeys(('team_id', 'total_points') + fields, 1)
+        return collection.aggregate([
+            {'$project': dict(projection, points=POINTS_EXPRESSION)},
+            {'$sort': sort},
+        ], allowDiskUse=True)
+
+    passes = [
+        # Global ranks, which also store the points
+        (None, ('rank', 'dense_rank'), ranked_rows(('rank', 'dense_rank'), {'points': -1})),
+        # Team ranks; the server sorts, spilling to disk if it has to
+        ('team_id', ('team_rank', 'team_dense_rank'),
+         ranked_rows(('team_rank', 'team_dense_rank'), {'team_id': 1, 'points': -1})),
+    ]
+    for partition, fields, rows in passes:
+        for row, rank, dense_rank in streamed_ranks(rows, score='points', partition=partition):
+            values = dict(zip(fields, (rank, dense_rank)))
+            if partition is None:
+                values['total_points'] = int(row['points'])
+            if any(row.get(field) != value for field, value in values.items()):
+                writer.add(UpdateOne({'_id': row['_id']}, {'$set': values}))
+    return writer.flush()
+
+
+def rank_leaderboard(chunk_size=CHUNK_SIZE, use_windows=None):
+    """
+    Recompute every RANK_FIELDS value of every leaderboard entry. Returns the
+    method used; the batched fallback also reports how many rank updates it
+    wrote (one per entry and pass at most).
+    """
+    if use_windows is None:
+        use_windows = supports_window_functions()
+    result = {'method': 'window'}
+    if use_windows:
+        try:
+            _rank_leaderboard_with_windows()
+        except OperationFailure:
+            # e.g. a 5.0 server running with an older featureCompatibilityVersion
+            use_windows = False
+    if not use_windows:
+        result = {'method': 'batched', 'updated': _rank_leaderboard_batched(chunk_size)}
+    invalidate('leaderboard')
+    return result
+
+
+def _period_rows(period, start, computed_at):
+    """The period's per-user totals from the buckets, as PeriodRank documents without ranks."""
+    return period_pipeline(start) + [
+        {'$project': {
+            '_id': 0, 'period': {'$literal': period}, 'user_id': '$_id', 'team_id': 1,
+            'total_activities': 1, 'total_calories': 1, 'total_duration': 1, 'total_points': 1,
+            'computed_at': {'$literal': computed_at},
+        }},
+    ]
+
+
+def rank_periods(periods=tuple(PERIOD_DAYS), chunk_size=CHUNK_SIZE, use_windows=None):
+    """
+    Rank every user's totals over the rolling day/week/month windows into
+    `period_ranks`, replacing the previous run's rows. Returns the number of
+    ranked users per period.
+    """
+    if use_windows is None:
+        use_windows = supports_window_functions()
+    # $merge on (period, user_id) needs the unique index
+    ensure_indexes([PeriodRank])
+    ranks = get_collection(PeriodRank)
+    buckets = get_collection(LeaderboardBucket)
+    computed_at = get_database().command('isMaster')['localTime']
+
+    for period in periods:
+        rows = _period_rows(period, period_window_start(period), computed_at)
+        if use_windows:
+            pipeline = rows + window_rank_stages() + [{'$merge': {
+                'into': PeriodRank._meta.db_table, 'on': ['period', 'user_id'],
+                'whenMatched': 'merge', 'whenNotMatched': 'insert',
+            }}]
+            try:
+                list(buckets.aggregate(pipeline, allowDiskUse=True))
+            except OperationFailure:
+                use_windows = False
+        if not use_windows:
+            writer = ChunkedWriter(ranks, chunk_size)
+            # Global ranks first: the rows come out of the pipeline in that order
+            for row, rank, dense_rank in streamed_ranks(buckets.aggregate(rows, allowDiskUse=True)):
+                row.update(rank=rank, dense_rank=dense_rank)
+                writer.add(UpdateOne({'period': period, 'user_id': row['user_id']}, {'$set': row}, upsert=True))
+            writer.flush()
+            team_rows = ranks.find(
+                {'period': period, 'computed_at': computed_at}, {'team_id': 1, 'total_points': 1},
+            ).sort([('team_id', 1), ('total_points', -1)])
+            for row, rank, dense_rank in streamed_ranks(team_rows, partition='team_id'):
+                writer.add(UpdateOne({'_id': row['_id']}, {'$set': {'team_rank': rank, 'team_dense_rank': dense_rank}}))
+            writer.flush()
+        # Users with no activity left in the window
+        ranks.delete_many({'period': period, 'computed_at': {'$lt': computed_at}})
+    return {period: ranks.count_documents({'period': period}) for period in periods}
+
+
+def period_rank(period, user_id):
+    """The user's ranks in a rolling window as of the last `rank_periods`, or None."""
+    return get_collection(PeriodRank).find_one({'period': period, 'user_id': user_id}, {'_id': 0})
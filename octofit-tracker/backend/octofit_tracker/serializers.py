@@ -1,9 +1,160 @@
+from django.db import models
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from .auth import hash_password
+from .denormalize import denormalized_names
+from .leaderboard import total_points
+from .metrics import serialization_timer
 from .models import User, Team, Activity, Leaderboard, Workout
+from .mongo import object_ids
 from bson import ObjectId
 
 
-class UserSerializer(serializers.ModelSerializer):
+class NameLookup:
+    """
+    User and team names for every `user_id`/`team_id` referenced by a page of
+    rows, fetched with one `$in` query per model.
+    """
+
+    def __init__(self, user_names=None, team_names=None):
+        self.user_names = user_names or {}
+        self.team_names = team_names or {}
+
+    @staticmethod
+    def missing_ids(instances, id_field, name_field):
+        """Ids of the rows that carry no denormalized name to render."""
+        return object_ids(
+            getattr(obj, id_field, None) for obj in instances if not getattr(obj, name_field, None)
+        )
+
+    @classmethod
+    def for_instances(cls, instances, users=True, teams=True):
+        # Only touch the id fields whose names will be rendered; the others
+        # may be deferred by a sparse fieldset
+        user_ids = cls.missing_ids(instances, 'user_id', 'user_name') if users else set()
+        team_ids = cls.missing_ids(instances, 'team_id', 'team_name') if teams else set()
+
+        user_names = {}
+        if user_ids:
+            user_names = {
+                str(user._id): user.name
+                for user in User.objects.filter(_id__in=list(user_ids)).only('_id', 'name')
+            }
+        team_names = {}
+        if team_ids:
+            team_names = {
+                str(team._id): team.name
+                for team in Team.objects.filter(_id__in=list(team_ids)).only('_id', 'name')
+            }
+        return cls(user_names, team_names)
+
+
+class NameLookupListSerializer(serializers.ListSerializer):
+    """
+    Resolves the names referenced by the whole page before rendering it, so
+    the per-row `get_user`/`get_team` methods never query the database.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        items = list(iterable)
+        self.child.name_lookup = NameLookup.for_instances(
+            items, users='user' in self.child.fields, teams='team' in self.child.fields
+        )
+        return [self.child.to_representation(item) for item in items]
+
+
+class NameLookupMixin:
+    # Populated by NameLookupListSerializer; single-object serializers fall
+    # back to one query per lookup.
+    name_lookup = None
+
+    def lookup_user_name(self, user_id):
+        if not user_id:
+            return None
+        if self.name_lookup is not None:
+            return self.name_lookup.user_names.get(user_id)
+        try:
+            # Convert string ID to ObjectId for lookup
+            return User.objects.get(_id=ObjectId(user_id)).name
+        except (User.DoesNotExist, Exception):
+            return None
+
+    def lookup_team_name(self, team_id):
+        if not team_id:
+            return None
+        if self.name_lookup is not None:
+            return self.name_lookup.team_names.get(team_id)
+        try:
+            # Convert string ID to ObjectId for lookup
+            return Team.objects.get(_id=ObjectId(team_id)).name
+        except (Team.DoesNotExist, Exception):
+            return None
+
+
+class DenormalizedNamesMixin:
+    """
+    Copies the current user/team names onto the row whenever a write sets its
+    `user_id` or `team_id` (see denormalize.py).
+    """
+
+    def create(self, validated_data):
+        validated_data.update(denormalized_names(self.Meta.model, validated_data))
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        validated_data.update(denormalized_names(self.Meta.model, validated_data))
+        return super().update(instance, validated_data)
+
+
+def requested_fields(request):
+    """The field names asked for with `?fields=a,b` on a read, or None."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    value = request.query_params.get('fields')
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def source_columns(serializer_class, names):
+    """Model fields that have to be fetched to render the output fields `names`."""
+    columns = set()
+    for name, field in serializer_class().fields.items():
+        if name not in names:
+            continue
+        if isinstance(field, serializers.SerializerMethodField):
+            columns.update(serializer_class.method_field_sources.get(name, ()))
+        else:
+            columns.add(field.source)
+    return columns
+
+
+class SerializationTimingMixin:
+    """Charges rendering instances to the request's serialization time (see metrics.py)."""
+
+    def to_representation(self, instance):
+        with serialization_timer():
+            return super().to_representation(instance)
+
+
+class SparseFieldsMixin:
+    """
+    Renders only the fields listed in `?fields=` on reads. Subclasses name
+    the model fields each SerializerMethodField reads in
+    `method_field_sources`, so views can fetch only the columns needed.
+    """
+    method_field_sources = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = requested_fields(self.context.get('request'))
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+
+class UserSerializer(SerializationTimingMixin, SparseFieldsMixin, NameLookupMixin, serializers.ModelSerializer):
     id = serializers.SerializerMethodField()
     username = serializers.CharField(source='name', read_only=True)
     team = serializers.SerializerMethodField()
@@ -12,22 +163,27 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'name', 'username', 'email', 'password', 'team_id', 'team', 'created_at']
         extra_kwargs = {'password': {'write_only': True}}
+        list_serializer_class = NameLookupListSerializer
+
+    method_field_sources = {'id': ('_id',), 'team': ('team_id',)}
+
+    def create(self, validated_data):
+        validated_data['password'] = hash_password(validated_data['password'])
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        if 'password' in validated_data:
+            validated_data['password'] = hash_password(validated_data['password'])
+        return super().update(instance, validated_data)
 
     def get_id(self, obj):
         return str(obj._id)
     
     def get_team(self, obj):
-        if obj.team_id:
-            try:
-                # Convert string ID to ObjectId for lookup
-                team = Team.objects.get(_id=ObjectId(obj.team_id))
-                return team.name
-            except (Team.DoesNotExist, Exception):
-                return None
-        return None
+        return self.lookup_team_name(obj.team_id)
 
 
-class TeamSerializer(serializers.ModelSerializer):
+class TeamSerializer(SerializationTimingMixin, SparseFieldsMixin, serializers.ModelSerializer):
     id = serializers.SerializerMethodField()
     member_count = serializers.SerializerMethodField()
 
@@ -35,36 +191,38 @@ class TeamSerializer(serializers.ModelSerializer):
         model = Team
         fields = ['id', 'name', 'description', 'created_at', 'member_count']
 
+    method_field_sources = {'id': ('_id',), 'member_count': ('_id',)}
+
     def get_id(self, obj):
         return str(obj._id)
     
     def get_member_count(self, obj):
+        # TeamViewSet.list precomputes the counts for the whole page
+        member_counts = self.context.get('member_counts')
+        if member_counts is not None:
+            return member_counts.get(str(obj._id), 0)
         return User.objects.filter(team_id=str(obj._id)).count()
 
 
-class ActivitySerializer(serializers.ModelSerializer):
+class ActivitySerializer(SerializationTimingMixin, SparseFieldsMixin, NameLookupMixin, DenormalizedNamesMixin, serializers.ModelSerializer):
     id = serializers.SerializerMethodField()
     user = serializers.SerializerMethodField()
 
     class Meta:
         model = Activity
         fields = ['id', 'user_id', 'user', 'activity_type', 'duration', 'calories_burned', 'date', 'notes']
+        list_serializer_class = NameLookupListSerializer
+
+    method_field_sources = {'id': ('_id',), 'user': ('user_id', 'user_name')}
 
     def get_id(self, obj):
         return str(obj._id)
     
     def get_user(self, obj):
-        if obj.user_id:
-            try:
-                # Convert string ID to ObjectId for lookup
-                user = User.objects.get(_id=ObjectId(obj.user_id))
-                return user.name
-            except (User.DoesNotExist, Exception):
-                return "Unknown User"
-        return "Unknown User"
+        return obj.user_name or self.lookup_user_name(obj.user_id) or "Unknown User"
 
 
-class LeaderboardSerializer(serializers.ModelSerializer):
+class LeaderboardSerializer(SerializationTimingMixin, SparseFieldsMixin, NameLookupMixin, DenormalizedNamesMixin, serializers.ModelSerializer):
     id = serializers.SerializerMethodField()
     user = serializers.SerializerMethodField()
     team = serializers.SerializerMethodField()
@@ -74,39 +232,50 @@ class LeaderboardSerializer(serializers.ModelSerializer):
     class Meta:
         model = Leaderboard
         fields = ['id', 'user_id', 'user', 'team_id', 'team', 'total_activities', 'total_calories', 'total_duration', 'total_points', 'rank', 'period', 'updated_at']
+        list_serializer_class = NameLookupListSerializer
+
+    PERIOD_LABELS = {'day': "Daily", 'week': "Weekly", 'month': "Monthly", 'all': "All Time"}
+
+    method_field_sources = {
+        'id': ('_id', 'user_id'),
+        'user': ('user_id', 'user_name'),
+        'team': ('team_id', 'team_name'),
+        'total_points': ('total_activities', 'total_calories'),
+    }
+
+    def create(self, validated_data):
+        # Stored so ranks can be computed on it (see leaderboard.py)
+        validated_data['total_points'] = total_points(
+            validated_data.get('total_activities', 0), validated_data.get('total_calories', 0)
+        )
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        validated_data['total_points'] = total_points(
+            validated_data.get('total_activities', instance.total_activities),
+            validated_data.get('total_calories', instance.total_calories),
+        )
+        return super().update(instance, validated_data)
 
     def get_id(self, obj):
-        return str(obj._id)
+        # Period entries are computed from buckets and never stored
+        return str(obj._id) if obj._id else obj.user_id
     
     def get_user(self, obj):
-        if obj.user_id:
-            try:
-                # Convert string ID to ObjectId for lookup
-                user = User.objects.get(_id=ObjectId(obj.user_id))
-                return user.name
-            except (User.DoesNotExist, Exception):
-                return "Unknown User"
-        return "Unknown User"
+        return obj.user_name or self.lookup_user_name(obj.user_id) or "Unknown User"
     
     def get_team(self, obj):
-        if obj.team_id:
-            try:
-                # Convert string ID to ObjectId for lookup
-                team = Team.objects.get(_id=ObjectId(obj.team_id))
-                return team.name
-            except (Team.DoesNotExist, Exception):
-                return None
-        return None
+        return obj.team_name or self.lookup_team_name(obj.team_id)
     
     def get_total_points(self, obj):
         # Calculate points: activities * 10 + calories / 10
-        return (obj.total_activities * 10) + (obj.total_calories // 10)
+        return total_points(obj.total_activities, obj.total_calories)
     
     def get_period(self, obj):
-        return "Monthly"
+        return self.PERIOD_LABELS[self.context.get('period', 'all')]
 
 
-class WorkoutSerializer(serializers.ModelSerializer):
+class WorkoutSerializer(SerializationTimingMixin, SparseFieldsMixin, serializers.ModelSerializer):
     id = serializers.SerializerMethodField()
     category = serializers.CharField(source='activity_type', read_only=True)
 
@@ -114,5 +283,7 @@ class WorkoutSerializer(serializers.ModelSerializer):
         model = Workout
         fields = ['id', 'name', 'description', 'activity_type', 'category', 'difficulty', 'duration', 'calories_estimate']
 
+    method_field_sources = {'id': ('_id',)}
+
     def get_id(self, obj):
         return str(obj._id)
@@ -13,6 +13,13 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 from pathlib import Path
 import os
 
+
+def env_int(name, default=None):
+    """Integer setting from the environment; unset or empty keeps `default`."""
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -55,6 +62,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its total time covers the rest of the stack
+    'octofit_tracker.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -94,8 +103,18 @@ DATABASES = {
         'ENGINE': 'djongo',
         'NAME': 'octofit_db',
         'CLIENT': {
-            'host': 'localhost',
-            'port': 27017,
+            'host': os.environ.get('OCTOFIT_MONGO_HOST', 'localhost'),
+            'port': env_int('OCTOFIT_MONGO_PORT', 27017),
+            # Connection pool; octofit_tracker/pool.py reports how it is used
+            'maxPoolSize': env_int('OCTOFIT_MONGO_MAX_POOL_SIZE', 100),
+            'minPoolSize': env_int('OCTOFIT_MONGO_MIN_POOL_SIZE', 0),
+            'maxIdleTimeMS': env_int('OCTOFIT_MONGO_MAX_IDLE_TIME_MS'),
+            # Fail a request after waiting this long for a free connection
+            # instead of queueing forever when the pool is exhausted
+            'waitQueueTimeoutMS': env_int('OCTOFIT_MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000),
+            'serverSelectionTimeoutMS': env_int('OCTOFIT_MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+            'connectTimeoutMS': env_int('OCTOFIT_MONGO_CONNECT_TIMEOUT_MS', 5000),
+            'socketTimeoutMS': env_int('OCTOFIT_MONGO_SOCKET_TIMEOUT_MS'),
         }
     }
 }
@@ -142,6 +161,49 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Django REST Framework
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'octofit_tracker.auth.TokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'octofit_tracker.pagination.ObjectIdCursorPagination',
+    'PAGE_SIZE': 100,
+    'DEFAULT_FILTER_BACKENDS': [
+        'octofit_tracker.filters.QueryParamFilterBackend',
+        'octofit_tracker.filters.StableOrderingFilter',
+    ],
+}
+
+# Response cache for the read-heavy list endpoints (see octofit_tracker/cache.py)
+OCTOFIT_RESPONSE_CACHE = {
+    'BACKEND': 'octofit_tracker.cache.LocMemLRUCache',
+    'OPTIONS': {
+        'max_entries': 512,
+        'timeout': 60,  # seconds
+    },
+}
+
+# Serve list/retrieve straight from pymongo instead of djongo's SQL translation
+# (see octofit_tracker/native.py)
+OCTOFIT_NATIVE_READS = os.environ.get('OCTOFIT_NATIVE_READS', '').lower() in ('1', 'true', 'yes')
+
+# Render GET lists of activities, leaderboard and workouts with the compiled
+# serializers (see octofit_tracker/compiled.py)
+OCTOFIT_COMPILED_SERIALIZERS = True
+
+# Hasher for User passwords, by algorithm name (e.g. 'argon2' if installed and
+# listed in PASSWORD_HASHERS); 'default' is the first of PASSWORD_HASHERS
+OCTOFIT_PASSWORD_HASHER = os.environ.get('OCTOFIT_PASSWORD_HASHER', 'default')
+
+# Lifetime, in seconds, of the tokens issued by /api/auth/login/
+OCTOFIT_TOKEN_MAX_AGE = env_int('OCTOFIT_TOKEN_MAX_AGE', 3600)
+
+# Run queued background jobs on a worker thread in this process (see
+# octofit_tracker/jobs.py); turn off where `manage.py jobs --run` drains them
+OCTOFIT_JOB_WORKER = os.environ.get('OCTOFIT_JOB_WORKER', '1').lower() in ('1', 'true', 'yes')
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_METHODS = [
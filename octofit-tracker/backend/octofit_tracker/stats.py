@@ -0,0 +1,218 @@
+"""
+Per-user activity statistics.
+
+Each user's `UserStats` document holds lifetime totals plus counters per
+activity type and per UTC day. Activity writes adjust it with one `$inc`
+per user (`apply_stats_changes`, called from the leaderboard write path), so
+serving /api/users/{id}/stats/ is two indexed point reads and arithmetic
+over the user's active days, never a scan of their activities.
+"""
+from datetime import date, timedelta, timezone as dt_timezone
+from itertools import groupby, islice
+
+from bson import ObjectId
+from django.http import Http404
+from django.utils import timezone
+from pymongo import ReplaceOne
+
+from .models import Activity, User, UserStats
+from .mongo import get_collection
+
+# Weeks in the trend when the request does not ask for a number
+STATS_WEEKS = 12
+MAX_STATS_WEEKS = 52
+
+COUNTERS = ('activities', 'calories', 'duration')
+
+# Stand-in for '.' in activity types used as Mongo field names
+_DOT = '\uff0e'
+
+
+def day_key(value):
+    """'YYYY-MM-DD' of the UTC day `value` falls on."""
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value.astimezone(dt_timezone.utc).strftime('%Y-%m-%d')
+
+
+def type_key(activity_type):
+    # Field names may not contain '.' or start with '$'
+    return activity_type.replace('.', _DOT).lstrip('$') or '-'
+
+
+def stats_increments(added=(), removed=()):
+    """{user_id: {field path: delta}} for a set of activity writes."""
+    increments = {}
+    for sign, activities in ((1, added), (-1, removed)):
+        for activity in activities:
+            if not activity.user_id:
+                continue
+            values = (sign, sign * activity.calories_burned, sign * activity.duration)
+            paths = [f'total_{counter}' for counter in COUNTERS]
+            for prefix in (f'by_type.{type_key(activity.activity_type)}', f'by_day.{day_key(activity.date)}'):
+                paths.extend(f'{prefix}.{counter}' for counter in COUNTERS)
+            user_increments = increments.setdefault(activity.user_id, {})
+            for index, path in enumerate(paths):
+                user_increments[path] = user_increments.get(path, 0) + values[index % len(COUNTERS)]
+    return {
+        user_id: {path: delta for path, delta in user_increments.items() if delta}
+        for user_id, user_increments in increments.items()
+    }
+
+
+def apply_stats_changes(added=(), removed=()):
+    """Apply the effect of activity writes to the owners' rollups, one `$inc` per user."""
+    collection = get_collection(UserStats)
+    for user_id, increments in stats_increments(added, removed).items():
+        if not increments:
+            continue
+        collection.update_one(
+            {'user_id': user_id},
+            {'$inc': increments, '$set': {'updated_at': timezone.now()}},
+            upsert=True,
+        )
+        # Drop the types and days the writes left without activities
+        for path, delta in increments.items():
+            if path.endswith('.activities') and delta < 0:
+                prefix = path[:-len('.activities')]
+                collection.update_one(
+                    {'user_id': user_id, path: {'$lte': 0}},
+                    {'$unset': {prefix: ''}},
+                )
+
+
+def stats_rollup_pipeline(user_ids=None):
+    """Activity totals per user, type and UTC day, grouped by user."""
+    pipeline = []
+    if user_ids is not None:
+        pipeline.append({'$match': {'user_id': {'$in': list(user_ids)}}})
+    pipeline += [
+        {'$group': {
+            '_id': {
+                'user_id': '$user_id',
+                'activity_type': '$activity_type',
+                'day': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$date'}},
+            },
+            'activities': {'$sum': 1},
+            'calories': {'$sum': '$calories_burned'},
+            'duration': {'$sum': '$duration'},
+        }},
+        {'$sort': {'_id.user_id': 1}},
+    ]
+    return pipeline
+
+
+def _add_counters(counters, row):
+    for counter in COUNTERS:
+        counters[counter] = counters.get(counter, 0) + row[counter]
+
+
+def stats_document(user_id, rows):
+    """The `UserStats` document of one user from their rollup pipeline rows."""
+    totals, by_type, by_day = {}, {}, {}
+    for row in rows:
+        _add_counters(totals, row)
+        _add_counters(by_type.setdefault(type_key(row['_id']['activity_type']), {}), row)
+        _add_counters(by_day.setdefault(row['_id']['day'], {}), row)
+    document = {f'total_{counter}': totals.get(counter, 0) for counter in COUNTERS}
+    document.update(user_id=user_id, by_type=by_type, by_day=by_day, updated_at=timezone.now())
+    return document
+
+
+def rebuild_user_stats(user_ids=None, batch_size=1000):
+    """
+    Recompute the rollups of `user_ids` (default: everyone) from the raw
+    activities. Users are streamed one at a time out of a sorted
+    aggregation and each document replaces the user's old one in place,
+    `batch_size` upserts per bulk_write, so a user's stats never disappear
+    mid-rebuild. Rows of users left without activities are deleted last.
+    """
+    collection = get_collection(UserStats)
+    started = timezone.now()
+    rows = get_collection(Activity).aggregate(stats_rollup_pipeline(user_ids), allowDiskUse=True)
+    documents = (
+        stats_document(user_id, user_rows)
+        for user_id, user_rows in groupby(rows, key=lambda row: row['_id']['user_id'])
+        if user_id
+    )
+    rebuilt = 0
+    while True:
+        batch = list(islice(documents, batch_size))
+        if not batch:
+            break
+        collection.bulk_write(
+            [ReplaceOne({'user_id': document['user_id']}, document, upsert=True) for document in batch],
+            ordered=False,
+        )
+        rebuilt += len(batch)
+    # Every rebuilt or incrementally updated row was stamped after `started`
+    stale = {'updated_at': {'$lt': started}}
+    if user_ids is not None:
+        stale['user_id'] = {'$in': list(user_ids)}
+    collection.delete_many(stale)
+    return rebuilt
+
+
+def week_start(day):
+    """The Monday of the ISO week `day` falls in."""
+    return day - timedelta(days=day.weekday())
+
+
+def streaks(days, today):
+    """
+    (current, longest) runs of consecutive active days. The current streak
+    is still alive when the last active day is today or yesterday.
+    """
+    current = longest = run = 0
+    previous = None
+    for day in sorted(date.fromisoformat(key) for key in days):
+        run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+    if previous is not None and (today - previous).days <= 1:
+        current = run
+    return current, longest
+
+
+def format_user_stats(user, document, weeks=STATS_WEEKS, today=None):
+    document = document or {}
+    today = today or timezone.now().astimezone(dt_timezone.utc).date()
+    by_day = document.get('by_day') or {}
+
+    first_week = week_start(today) - timedelta(weeks=weeks - 1)
+    weekly = {first_week + timedelta(weeks=offset): dict.fromkeys(COUNTERS, 0) for offset in range(weeks)}
+    for key, counters in by_day.items():
+        week = week_start(date.fromisoformat(key))
+        if week in weekly:
+            _add_counters(weekly[week], counters)
+
+    by_type = [
+        dict({'activity_type': name.replace(_DOT, '.')}, **{counter: counters.get(counter, 0) for counter in COUNTERS})
+        for name, counters in (document.get('by_type') or {}).items()
+    ]
+    by_type.sort(key=lambda row: (-row['activities'], row['activity_type']))
+
+    current, longest = streaks(by_day, today)
+    return {
+        'user_id': str(user['_id']),
+        'user': user.get('name'),
+        'totals': {counter: document.get(f'total_{counter}', 0) for counter in COUNTERS},
+        'by_activity_type': by_type,
+        'weekly': [dict({'week_start': week.isoformat()}, **counters) for week, counters in weekly.items()],
+        'streaks': {
+            'current': current,
+            'longest': longest,
+            'last_active': max(by_day) if by_day else None,
+        },
+    }
+
+
+def user_stats(user_id, weeks=STATS_WEEKS, today=None):
+    """The stats of one user, read from their rollup document."""
+    if not ObjectId.is_valid(user_id):
+        raise Http404
+    user = get_collection(User).find_one({'_id': ObjectId(user_id)}, {'name': 1})
+    if user is None:
+        raise Http404
+    document = get_collection(UserStats).find_one({'user_id': user_id}, {'_id': 0, 'updated_at': 0})
+    return format_user_stats(user, document, weeks, today)
@@ -0,0 +1,111 @@
+"""
+Delta sync and conditional GET for the activity feed.
+
+Every activity write bumps the activity's `updated_at`, and every delete
+leaves an `ActivityTombstone`, so "what changed since T" is one range query
+on each, through the `activities_updated` and `tombstones_deleted` indexes
+(or their per-user variants when the feed is filtered by user).
+
+`GET /api/activities/?since=<cursor>` returns only the activities written
+after the cursor, oldest write first and paginated as usual. The last page
+also lists the activities deleted after the cursor and the cursor to send
+next time. A cursor is the ISO 8601 timestamp (e.g. `2026-10-18T09:30:00Z`)
+from a previous response, or an activity id, which stands for the time that
+activity was created.
+
+Feed responses carry `Last-Modified`, and a request with `If-Modified-Since`
+gets a 304 after a single indexed existence check when nothing changed.
+HTTP dates have whole seconds, so the header is only sent once the second of
+the feed's newest write has passed; otherwise a later write in that second
+would be hidden from the next conditional request.
+
+Tombstones record only the activity's user, so a feed filtered on anything
+else reports every deletion of the matching users (or all of them), which
+clients drop as unknown ids.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from bson import ObjectId
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, parse_http_date_safe
+
+from .models import Activity, ActivityTombstone
+from .mongo import get_collection
+from .native import format_datetime, native_collection
+
+
+def parse_since(value):
+    """The datetime a `?since=` cursor stands for; raises ValueError if it is neither."""
+    if ObjectId.is_valid(value):
+        return ObjectId(value).generation_time
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def record_deletions(activities):
+    """Leave a tombstone for each activity as it was before its delete or move."""
+    if not activities:
+        return
+    deleted_at = timezone.now()
+    get_collection(ActivityTombstone).insert_many([
+        {'_id': ObjectId(), 'activity_id': str(activity._id), 'user_id': activity.user_id, 'deleted_at': deleted_at}
+        for activity in activities
+    ])
+
+
+def _tombstone_query(activity_query):
+    return {'user_id': activity_query['user_id']} if 'user_id' in activity_query else {}
+
+
+def deleted_since(activity_query, since):
+    """The activities deleted after `since` from the feed matching `activity_query`."""
+    query = dict(_tombstone_query(activity_query), deleted_at={'$gt': since})
+    return [
+        {'id': document['activity_id'], 'deleted_at': format_datetime(document['deleted_at'])}
+        for document in native_collection(ActivityTombstone).find(query).sort('deleted_at', 1)
+    ]
+
+
+def last_modified(activity_query):
+    """The time of the newest write or delete in the feed matching `activity_query`, or None."""
+    times = []
+    newest = native_collection(Activity).find_one(
+        dict(activity_query, updated_at={'$ne': None}), {'updated_at': 1}, sort=[('updated_at', -1)],
+    )
+    if newest is not None:
+        times.append(newest['updated_at'])
+    newest = native_collection(ActivityTombstone).find_one(
+        _tombstone_query(activity_query), {'deleted_at': 1}, sort=[('deleted_at', -1)],
+    )
+    if newest is not None:
+        times.append(newest['deleted_at'])
+    return max(times, default=None)
+
+
+def modified_since(activity_query, since):
+    """Whether anything in the feed matching `activity_query` was written or deleted after `since`."""
+    changed = get_collection(Activity).find_one(dict(activity_query, updated_at={'$gt': since}), {'_id': 1})
+    if changed is not None:
+        return True
+    query = dict(_tombstone_query(activity_query), deleted_at={'$gt': since})
+    return get_collection(ActivityTombstone).find_one(query, {'_id': 1}) is not None
+
+
+def if_modified_since(request):
+    """The last instant the request's If-Modified-Since covers, or None without one."""
+    seconds = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    if seconds is None:
+        return None
+    # The header covers its whole second; BSON dates have millisecond precision
+    return datetime.fromtimestamp(seconds, dt_timezone.utc) + timedelta(milliseconds=999)
+
+
+def set_last_modified(response, modified):
+    if modified is not None and modified < timezone.now().replace(microsecond=0):
+        response['Last-Modified'] = http_date(modified.timestamp())
+    return response
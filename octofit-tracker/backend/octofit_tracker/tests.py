@@ -1,8 +1,36 @@
-from django.test import TestCase
+import csv
+import json
+import tracemalloc
+from io import StringIO
+from asgiref.sync import async_to_sync
+from pymongo import monitoring
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.contrib.auth.hashers import check_password
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import User, Team, Activity, Leaderboard, Workout
-from datetime import datetime
+from .auth import hash_password, issue_token
+from .benchmark import ApiBenchmark, compare
+from .cache import LocMemLRUCache, get_response_cache
+from .compiled import compiled_activities, compiled_workouts
+from .indexes import ensure_indexes, explain_queries
+from .jobs import enqueue, run_pending
+from .leaderboard import rebuild_buckets
+from .leaderboard_index import LeaderboardIndex, leaderboard_index
+from .metrics import capture_commands
+from .mongo import get_collection
+from .pool import PoolStatsListener
+from .ranking import rank_leaderboard, rank_periods, streamed_ranks, supports_window_functions
+from .serializers import ActivitySerializer, WorkoutSerializer
+from .stats import rebuild_user_stats, streaks
+from .models import User, Team, Activity, ActivityTombstone, Job, Leaderboard, LeaderboardBucket, PeriodRank, UserStats, Workout
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from django.utils import timezone
+from django.utils.http import http_date
 
 
 class UserModelTest(TestCase):
@@ -138,3 +166,1328 @@ class WorkoutAPITest(APITestCase):
         }
         response = self.client.post('/api/workouts/', data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+class NameLookupQueryCountTest(APITestCase):
+    def setUp(self):
+        self.team = Team.objects.create(name="Lookup Team", description="")
+        self.created = 0
+
+    def create_rows(self, count):
+        for _ in range(count):
+            self.created += 1
+            user = User.objects.create(
+                name=f"Lookup User {self.created}",
+                email=f"lookup{self.created}@example.com",
+                password="testpass123",
+                team_id=str(self.team._id)
+            )
+            Activity.objects.create(
+                user_id=str(user._id),
+                activity_type="Running",
+                duration=30,
+                calories_burned=300,
+                date=datetime.now()
+            )
+            Leaderboard.objects.create(
+                user_id=str(user._id),
+                team_id=str(self.team._id),
+                total_activities=1,
+                total_calories=300,
+                total_duration=30
+            )
+
+    def count_queries(self, url):
+        """Mongo reads for one request, whether issued by djongo or pymongo."""
+        get_response_cache().clear()
+        with capture_commands() as commands:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len([name for name, _ in commands if name in ('find', 'aggregate')]), response
+
+    def test_query_count_is_constant_regardless_of_page_size(self):
+        for url in ('/api/activities/', '/api/leaderboard/', '/api/users/'):
+            with self.subTest(url=url):
+                self.create_rows(2)
+                small, response = self.count_queries(url)
+                self.assertEqual(len(response.data['results']), self.created)
+                self.create_rows(8)
+                large, response = self.count_queries(url)
+                self.assertEqual(len(response.data['results']), self.created)
+                self.assertGreater(small, 0)
+                self.assertEqual(small, large)
+
+    def test_names_are_resolved_from_batch(self):
+        self.create_rows(3)
+        _, response = self.count_queries('/api/leaderboard/')
+        for entry in response.data['results']:
+            self.assertTrue(entry['user'].startswith("Lookup User"))
+            self.assertEqual(entry['team'], "Lookup Team")
+
+
+class TeamMemberCountTest(APITestCase):
+    def setUp(self):
+        get_response_cache().clear()
+        self.teams = [
+            Team.objects.create(name=f"Count Team {i}", description="") for i in range(3)
+        ]
+        for i in range(4):
+            User.objects.create(
+                name=f"Member {i}",
+                email=f"member{i}@example.com",
+                password="testpass123",
+                team_id=str(self.teams[0]._id) if i < 3 else str(self.teams[1]._id)
+            )
+
+    def member_count_aggregations(self, url):
+        get_response_cache().clear()
+        with capture_commands() as commands:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return commands.count(('aggregate', User._meta.db_table)), response
+
+    def test_list_uses_single_aggregation(self):
+        aggregations, response = self.member_count_aggregations('/api/teams/?page_size=1')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(aggregations, 1)
+
+        aggregations, response = self.member_count_aggregations('/api/teams/')
+        # Every team's count comes from the same aggregation over the users
+        self.assertEqual(aggregations, 1)
+        counts = {team['name']: team['member_count'] for team in response.data['results']}
+        self.assertEqual(counts, {"Count Team 0": 3, "Count Team 1": 1, "Count Team 2": 0})
+
+    def test_retrieve_falls_back_to_count_query(self):
+        response = self.client.get(f'/api/teams/{self.teams[0]._id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['member_count'], 3)
+
+
+class CursorPaginationTest(APITestCase):
+    def setUp(self):
+        for i in range(5):
+            Activity.objects.create(
+                user_id="123456789012345678901234",
+                activity_type="Running",
+                duration=30 + i,
+                calories_burned=300,
+                date=datetime(2024, 1, 1 + i)
+            )
+
+    def test_pages_follow_cursor_without_overlap(self):
+        response = self.client.get('/api/activities/?page_size=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        seen = [activity['duration'] for activity in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen.extend(activity['duration'] for activity in response.data['results'])
+        # Newest first, every activity exactly once
+        self.assertEqual(seen, [34, 33, 32, 31, 30])
+
+    def test_all_list_endpoints_are_paginated(self):
+        for url in ('/api/users/', '/api/teams/', '/api/activities/', '/api/leaderboard/', '/api/workouts/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertIn('results', response.data)
+                self.assertIn('next', response.data)
+
+
+class IncrementalLeaderboardTest(APITestCase):
+    def setUp(self):
+        self.team = Team.objects.create(name="Engine Team", description="")
+        self.users = [
+            User.objects.create(
+                name=f"Engine User {i}",
+                email=f"engine{i}@example.com",
+                password="testpass123",
+                team_id=str(self.team._id)
+            )
+            for i in range(3)
+        ]
+
+    def log_activity(self, user, calories, duration=30):
+        response = self.client.post('/api/activities/', {
+            'user_id': str(user._id),
+            'activity_type': 'Running',
+            'duration': duration,
+            'calories_burned': calories,
+            'date': '2024-01-01T10:00:00Z'
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def entry(self, user):
+        return Leaderboard.objects.get(user_id=str(user._id))
+
+    def test_create_adds_totals_and_ranks(self):
+        self.log_activity(self.users[0], 300)
+        self.log_activity(self.users[0], 200, duration=20)
+        self.log_activity(self.users[1], 400)
+
+        first = self.entry(self.users[0])
+        self.assertEqual(first.total_activities, 2)
+        self.assertEqual(first.total_calories, 500)
+        self.assertEqual(first.total_duration, 50)
+        self.assertEqual(first.team_id, str(self.team._id))
+        self.assertEqual(first.rank, 1)
+        self.assertEqual(self.entry(self.users[1]).rank, 2)
+
+    def test_overtaking_only_shifts_passed_entries(self):
+        self.log_activity(self.users[0], 500)
+        self.log_activity(self.users[1], 300)
+        self.log_activity(self.users[2], 100)
+        self.log_activity(self.users[2], 500)
+
+        self.assertEqual(self.entry(self.users[2]).rank, 1)
+        self.assertEqual(self.entry(self.users[0]).rank, 2)
+        self.assertEqual(self.entry(self.users[1]).rank, 3)
+
+    def test_ties_share_a_rank(self):
+        self.log_activity(self.users[0], 300)
+        self.log_activity(self.users[1], 300)
+        self.assertEqual(self.entry(self.users[0]).rank, 1)
+        self.assertEqual(self.entry(self.users[1]).rank, 1)
+
+    def test_update_and_delete_adjust_totals(self):
+        activity_id = self.log_activity(self.users[0], 100)
+        self.log_activity(self.users[1], 300)
+
+        response = self.client.patch(f'/api/activities/{activity_id}/', {'calories_burned': 500})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.entry(self.users[0]).total_calories, 500)
+        self.assertEqual(self.entry(self.users[0]).rank, 1)
+        self.assertEqual(self.entry(self.users[1]).rank, 2)
+
+        response = self.client.delete(f'/api/activities/{activity_id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        entry = self.entry(self.users[0])
+        self.assertEqual(entry.total_activities, 0)
+        self.assertEqual(entry.total_calories, 0)
+        self.assertEqual(entry.rank, 2)
+        self.assertEqual(self.entry(self.users[1]).rank, 1)
+
+    def test_every_rank_is_on_points(self):
+        # More calories for user 1, but more points for user 0: 3 * 10 + 300 / 10 against 10 + 400 / 10
+        for _ in range(3):
+            self.log_activity(self.users[0], 100)
+        self.log_activity(self.users[1], 400)
+        leaderboard_index.invalidate()
+
+        for recomputed in (False, True):
+            with self.subTest(recomputed=recomputed):
+                if recomputed:
+                    rank_leaderboard(use_windows=False)
+                for user, rank in ((self.users[0], 1), (self.users[1], 2)):
+                    response = self.client.get(f'/api/leaderboard/rank/{user._id}/')
+                    self.assertEqual(response.data['rank'], rank)
+                    self.assertEqual(self.entry(user).rank, rank)
+        self.assertEqual(self.entry(self.users[0]).total_points, 60)
+
+
+class PeriodLeaderboardTest(APITestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create(name=f"Period User {i}", email=f"period{i}@example.com", password="testpass123")
+            for i in range(2)
+        ]
+        now = timezone.now()
+        # (user, calories, days ago)
+        for user, calories, days_ago in [(0, 100, 0), (0, 100, 3), (0, 100, 20), (0, 100, 60), (1, 250, 3)]:
+            response = self.client.post('/api/activities/', {
+                'user_id': str(self.users[user]._id),
+                'activity_type': 'Cycling',
+                'duration': 30,
+                'calories_burned': calories,
+                'date': (now - timedelta(days=days_ago)).isoformat()
+            })
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def totals(self, period):
+        response = self.client.get(f'/api/leaderboard/?period={period}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(entry['user'], entry['total_calories'], entry['rank'], entry['period']) for entry in response.data['results']]
+
+    def test_periods_merge_daily_buckets(self):
+        self.assertEqual(self.totals('day'), [("Period User 0", 100, 1, "Daily")])
+        # Ranked on points: 2 * 10 + 200 / 10 beats 10 + 250 / 10
+        self.assertEqual(self.totals('week'), [
+            ("Period User 0", 200, 1, "Weekly"),
+            ("Period User 1", 250, 2, "Weekly"),
+        ])
+        self.assertEqual(self.totals('month'), [
+            ("Period User 0", 300, 1, "Monthly"),
+            ("Period User 1", 250, 2, "Monthly"),
+        ])
+        self.assertEqual(self.totals('all'), [
+            ("Period User 0", 400, 1, "All Time"),
+            ("Period User 1", 250, 2, "All Time"),
+        ])
+
+    def test_rebuild_matches_incremental_buckets(self):
+        incremental = sorted(
+            (bucket.user_id, bucket.bucket_start, bucket.total_calories)
+            for bucket in LeaderboardBucket.objects.all()
+        )
+        rebuild_buckets()
+        rebuilt = sorted(
+            (bucket.user_id, bucket.bucket_start, bucket.total_calories)
+            for bucket in LeaderboardBucket.objects.all()
+        )
+        self.assertEqual(incremental, rebuilt)
+
+    def test_period_pages_follow_the_cursor(self):
+        response = self.client.get('/api/leaderboard/?period=month&page_size=1')
+        self.assertEqual([(entry['user'], entry['rank']) for entry in response.data['results']], [("Period User 0", 1)])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(entry['user'], entry['rank']) for entry in response.data['results']], [("Period User 1", 2)])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get('/api/leaderboard/?period=month&cursor=bogus')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unknown_period_is_rejected(self):
+        response = self.client.get('/api/leaderboard/?period=year')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TeamLeaderboardTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        get_response_cache().clear()
+        self.teams = [Team.objects.create(name=f"Ranked Team {i}", description="") for i in range(2)]
+        self.users = [
+            User.objects.create(
+                name=f"Ranked User {i}",
+                email=f"ranked{i}@example.com",
+                password="testpass123",
+                team_id=str(self.teams[i % 2]._id)
+            )
+            for i in range(4)
+        ]
+
+    def log_activity(self, user, calories):
+        response = self.client.post('/api/activities/', {
+            'user_id': str(user._id),
+            'activity_type': 'Boxing',
+            'duration': 30,
+            'calories_burned': calories,
+            'date': '2024-01-01T10:00:00Z'
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_teams_ranked_by_total_points(self):
+        self.log_activity(self.users[0], 105)  # team 0: 10 + 10
+        self.log_activity(self.users[2], 200)  # team 0: 10 + 20
+        self.log_activity(self.users[1], 900)  # team 1: 10 + 90
+
+        response = self.client.get('/api/leaderboard/teams/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [(row['team'], row['members'], row['total_points'], row['rank']) for row in response.data['results']]
+        self.assertEqual(rows, [("Ranked Team 1", 1, 100, 1), ("Ranked Team 0", 2, 50, 2)])
+
+    def test_results_are_cached_until_an_activity_write(self):
+        self.log_activity(self.users[0], 100)
+        self.client.get('/api/leaderboard/teams/')
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/leaderboard/teams/')
+        self.assertEqual(len(context), 0)
+
+        self.log_activity(self.users[1], 500)
+        response = self.client.get('/api/leaderboard/teams/')
+        self.assertEqual(response.data['results'][0]['team'], "Ranked Team 1")
+
+
+class PopulateSyntheticDataTest(TestCase):
+    def test_bulk_mode_generates_consistent_data(self):
+        call_command(
+            'populate_db', users=20, activities_per_user=3, teams=4,
+            batch_size=7, seed=1, stdout=StringIO()
+        )
+        self.assertEqual(Team.objects.count(), 4)
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Activity.objects.count(), 60)
+        self.assertEqual(Leaderboard.objects.count(), 20)
+
+        for entry in Leaderboard.objects.all():
+            activities = list(Activity.objects.filter(user_id=entry.user_id))
+            self.assertEqual(entry.total_activities, len(activities))
+            self.assertEqual(entry.total_calories, sum(a.calories_burned for a in activities))
+            self.assertEqual(entry.total_duration, sum(a.duration for a in activities))
+            higher = Leaderboard.objects.filter(total_points__gt=entry.total_points).count()
+            self.assertEqual(entry.rank, higher + 1)
+
+
+class BulkActivityUploadTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(name="Wearable User", email="wearable@example.com", password="testpass123")
+
+    def activity(self, calories, **overrides):
+        data = {
+            'user_id': str(self.user._id),
+            'activity_type': 'Running',
+            'duration': 30,
+            'calories_burned': calories,
+            'date': '2024-01-01T07:00:00Z'
+        }
+        data.update(overrides)
+        return data
+
+    def test_json_array_reports_per_item_errors(self):
+        payload = [self.activity(100), self.activity(200, duration='long'), self.activity(300)]
+        response = self.client.post('/api/activities/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+        self.assertIn('duration', response.data['errors'][0]['errors'])
+
+        self.assertEqual(Activity.objects.filter(user_id=str(self.user._id)).count(), 2)
+        entry = Leaderboard.objects.get(user_id=str(self.user._id))
+        self.assertEqual(entry.total_activities, 2)
+        self.assertEqual(entry.total_calories, 400)
+
+    def test_ndjson_body(self):
+        body = "\n".join(json.dumps(self.activity(calories)) for calories in (50, 60, 70))
+        response = self.client.post('/api/activities/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(response.data['errors'], [])
+
+    def test_nothing_valid_is_a_bad_request(self):
+        response = self.client.post('/api/activities/bulk/', [{'duration': 5}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['created'], 0)
+
+
+class EnsureIndexesTest(TestCase):
+    def test_declared_indexes_are_created(self):
+        call_command('ensure_indexes', no_explain=True, stdout=StringIO())
+        activity_indexes = get_collection(Activity).index_information()
+        self.assertIn('activities_user_date', activity_indexes)
+        self.assertEqual(activity_indexes['activities_user_date']['key'], [('user_id', 1), ('date', -1)])
+        self.assertIn('users_team_id', get_collection(User).index_information())
+        self.assertIn('leaderboard_rank', get_collection(Leaderboard).index_information())
+        # Running it again is a no-op
+        self.assertEqual(ensure_indexes(), {})
+
+    def test_main_queries_use_an_index(self):
+        ensure_indexes()
+        for row in explain_queries():
+            with self.subTest(query=row['query']):
+                self.assertEqual(row['stage'], 'IXSCAN')
+
+
+class ResponseCacheTest(APITestCase):
+    def setUp(self):
+        get_response_cache().clear()
+
+    def create_workout(self, name):
+        response = self.client.post('/api/workouts/', {
+            'name': name,
+            'description': 'Cached workout',
+            'activity_type': 'Yoga',
+            'difficulty': 'Easy',
+            'duration': 20,
+            'calories_estimate': 100
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_list_is_served_from_cache(self):
+        self.create_workout("Sun Salutation")
+        self.client.get('/api/workouts/')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/workouts/')
+        self.assertEqual(len(context), 0)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_matching_etag_returns_not_modified(self):
+        self.create_workout("Sun Salutation")
+        etag = self.client.get('/api/workouts/')['ETag']
+        response = self.client.get('/api/workouts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_writes_invalidate_owning_and_related_lists(self):
+        self.create_workout("Sun Salutation")
+        etag = self.client.get('/api/workouts/')['ETag']
+        self.create_workout("Moon Salutation")
+        response = self.client.get('/api/workouts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+        user = User.objects.create(name="Cache User", email="cache@example.com", password="testpass123")
+        self.assertEqual(self.client.get('/api/leaderboard/').data['results'], [])
+        self.client.post('/api/activities/', {
+            'user_id': str(user._id),
+            'activity_type': 'Yoga',
+            'duration': 20,
+            'calories_burned': 100,
+            'date': '2024-01-01T07:00:00Z'
+        })
+        self.assertEqual(len(self.client.get('/api/leaderboard/').data['results']), 1)
+
+    def test_lru_evicts_least_recently_used(self):
+        lru = LocMemLRUCache(max_entries=2, timeout=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+
+
+class NativeReadEquivalenceTest(APITestCase):
+    def setUp(self):
+        team = Team.objects.create(name="Native Team", description="Same JSON either way")
+        users = [
+            User.objects.create(name="Native User", email="native@example.com", password="testpass123", team_id=str(team._id)),
+            User.objects.create(name="Teamless User", email="teamless@example.com", password="testpass123"),
+        ]
+        for i, user_id in enumerate([str(users[0]._id), str(users[1]._id), "123456789012345678901234"]):
+            Activity.objects.create(
+                user_id=user_id,
+                activity_type="Swimming",
+                duration=40 + i,
+                calories_burned=400 + i,
+                date=timezone.now() - timedelta(days=i),
+                notes=f"Lap {i}"
+            )
+            Leaderboard.objects.create(
+                user_id=user_id,
+                team_id=str(team._id) if i == 0 else None,
+                total_activities=i + 1,
+                total_calories=1000 - i * 105,
+                total_duration=40 + i,
+                rank=i + 1
+            )
+        Workout.objects.create(
+            name="Native Laps",
+            description="Swim laps",
+            activity_type="Swimming",
+            difficulty="Easy",
+            duration=30,
+            calories_estimate=300
+        )
+
+    def get(self, url, native):
+        get_response_cache().clear()
+        with override_settings(OCTOFIT_NATIVE_READS=native, OCTOFIT_COMPILED_SERIALIZERS=native):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return json.loads(response.content)
+
+    def test_list_and_retrieve_match_serializers(self):
+        for endpoint in ('users', 'teams', 'activities', 'leaderboard', 'workouts'):
+            with self.subTest(endpoint=endpoint):
+                url = f'/api/{endpoint}/?page_size=2'
+                orm_rows, native_rows = [], []
+                while url:
+                    orm_page = self.get(url, native=False)
+                    native_page = self.get(url, native=True)
+                    self.assertEqual(native_page['results'], orm_page['results'])
+                    orm_rows.extend(orm_page['results'])
+                    native_rows.extend(native_page['results'])
+                    url = orm_page['next']
+                self.assertTrue(orm_rows)
+
+                detail = f"/api/{endpoint}/{orm_rows[0]['id']}/"
+                self.assertEqual(self.get(detail, native=True), self.get(detail, native=False))
+
+    @override_settings(OCTOFIT_NATIVE_READS=True)
+    def test_unknown_id_is_not_found(self):
+        response = self.client.get('/api/workouts/not-an-object-id/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CompiledSerializerTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(name="Compiled User", email="compiled@example.com", password="testpass123")
+        self.activity = Activity.objects.create(
+            user_id=str(self.user._id),
+            activity_type="Rowing",
+            duration=25,
+            calories_burned=250,
+            date=timezone.now(),
+            notes="Erg"
+        )
+        self.workout = Workout.objects.create(
+            name="Compiled Rows",
+            description="Row intervals",
+            activity_type="Rowing",
+            difficulty="Hard",
+            duration=25,
+            calories_estimate=250
+        )
+
+    def test_output_matches_drf_serializers(self):
+        cases = [
+            (compiled_activities, ActivitySerializer, Activity, self.activity),
+            (compiled_workouts, WorkoutSerializer, Workout, self.workout),
+        ]
+        for compiled, serializer_class, model, instance in cases:
+            with self.subTest(serializer=serializer_class.__name__):
+                document = get_collection(model).with_options(
+                    codec_options=get_collection(model).codec_options.with_options(tz_aware=True)
+                ).find_one({'_id': instance._id})
+                fresh = model.objects.get(pk=instance._id)
+                expected = json.loads(json.dumps(serializer_class(fresh).data))
+                self.assertEqual(compiled.to_representation([document]), [expected])
+
+    def test_get_list_uses_compiled_path_without_orm_queries(self):
+        get_response_cache().clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/activities/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(context), 0)
+        self.assertEqual(response.data['results'][0]['user'], "Compiled User")
+
+
+class ActivityExportTest(APITestCase):
+    def setUp(self):
+        self.team = Team.objects.create(name="Export Team", description="")
+        self.member = User.objects.create(
+            name="Export Member", email="export@example.com", password="testpass123", team_id=str(self.team._id)
+        )
+        self.outsider = User.objects.create(name="Export Outsider", email="outsider@example.com", password="testpass123")
+        for day, user in [(1, self.member), (2, self.outsider), (3, self.member)]:
+            Activity.objects.create(
+                user_id=str(user._id),
+                activity_type="Hiking",
+                duration=60,
+                calories_burned=500,
+                date=datetime(2024, 3, day, 9, 0, tzinfo=dt_timezone.utc)
+            )
+
+    def export(self, query):
+        response = self.client.get(f'/api/activities/export/?{query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode()
+
+    def test_json_filtered_by_team_and_date(self):
+        rows = json.loads(self.export(f'team_id={self.team._id}&date__gte=2024-03-02T00:00:00Z'))
+        self.assertEqual([row['date'] for row in rows], ['2024-03-03T09:00:00Z'])
+        self.assertEqual(rows[0]['user'], "Export Member")
+
+    def test_ndjson_and_csv(self):
+        lines = self.export('output=ndjson').splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])['date'], '2024-03-01T09:00:00Z')
+
+        rows = list(csv.DictReader(StringIO(self.export(f'output=csv&user_id={self.outsider._id}'))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['user'], "Export Outsider")
+
+    def test_unknown_output_is_rejected(self):
+        response = self.client.get('/api/activities/export/?output=xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_large_export_memory_stays_flat(self):
+        rows = 500_000
+        start = datetime(2023, 1, 1, tzinfo=dt_timezone.utc)
+        collection = get_collection(Activity)
+        for offset in range(0, rows, 10_000):
+            collection.insert_many([
+                {
+                    'user_id': str(self.member._id),
+                    'activity_type': 'Running',
+                    'duration': 30,
+                    'calories_burned': 300,
+                    'date': start + timedelta(minutes=i),
+                    'notes': '',
+                }
+                for i in range(offset, offset + 10_000)
+            ])
+
+        response = self.client.get('/api/activities/export/?output=ndjson&date__lte=2024-01-01T00:00:00Z')
+        tracemalloc.start()
+        try:
+            exported = sum(chunk.count(b'\n') for chunk in response.streaming_content)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(exported, rows)
+        self.assertLess(peak, 32 * 1024 * 1024)
+
+
+class ListFilteringTest(APITestCase):
+    def setUp(self):
+        self.team = Team.objects.create(name="Filter Team", description="")
+        self.member = User.objects.create(
+            name="Filter Member", email="filter@example.com", password="testpass123", team_id=str(self.team._id)
+        )
+        self.outsider = User.objects.create(name="Filter Outsider", email="outsider@example.com", password="testpass123")
+        for day, user, activity_type, calories in [
+            (1, self.member, "Running", 300),
+            (2, self.outsider, "Cycling", 500),
+            (3, self.member, "Cycling", 100),
+        ]:
+            Activity.objects.create(
+                user_id=str(user._id),
+                activity_type=activity_type,
+                duration=30,
+                calories_burned=calories,
+                date=datetime(2024, 5, day, 9, 0, tzinfo=dt_timezone.utc)
+            )
+        Workout.objects.create(name="Easy Spin", description="", activity_type="Cycling",
+                               difficulty="Beginner", duration=20, calories_estimate=150)
+        Workout.objects.create(name="Hill Repeats", description="", activity_type="Running",
+                               difficulty="Advanced", duration=45, calories_estimate=600)
+
+    def get_both(self, url):
+        """The response of the ORM path and of the native path, which must agree."""
+        results = []
+        for native in (False, True):
+            get_response_cache().clear()
+            with override_settings(OCTOFIT_NATIVE_READS=native, OCTOFIT_COMPILED_SERIALIZERS=native):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+            results.append(json.loads(response.content)['results'])
+        self.assertEqual(results[0], results[1])
+        return results[0]
+
+    def test_filters(self):
+        rows = self.get_both(f'/api/activities/?team_id={self.team._id}&activity_type=Cycling')
+        self.assertEqual([row['calories_burned'] for row in rows], [100])
+
+        rows = self.get_both('/api/activities/?date__gte=2024-05-02&date__lte=2024-05-02T23:59:59Z')
+        self.assertEqual([row['user'] for row in rows], ["Filter Outsider"])
+
+        rows = self.get_both(f'/api/users/?team_id={self.team._id}')
+        self.assertEqual([row['name'] for row in rows], ["Filter Member"])
+
+        rows = self.get_both('/api/workouts/?difficulty=Advanced')
+        self.assertEqual([row['name'] for row in rows], ["Hill Repeats"])
+
+    def test_ordering(self):
+        rows = self.get_both('/api/activities/?ordering=-calories_burned')
+        self.assertEqual([row['calories_burned'] for row in rows], [500, 300, 100])
+
+        rows = self.get_both('/api/workouts/?ordering=name')
+        self.assertEqual([row['name'] for row in rows], ["Easy Spin", "Hill Repeats"])
+
+    def test_sparse_fieldsets(self):
+        rows = self.get_both('/api/activities/?fields=id,user,calories_burned&ordering=calories_burned')
+        self.assertEqual(set(rows[0]), {'id', 'user', 'calories_burned'})
+        self.assertEqual(rows[0]['user'], "Filter Member")
+
+        rows = self.get_both('/api/teams/?fields=name,member_count')
+        self.assertEqual(rows, [{'name': "Filter Team", 'member_count': 1}])
+
+        activity = Activity.objects.first()
+        response = self.client.get(f'/api/activities/{activity._id}/?fields=activity_type')
+        self.assertEqual(response.data, {'activity_type': activity.activity_type})
+
+    def test_invalid_parameters_are_rejected(self):
+        for url in (
+            '/api/activities/?fields=id,password',
+            '/api/activities/?date__gte=yesterday',
+            '/api/users/?fields=password',
+        ):
+            with self.subTest(url=url):
+                get_response_cache().clear()
+                self.assertEqual(self.client.get(url).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UserStatsTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(name="Stats User", email="stats@example.com", password="testpass123")
+        self.now = timezone.now()
+
+    def log_activity(self, activity_type, calories, days_ago, duration=30):
+        response = self.client.post('/api/activities/', {
+            'user_id': str(self.user._id),
+            'activity_type': activity_type,
+            'duration': duration,
+            'calories_burned': calories,
+            'date': (self.now - timedelta(days=days_ago)).isoformat()
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def stats(self, query=''):
+        response = self.client.get(f'/api/users/{self.user._id}/stats/{query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_stats_follow_activity_writes(self):
+        self.log_activity('Running', 300, days_ago=0)
+        self.log_activity('Running', 200, days_ago=1, duration=20)
+        self.log_activity('Yoga', 100, days_ago=4)
+        activity_id = self.log_activity('Boxing', 500, days_ago=2)
+
+        data = self.stats()
+        self.assertEqual(data['totals'], {'activities': 4, 'calories': 1100, 'duration': 110})
+        self.assertEqual(data['by_activity_type'][0], {
+            'activity_type': 'Running', 'activities': 2, 'calories': 500, 'duration': 50,
+        })
+        self.assertEqual(data['streaks']['current'], 3)
+        self.assertEqual(data['streaks']['longest'], 3)
+        self.assertEqual(len(data['weekly']), 12)
+        self.assertEqual(sum(week['activities'] for week in data['weekly']), 4)
+
+        response = self.client.delete(f'/api/activities/{activity_id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        data = self.stats('?weeks=2')
+        self.assertEqual(data['totals']['activities'], 3)
+        self.assertNotIn('Boxing', [row['activity_type'] for row in data['by_activity_type']])
+        self.assertEqual(data['streaks']['current'], 2)
+        self.assertEqual(len(data['weekly']), 2)
+
+    def test_rebuild_matches_incremental_rollup(self):
+        self.log_activity('Running', 300, days_ago=0)
+        activity_id = self.log_activity('Swimming', 250, days_ago=9)
+        self.client.patch(f'/api/activities/{activity_id}/', {'activity_type': 'Cycling'})
+        incremental = self.stats()
+
+        self.assertEqual(rebuild_user_stats(), 1)
+        self.assertEqual(UserStats.objects.count(), 1)
+        self.assertEqual(self.stats(), incremental)
+
+    def test_rebuild_replaces_in_place(self):
+        self.log_activity('Running', 300, days_ago=0)
+        stats_id = get_collection(UserStats).find_one({'user_id': str(self.user._id)})['_id']
+        get_collection(UserStats).insert_one({
+            'user_id': '123456789012345678901234', 'total_activities': 1, 'total_calories': 10,
+            'total_duration': 5, 'by_type': {}, 'by_day': {}, 'updated_at': self.now - timedelta(days=1),
+        })
+
+        self.assertEqual(rebuild_user_stats(), 1)
+        self.assertEqual(list(get_collection(UserStats).find({}, {'_id': 1})), [{'_id': stats_id}])
+
+    def test_unknown_user_and_bad_weeks(self):
+        self.assertEqual(self.client.get('/api/users/123456789012345678901234/stats/').status_code,
+                         status.HTTP_404_NOT_FOUND)
+        response = self.client.get(f'/api/users/{self.user._id}/stats/?weeks=0')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_streaks(self):
+        days = ['2024-01-01', '2024-01-02', '2024-01-03', '2024-01-07', '2024-01-08']
+        self.assertEqual(streaks(days, date(2024, 1, 9)), (2, 3))
+        self.assertEqual(streaks(days, date(2024, 1, 10)), (0, 3))
+        self.assertEqual(streaks([], date(2024, 1, 10)), (0, 0))
+
+
+class AsyncReadViewTest(APITestCase):
+    def setUp(self):
+        team = Team.objects.create(name="Async Team", description="Non-blocking")
+        user = User.objects.create(name="Async User", email="async@example.com", password="testpass123",
+                                   team_id=str(team._id))
+        for i in range(5):
+            Activity.objects.create(
+                user_id=str(user._id),
+                activity_type="Running",
+                duration=30,
+                calories_burned=100 * i,
+                date=datetime(2024, 6, 1, 7, 0, tzinfo=dt_timezone.utc) + timedelta(days=i % 3)
+            )
+        Leaderboard.objects.create(user_id=str(user._id), team_id=str(team._id), total_activities=5,
+                                   total_calories=1000, total_duration=150, rank=1)
+        Workout.objects.create(name="Async Intervals", description="", activity_type="Running",
+                               difficulty="Hard", duration=20, calories_estimate=250)
+
+    def async_get(self, url):
+        response = async_to_sync(self.async_client.get)(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return json.loads(response.content)
+
+    def test_pages_match_sync_lists(self):
+        for endpoint in ('activities', 'leaderboard', 'teams', 'workouts'):
+            with self.subTest(endpoint=endpoint):
+                sync_url, async_url = f'/api/{endpoint}/?page_size=2', f'/api/async/{endpoint}/?page_size=2'
+                while sync_url:
+                    get_response_cache().clear()
+                    sync_page = json.loads(self.client.get(sync_url).content)
+                    async_page = self.async_get(async_url)
+                    self.assertEqual(async_page['results'], sync_page['results'])
+                    self.assertEqual(bool(async_page['next']), bool(sync_page['next']))
+                    sync_url, async_url = sync_page['next'], async_page['next']
+
+    def test_invalid_cursor_and_method(self):
+        response = async_to_sync(self.async_client.get)('/api/async/workouts/?cursor=bogus')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = async_to_sync(self.async_client.post)('/api/async/workouts/')
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class PoolStatsTest(APITestCase):
+    def test_listener_tracks_check_outs_and_exhaustion(self):
+        listener = PoolStatsListener()
+        address = ('db.example.com', 27017)
+        listener.pool_created(monitoring.PoolCreatedEvent(address, {}))
+        for connection_id in (1, 2):
+            listener.connection_created(monitoring.ConnectionCreatedEvent(address, connection_id))
+            listener.connection_check_out_started(monitoring.ConnectionCheckOutStartedEvent(address))
+            listener.connection_checked_out(monitoring.ConnectionCheckedOutEvent(address, connection_id))
+        listener.connection_checked_in(monitoring.ConnectionCheckedInEvent(address, 1))
+        listener.connection_check_out_started(monitoring.ConnectionCheckOutStartedEvent(address))
+        listener.connection_check_out_failed(monitoring.ConnectionCheckOutFailedEvent(
+            address, monitoring.ConnectionCheckOutFailedReason.TIMEOUT))
+
+        server = listener.snapshot()['db.example.com:27017']
+        self.assertEqual(server['open'], 2)
+        self.assertEqual(server['checked_out'], 1)
+        self.assertEqual(server['max_checked_out'], 2)
+        self.assertEqual(server['check_outs'], 2)
+        self.assertEqual(server['failures'], {'timeout': 1})
+        self.assertIsNotNone(server['wait_ms']['p95'])
+
+        listener.reset()
+        self.assertEqual(listener.snapshot()['db.example.com:27017']['check_outs'], 0)
+
+    def test_endpoint_reports_settings_and_live_pool(self):
+        User.objects.count()
+        self.assertEqual(self.client.get('/api/pool-stats/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'adminpass123'))
+        response = self.client.get('/api/pool-stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['settings']['maxPoolSize'], connection.settings_dict['CLIENT']['maxPoolSize'])
+        self.assertTrue(any(server['check_outs'] for server in response.data['servers'].values()))
+
+
+class RequestMetricsTest(APITestCase):
+    def setUp(self):
+        user = User.objects.create(name="Metrics User", email="metrics@example.com", password="testpass123")
+        Activity.objects.create(user_id=str(user._id), activity_type="Yoga", duration=45,
+                                calories_burned=150, date=timezone.now())
+        self.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'adminpass123')
+        self.client.force_authenticate(self.admin)
+        self.client.delete('/api/metrics/')
+        self.client.force_authenticate(None)
+
+    def server_timing(self, response):
+        return dict(
+            (part.split(';')[0].strip(), part) for part in response['Server-Timing'].split(',')
+        )
+
+    def test_server_timing_counts_mongo_queries(self):
+        response = self.client.get('/api/activities/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'db', 'app', 'serialize', 'render', 'total'})
+        queries = int(timing['db'].split('desc="')[1].split(' ')[0])
+        # The compiled list reads the page and resolves the user names
+        self.assertGreaterEqual(queries, 2)
+
+    def test_serializer_work_is_timed(self):
+        # Compiled rendering and the DRF serializers alike
+        for compiled in (True, False):
+            with self.subTest(compiled=compiled), override_settings(OCTOFIT_COMPILED_SERIALIZERS=compiled):
+                response = self.client.get('/api/activities/')
+                self.assertGreater(float(self.server_timing(response)['serialize'].split('dur=')[1]), 0)
+
+    def test_metrics_endpoint_reports_routes(self):
+        for _ in range(3):
+            self.client.get('/api/activities/')
+        self.assertEqual(self.client.get('/api/metrics/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.delete('/api/metrics/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(self.admin)
+        routes = self.client.get('/api/metrics/').data['routes']
+        activity_list = routes['GET activity-list']
+        self.assertEqual(activity_list['count'], 3)
+        self.assertEqual(sum(activity_list['histogram_ms'].values()), 3)
+        self.assertGreater(activity_list['queries']['p50'], 0)
+        self.assertIsNotNone(activity_list['serialize_ms']['p50'])
+        self.assertIsNotNone(activity_list['total_ms']['p99'])
+
+
+class ApiBenchmarkTest(APITestCase):
+    def setUp(self):
+        team = Team.objects.create(name="Bench Team", description="")
+        User.objects.create(name="Bench User", email="bench@example.com", password="testpass123",
+                            team_id=str(team._id))
+
+    def test_every_router_endpoint_is_measured(self):
+        results = ApiBenchmark(repeat=2, warmup=0, page_size=10).run()
+        measured = {(row['endpoint'], row['action']) for row in results}
+        for endpoint in ('users', 'teams', 'activities', 'leaderboard', 'workouts'):
+            self.assertIn((endpoint, 'list'), measured)
+            self.assertIn((endpoint, 'create'), measured)
+        self.assertIn(('users', 'retrieve'), measured)
+        for row in results:
+            self.assertEqual(row['requests'], 2)
+            self.assertGreater(row['throughput_rps'], 0)
+
+    def test_compare_reports_p50_change(self):
+        def report(p50):
+            return {'results': [{'endpoint': 'users', 'action': 'list', 'latency_ms': {'p50': p50}}]}
+        self.assertEqual(list(compare(report(10.0), report(15.0))), [('users', 'list', 10.0, 15.0, 0.5)])
+
+
+class DenormalizedNamesTest(APITestCase):
+    def setUp(self):
+        self.team = Team.objects.create(name="Blue", description="")
+        self.user = User.objects.create(
+            name="Dana", email="dana@example.com", password="testpass123", team_id=str(self.team._id)
+        )
+
+    def log_activity(self):
+        response = self.client.post('/api/activities/', {
+            'user_id': str(self.user._id),
+            'activity_type': 'Running',
+            'duration': 30,
+            'calories_burned': 300,
+            'date': timezone.now().isoformat()
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def test_names_are_written_on_insert(self):
+        self.log_activity()
+        activity = get_collection(Activity).find_one({'user_id': str(self.user._id)})
+        entry = get_collection(Leaderboard).find_one({'user_id': str(self.user._id)})
+        self.assertEqual(activity['user_name'], "Dana")
+        self.assertEqual((entry['user_name'], entry['team_name']), ("Dana", "Blue"))
+
+    def test_renames_fan_out(self):
+        self.log_activity()
+        self.log_activity()
+        self.client.patch(f'/api/users/{self.user._id}/', {'name': "Dana S."})
+        self.client.patch(f'/api/teams/{self.team._id}/', {'name': "Navy"})
+
+        activities = self.client.get('/api/activities/').data['results']
+        self.assertEqual({activity['user'] for activity in activities}, {"Dana S."})
+        self.assertEqual(get_collection(Activity).count_documents({'user_name': "Dana S."}), 2)
+        entry = self.client.get('/api/leaderboard/').data['results'][0]
+        self.assertEqual((entry['user'], entry['team']), ("Dana S.", "Navy"))
+        self.assertEqual(self.client.get('/api/leaderboard/teams/').data['results'][0]['team'], "Navy")
+
+    def test_denormalized_name_is_rendered_without_lookup(self):
+        Activity.objects.create(
+            user_id='123456789012345678901234', user_name="Archived", activity_type="Yoga",
+            duration=20, calories_burned=100, date=timezone.now()
+        )
+        for url in ('/api/activities/', '/api/activities/?fields=user'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).data['results'][0]['user'], "Archived")
+
+    def test_backfill_fills_missing_names_in_chunks(self):
+        for day in range(5):
+            Activity.objects.create(
+                user_id=str(self.user._id), activity_type="Running", duration=30,
+                calories_burned=300, date=timezone.now() - timedelta(days=day)
+            )
+        Leaderboard.objects.create(
+            user_id=str(self.user._id), team_id=str(self.team._id), total_activities=5,
+            total_calories=1500, total_duration=150
+        )
+        call_command('backfill_names', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(get_collection(Activity).count_documents({'user_name': "Dana"}), 5)
+        entry = get_collection(Leaderboard).find_one({'user_id': str(self.user._id)})
+        self.assertEqual((entry['user_name'], entry['team_name']), ("Dana", "Blue"))
+
+
+@override_settings(OCTOFIT_JOB_WORKER=False)
+class JobQueueTest(APITestCase):
+    def setUp(self):
+        ensure_indexes([Job])
+
+    def test_duplicate_pending_jobs_are_coalesced(self):
+        first = enqueue('recompute_leaderboard')
+        second = enqueue('recompute_leaderboard')
+        self.assertEqual(first['_id'], second['_id'])
+        self.assertEqual(second['requests'], 2)
+
+        self.assertEqual(run_pending(), 1)
+        job = get_collection(Job).find_one({'_id': first['_id']})
+        self.assertEqual(job['status'], Job.DONE)
+        self.assertEqual(job['pending_key'], str(job['_id']))
+        self.assertNotEqual(enqueue('recompute_leaderboard')['_id'], first['_id'])
+
+    def test_jobs_of_a_kind_run_one_after_another_with_a_plain_unique_index(self):
+        # What djongo's schema editor builds: unique, but not sparse
+        collection = get_collection(Job)
+        collection.drop_indexes()
+        collection.create_index('pending_key', unique=True)
+        ensure_indexes([Job])
+
+        ids = []
+        for _ in range(3):
+            ids.append(enqueue('rebuild_rollups')['_id'])
+            self.assertEqual(run_pending(), 1)
+        self.assertEqual(len(set(ids)), 3)
+        self.assertEqual(collection.count_documents({'status': Job.DONE}), 3)
+
+    def test_failed_job_records_the_error(self):
+        job = enqueue('recompute_leaderboard')
+        get_collection(Job).update_one({'_id': job['_id']}, {'$set': {'kind': 'missing'}})
+        run_pending()
+        job = get_collection(Job).find_one({'_id': job['_id']})
+        self.assertEqual(job['status'], Job.FAILED)
+        self.assertIn('KeyError', job['error'])
+
+    def test_jobs_endpoint_is_admin_only(self):
+        self.assertEqual(self.client.get('/api/jobs/').status_code, status.HTTP_401_UNAUTHORIZED)
+        admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'adminpass123')
+        self.client.force_authenticate(admin)
+
+        response = self.client.post('/api/jobs/', {'kind': 'rebuild_rollups'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], Job.PENDING)
+        response = self.client.post('/api/jobs/', {'kind': 'unknown'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/jobs/?status=pending')
+        self.assertEqual([job['kind'] for job in response.data['results']], ['rebuild_rollups'])
+
+
+class LeaderboardIndexTest(APITestCase):
+    def setUp(self):
+        leaderboard_index.invalidate()
+        self.team = Team.objects.create(name="Index Team", description="")
+        self.users = []
+        # Points: 3010, 2010, 2010, 1010
+        for number, calories in enumerate([30000, 20000, 20000, 10000], start=1):
+            user = User.objects.create(
+                name=f"Index User {number}", email=f"index{number}@example.com",
+                password="testpass123", team_id=str(self.team._id)
+            )
+            Leaderboard.objects.create(
+                user_id=str(user._id), team_id=str(self.team._id), total_activities=1,
+                total_calories=calories, total_duration=30
+            )
+            self.users.append(user)
+
+    def test_top_k_and_rank(self):
+        response = self.client.get('/api/leaderboard/top/?k=3')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = response.data['results']
+        self.assertEqual([row['rank'] for row in rows], [1, 2, 2])
+        self.assertEqual(rows[0]['user'], "Index User 1")
+        self.assertEqual(rows[0]['team'], "Index Team")
+        self.assertEqual(rows[0]['total_points'], 3010)
+
+        response = self.client.get(f'/api/leaderboard/rank/{self.users[3]._id}/')
+        self.assertEqual((response.data['rank'], response.data['total_points']), (4, 1010))
+        self.assertEqual(self.client.get('/api/leaderboard/rank/123456789012345678901234/').status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/api/leaderboard/top/?k=0').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_index_follows_activity_writes(self):
+        index = LeaderboardIndex(sync_interval=0)
+        self.assertEqual(index.rank(str(self.users[3]._id))['rank'], 4)
+        response = self.client.post('/api/activities/', {
+            'user_id': str(self.users[3]._id),
+            'activity_type': 'Cycling',
+            'duration': 60,
+            'calories_burned': 25000,
+            'date': timezone.now().isoformat()
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        entry = index.rank(str(self.users[3]._id))
+        self.assertEqual((entry['rank'], entry['total_points']), (1, 3520))
+        self.assertEqual(index.top(1)[0]['user_id'], str(self.users[3]._id))
+        self.assertEqual(index.check()['problems'], {})
+
+    def test_check_reports_stale_entries(self):
+        index = LeaderboardIndex(sync_interval=3600)
+        index.top(1)
+        get_collection(Leaderboard).update_one({'user_id': str(self.users[0]._id)}, {'$set': {'total_calories': 0}})
+        report = index.check()
+        self.assertEqual(report['checked'], 4)
+        self.assertEqual(report['problems']['wrong_rank']['count'], 4)
+
+    def test_check_endpoint_reports_drift_in_the_live_index(self):
+        # Hold off syncs, which would re-read the entries and repair them
+        sync_interval = leaderboard_index.sync_interval
+        leaderboard_index.sync_interval = 3600
+        self.addCleanup(setattr, leaderboard_index, 'sync_interval', sync_interval)
+        self.client.get('/api/leaderboard/top/')
+
+        self.assertEqual(self.client.get('/api/leaderboard/index-check/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'adminpass123'))
+        response = self.client.get('/api/leaderboard/index-check/')
+        self.assertEqual((response.data['checked'], response.data['problems']), (4, {}))
+
+        leaderboard_index._entries[str(self.users[3]._id)]['total_points'] = 5000
+        del leaderboard_index._entries[str(self.users[0]._id)]
+        problems = self.client.get('/api/leaderboard/index-check/?examples=1').data['problems']
+        self.assertEqual(problems['missing']['examples'], [str(self.users[0]._id)])
+        self.assertEqual(problems['wrong_rank']['examples'][0]['user_id'], str(self.users[3]._id))
+        self.assertIn('inconsistent', problems)
+
+    def test_check_command_needs_a_server(self):
+        with self.assertRaises(CommandError):
+            call_command('check_leaderboard_index', stdout=StringIO())
+
+
+class RankingTest(APITestCase):
+    # (team, calories) -> rank, dense_rank, team_rank, team_dense_rank
+    EXPECTED = {
+        ('a', 500): (1, 1, 1, 1),
+        ('b', 500): (1, 1, 1, 1),
+        ('a', 300): (3, 2, 2, 2),
+        ('a', 300, 2): (3, 2, 2, 2),
+        ('b', 100): (5, 3, 2, 2),
+        ('a', 50): (6, 4, 4, 3),
+    }
+
+    def setUp(self):
+        for index, key in enumerate(self.EXPECTED):
+            Leaderboard.objects.create(
+                user_id=f'{index:024d}', team_id=key[0], total_activities=1,
+                total_calories=key[1], total_duration=30, rank=99
+            )
+
+    def assert_ranks(self):
+        for index, expected in enumerate(self.EXPECTED.values()):
+            entry = get_collection(Leaderboard).find_one({'user_id': f'{index:024d}'})
+            self.assertEqual(tuple(entry[field] for field in ('rank', 'dense_rank', 'team_rank', 'team_dense_rank')),
+                             expected)
+
+    def test_streamed_ranks_restart_per_partition(self):
+        rows = [{'t': 'a', 'v': 9}, {'t': 'a', 'v': 9}, {'t': 'a', 'v': 4}, {'t': 'b', 'v': 4}]
+        self.assertEqual([ranks for _, *ranks in streamed_ranks(rows, 'v', 't')], [[1, 1], [1, 1], [3, 2], [1, 1]])
+        self.assertEqual([ranks for _, *ranks in streamed_ranks(rows, 'v')], [[1, 1], [1, 1], [3, 2], [3, 2]])
+
+    def test_batched_fallback(self):
+        self.assertEqual(rank_leaderboard(chunk_size=2, use_windows=False), {'method': 'batched', 'updated': 12})
+        self.assert_ranks()
+        self.assertEqual(rank_leaderboard(use_windows=False)['updated'], 0)
+
+    def test_window_functions(self):
+        if not supports_window_functions():
+            self.skipTest("MongoDB 5.0+ is needed for $setWindowFields")
+        self.assertEqual(rank_leaderboard()['method'], 'window')
+        self.assert_ranks()
+
+    def test_period_ranks(self):
+        user = User.objects.create(name="Period User", email="period@example.com", password="testpass123")
+        for calories, days_ago in ((400, 0), (300, 3)):
+            self.client.post('/api/activities/', {
+                'user_id': str(user._id), 'activity_type': 'Running', 'duration': 30,
+                'calories_burned': calories, 'date': (timezone.now() - timedelta(days=days_ago)).isoformat()
+            })
+        for use_windows in {False, supports_window_functions()}:
+            with self.subTest(use_windows=use_windows):
+                self.assertEqual(rank_periods(use_windows=use_windows), {'day': 1, 'week': 1, 'month': 1})
+                response = self.client.get(f'/api/leaderboard/rank/{user._id}/?period=week')
+                self.assertEqual((response.data['total_calories'], response.data['rank'],
+                                  response.data['dense_rank']), (700, 1, 1))
+        self.assertEqual(PeriodRank.objects.count(), 3)
+
+
+# A cheap hasher keeps the tests fast; the production default is PBKDF2
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AuthenticationTest(APITestCase):
+    def setUp(self):
+        response = self.client.post('/api/users/', {
+            'name': "Auth User", 'email': 'auth@example.com', 'password': 'authpass123'
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.user_id = response.data['id']
+
+    def login(self, password='authpass123'):
+        return self.client.post('/api/auth/login/', {'email': 'auth@example.com', 'password': password})
+
+    def test_password_is_hashed_on_write(self):
+        stored = User.objects.get(email='auth@example.com').password
+        self.assertTrue(stored.startswith('md5$'))
+        self.assertTrue(check_password('authpass123', stored))
+
+    def test_login_issues_a_token(self):
+        self.assertEqual(self.login('wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.login()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user_id'], self.user_id)
+
+        self.assertEqual(self.client.get('/api/auth/me/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['token']}")
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/auth/me/')
+        self.assertEqual(response.data, {'user_id': self.user_id})
+        self.assertEqual(len(context), 0)
+
+    def test_tampered_and_expired_tokens_are_rejected(self):
+        token = issue_token(self.user_id)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}x')
+        self.assertEqual(self.client.get('/api/auth/me/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with override_settings(OCTOFIT_TOKEN_MAX_AGE=-1):
+            self.assertEqual(self.client.get('/api/auth/me/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_legacy_plain_text_password_is_upgraded(self):
+        get_collection(User).update_one({'email': 'auth@example.com'}, {'$set': {'password': 'authpass123'}})
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        self.assertTrue(User.objects.get(email='auth@example.com').password.startswith('md5$'))
+
+    @override_settings(OCTOFIT_PASSWORD_HASHER='sha1', PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.MD5PasswordHasher', 'django.contrib.auth.hashers.SHA1PasswordHasher',
+    ])
+    def test_configured_hasher(self):
+        self.assertTrue(hash_password('secret').startswith('sha1$'))
+        # Hashes from another hasher are rehashed with the configured one on login
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        self.assertTrue(User.objects.get(email='auth@example.com').password.startswith('sha1$'))
+
+
+class ActivitySyncTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(name="Sync User", email="sync@example.com", password="testpass123")
+        self.user_id = str(self.user._id)
+        for i in range(4):
+            response = self.client.post('/api/activities/', {
+                'user_id': self.user_id, 'activity_type': 'Running', 'duration': 30 + i,
+                'calories_burned': 300, 'date': '2024-01-01T07:00:00Z',
+            })
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # Backdate the writes, so the test's own writes come strictly after them
+        self.synced_at = datetime(2024, 1, 2, tzinfo=dt_timezone.utc)
+        get_collection(Activity).update_many({}, {'$set': {'updated_at': self.synced_at}})
+
+    def sync(self, since, **params):
+        return self.client.get('/api/activities/', dict(params, since=since))
+
+    def test_since_returns_only_changes_and_deletes(self):
+        response = self.sync('2024-01-02T00:00:00Z')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['results'], response.data['deleted']), ([], []))
+
+        activities = list(Activity.objects.order_by('duration'))
+        self.client.patch(f'/api/activities/{activities[0]._id}/', {'notes': "Edited"})
+        self.client.delete(f'/api/activities/{activities[1]._id}/')
+        response = self.sync('2024-01-02T00:00:00Z', user_id=self.user_id)
+        self.assertEqual([activity['notes'] for activity in response.data['results']], ["Edited"])
+        self.assertEqual([deleted['id'] for deleted in response.data['deleted']], [str(activities[1]._id)])
+        self.assertEqual(ActivityTombstone.objects.count(), 1)
+
+        # The returned cursor covers everything seen so far
+        response = self.sync(response.data['since'])
+        self.assertEqual((response.data['results'], response.data['deleted']), ([], []))
+
+    def test_delta_pages_in_write_order(self):
+        for minute, activity in enumerate(Activity.objects.order_by('-duration'), start=1):
+            get_collection(Activity).update_one(
+                {'_id': activity._id}, {'$set': {'updated_at': self.synced_at + timedelta(minutes=minute)}},
+            )
+        response = self.sync('2024-01-02T00:00:00Z', page_size=3)
+        seen = [activity['duration'] for activity in response.data['results']]
+        self.assertIsNone(response.data['since'])
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen.extend(activity['duration'] for activity in response.data['results'])
+        self.assertEqual(seen, [33, 32, 31, 30])
+        self.assertIsNotNone(response.data['since'])
+
+    def test_if_modified_since(self):
+        response = self.client.get('/api/activities/')
+        self.assertEqual(response['Last-Modified'], http_date(self.synced_at.timestamp()))
+
+        headers = {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']}
+        self.assertEqual(self.client.get('/api/activities/', **headers).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(
+            self.client.get('/api/activities/', {'since': '2024-01-01T00:00:00Z'}, **headers).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+        self.client.delete(f'/api/activities/{Activity.objects.first()._id}/')
+        self.assertEqual(self.client.get('/api/activities/', **headers).status_code, status.HTTP_200_OK)
+
+    def test_invalid_since(self):
+        self.assertEqual(self.sync('yesterday').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.sync('2024-01-01', ordering='duration').status_code, status.HTTP_400_BAD_REQUEST)
+        # An activity id stands for the time it was created
+        self.assertEqual(self.sync(str(Activity.objects.first()._id)).status_code, status.HTTP_200_OK)
@@ -0,0 +1,13 @@
+"""Helpers shared by the request metrics and the connection pool monitor."""
+
+
+def percentile(ordered, fraction):
+    """The value `fraction` of the way through the sorted `ordered`, or None when it is empty."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def milliseconds(seconds):
+    """`seconds` in milliseconds, rounded to microseconds; None stays None."""
+    return None if seconds is None else round(seconds * 1000, 3)
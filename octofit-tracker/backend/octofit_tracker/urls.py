@@ -26,8 +26,9 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
-    api_root, UserViewSet, TeamViewSet, ActivityViewSet,
+    api_root, current_user, jobs, login, mongo_pool_stats, request_metrics, UserViewSet, TeamViewSet, ActivityViewSet,
     LeaderboardViewSet, WorkoutViewSet
 )
 
@@ -38,8 +39,22 @@ router.register(r'activities', ActivityViewSet, basename='activity')
 router.register(r'leaderboard', LeaderboardViewSet, basename='leaderboard')
 router.register(r'workouts', WorkoutViewSet, basename='workout')
 
+# Non-blocking variants of the hot list endpoints, for ASGI servers
+async_urlpatterns = [
+    path('activities/', async_views.activity_list, name='async-activity-list'),
+    path('leaderboard/', async_views.leaderboard_list, name='async-leaderboard-list'),
+    path('teams/', async_views.team_list, name='async-team-list'),
+    path('workouts/', async_views.workout_list, name='async-workout-list'),
+]
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', api_root, name='api-root'),
+    path('api/async/', include(async_urlpatterns)),
+    path('api/pool-stats/', mongo_pool_stats, name='pool-stats'),
+    path('api/metrics/', request_metrics, name='metrics'),
+    path('api/jobs/', jobs, name='jobs'),
+    path('api/auth/login/', login, name='auth-login'),
+    path('api/auth/me/', current_user, name='auth-me'),
     path('api/', include(router.urls)),
 ]
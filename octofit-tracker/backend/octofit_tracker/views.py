@@ -1,14 +1,61 @@
-from rest_framework import viewsets
-from rest_framework.decorators import api_view
+import copy
+
+from bson import ObjectId
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from rest_framework import status, viewsets
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed, NotFound, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
+from rest_framework.utils.urls import replace_query_param
+from .auth import authenticate_credentials, issue_token, token_max_age
+from .cache import CachedListMixin, CacheInvalidationMixin, invalidate
 from .models import User, Team, Activity, Leaderboard, Workout
+from .leaderboard import (
+    PERIOD_DAYS, TEAM_LEADERBOARD_CACHE_KEY, apply_activity_changes, period_leaderboard, team_leaderboard,
+)
+from .mongo import get_collection, resolve_names
+from .denormalize import propagate_team_name, propagate_user_name
+from .compiled import compiled_activities, compiled_leaderboard, compiled_workouts
+from .export import export_response
+from .jobs import JOB_KINDS, enqueue, format_job, recent_jobs
+from .leaderboard_index import format_ranked, leaderboard_index
+from .ranking import period_rank
+from .stats import MAX_STATS_WEEKS, STATS_WEEKS, user_stats
+from .sync import (
+    deleted_since, if_modified_since, last_modified, modified_since, parse_since, record_deletions,
+    set_last_modified,
+)
+from .filters import StableOrderingFilter
+from .native import NativeReadMixin, format_datetime, format_teams, format_users
+from .pagination import (
+    ActivityCursorPagination, ActivitySyncPagination, LeaderboardCursorPagination, decode_period_cursor,
+    encode_period_cursor,
+)
+from .metrics import metrics_registry
+from .parsers import NDJSONParser
+from .pool import pool_stats
 from .serializers import (
     UserSerializer, TeamSerializer, ActivitySerializer,
     LeaderboardSerializer, WorkoutSerializer
 )
 
 
+def count_team_members(team_ids):
+    """Member count per team id, computed with a single `$group` aggregation."""
+    if not team_ids:
+        return {}
+    pipeline = [
+        {'$match': {'team_id': {'$in': team_ids}}},
+        {'$group': {'_id': '$team_id', 'count': {'$sum': 1}}},
+    ]
+    return {row['_id']: row['count'] for row in get_collection(User).aggregate(pipeline)}
+
+
 @api_view(['GET'])
 def api_root(request, format=None):
     return Response({
@@ -20,26 +67,398 @@ def api_root(request, format=None):
     })
 
 
-class UserViewSet(viewsets.ModelViewSet):
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def mongo_pool_stats(request, format=None):
+    """Pool settings and live connection usage of this process's Mongo clients."""
+    return Response(pool_stats(connection.settings_dict.get('CLIENT', {})))
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def request_metrics(request, format=None):
+    """
+    Per-route query count, DB, serialization, render and total time
+    percentiles, plus a histogram of total time, for the requests this
+    process served. DELETE clears them.
+    """
+    if request.method == 'DELETE':
+        metrics_registry.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response({'routes': metrics_registry.snapshot()})
+
+
+@api_view(['POST'])
+def login(request, format=None):
+    """
+    Exchange an email and password for a Bearer token. The password hash is
+    checked here only; requests made with the token just verify its signature.
+    """
+    email, password = request.data.get('email'), request.data.get('password')
+    if not email or not password:
+        raise ValidationError({'non_field_errors': ["Both email and password are required."]})
+    user_id = authenticate_credentials(email, password)
+    if user_id is None:
+        raise AuthenticationFailed("Invalid email or password.")
+    return Response({
+        'token': issue_token(user_id),
+        'token_type': 'Bearer',
+        'expires_in': token_max_age(),
+        'user_id': user_id,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def current_user(request, format=None):
+    return Response({'user_id': request.user.id})
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAdminUser])
+def jobs(request, format=None):
+    """
+    Recent background jobs, newest first (`?status=` to filter). POST
+    `{"kind": ...}` queues a job, or returns the pending one of that kind.
+    """
+    if request.method == 'POST':
+        kind = request.data.get('kind')
+        if kind not in JOB_KINDS:
+            raise ValidationError({'kind': f"Expected one of: {', '.join(JOB_KINDS)}."})
+        return Response(format_job(enqueue(kind)), status=status.HTTP_202_ACCEPTED)
+    return Response({'results': recent_jobs(status=request.query_params.get('status'))})
+
+
+class UserViewSet(CacheInvalidationMixin, NativeReadMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    # Member counts and leaderboard names depend on users
+    invalidates = ('team', 'leaderboard')
+    native_projection = {'password': 0}
+    filterset_fields = ('team_id',)
+    ordering = ('_id',)
+    ordering_fields = ('_id', 'name', 'created_at')
+
+    def format_documents(self, documents, fields=None):
+        return format_users(documents, fields)
 
+    def perform_update(self, serializer):
+        previous_name = serializer.instance.name
+        super().perform_update(serializer)
+        user = serializer.instance
+        if user.name != previous_name:
+            # Rewrite the copies on the user's activities and leaderboard
+            # entry, then drop pages cached while the fan-out ran
+            propagate_user_name(str(user._id), user.name)
+            invalidate(*self.get_invalidated_namespaces())
 
-class TeamViewSet(viewsets.ModelViewSet):
+    @action(detail=True, url_path='stats')
+    def stats(self, request, pk=None):
+        """
+        Totals, per-activity-type breakdown, weekly trend (`?weeks=`, default
+        12) and streaks, served from the user's precomputed rollup.
+        """
+        try:
+            weeks = int(request.query_params.get('weeks', STATS_WEEKS))
+        except ValueError:
+            weeks = 0
+        if not 1 <= weeks <= MAX_STATS_WEEKS:
+            raise ValidationError({'weeks': f"Expected a number of weeks from 1 to {MAX_STATS_WEEKS}."})
+        return Response(user_stats(pk, weeks))
+
+
+class TeamViewSet(CachedListMixin, NativeReadMixin, viewsets.ModelViewSet):
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
+    cache_namespace = 'team'
+    invalidates = ('leaderboard',)
+    ordering = ('_id',)
+    ordering_fields = ('_id', 'name', 'created_at')
+
+    def format_documents(self, documents, fields=None):
+        member_counts = {}
+        if fields is None or 'member_count' in fields:
+            member_counts = count_team_members([str(document['_id']) for document in documents])
+        return format_teams(documents, member_counts, fields)
 
+    def perform_update(self, serializer):
+        previous_name = serializer.instance.name
+        super().perform_update(serializer)
+        team = serializer.instance
+        if team.name != previous_name:
+            propagate_team_name(str(team._id), team.name)
+            cache.delete(TEAM_LEADERBOARD_CACHE_KEY)
+            invalidate(*self.get_invalidated_namespaces())
 
-class ActivityViewSet(viewsets.ModelViewSet):
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and args:
+            # Count the members of every team on the page in one aggregation
+            teams = list(args[0])
+            context = self.get_serializer_context()
+            context['member_counts'] = count_team_members([str(team._id) for team in teams])
+            kwargs['context'] = context
+            args = (teams,) + args[1:]
+        return super().get_serializer(*args, **kwargs)
+
+
+class ActivityViewSet(NativeReadMixin, viewsets.ModelViewSet):
     queryset = Activity.objects.all()
     serializer_class = ActivitySerializer
+    pagination_class = ActivityCursorPagination
+    compiled_list = True
+    filterset_fields = ('user_id', 'team_id', 'activity_type', 'date__gte', 'date__lte')
+    ordering = ActivityCursorPagination.ordering
+    ordering_fields = ('date', 'duration', 'calories_burned', '_id')
+
+    def format_documents(self, documents, fields=None):
+        return compiled_activities.to_representation(documents, fields)
 
+    def filter_team_id(self, queryset, team_id):
+        member_ids = [str(user_id) for user_id in User.objects.filter(team_id=team_id).values_list('_id', flat=True)]
+        return queryset.filter(user_id__in=member_ids)
 
-class LeaderboardViewSet(viewsets.ModelViewSet):
+    def get_since(self):
+        value = self.request.query_params.get('since')
+        if not value:
+            return None
+        try:
+            return parse_since(value)
+        except ValueError:
+            raise ValidationError({'since': "Expected an ISO 8601 timestamp or an activity id."})
+
+    def list(self, request, *args, **kwargs):
+        """
+        The feed, or with `?since=` only what changed after the cursor (see
+        sync.py). Both answer If-Modified-Since with a 304 when nothing changed.
+        """
+        since = self.get_since()
+        if since is not None:
+            if request.query_params.get(StableOrderingFilter.ordering_param):
+                raise ValidationError({'ordering': "Delta syncs are always in write order."})
+            # Set before filtering: ?fields= also projects the ordering columns
+            self.pagination_class = ActivitySyncPagination
+            self.ordering = ActivitySyncPagination.ordering
+        feed = self.filter_queryset(self.native_query())
+        checked_at = if_modified_since(request)
+        if checked_at is not None and not modified_since(feed.query, checked_at):
+            return set_last_modified(Response(status=status.HTTP_304_NOT_MODIFIED), checked_at)
+
+        modified = last_modified(feed.query)
+        if since is None:
+            return set_last_modified(super().list(request, *args, **kwargs), modified)
+        page = self.paginate_queryset(feed.filter(updated_at__gt=since))
+        response = self.get_paginated_response(self.render_documents(page, self.get_requested_fields()))
+        last_page = response.data['next'] is None
+        # Deletes and the next cursor come last, after every write they cover
+        response.data['deleted'] = deleted_since(feed.query, since) if last_page else []
+        response.data['since'] = format_datetime(modified or since) if last_page else None
+        return set_last_modified(response, modified)
+
+    def perform_create(self, serializer):
+        activity = serializer.save()
+        apply_activity_changes(added=[activity])
+
+    def perform_update(self, serializer):
+        previous = copy.copy(serializer.instance)
+        activity = serializer.save()
+        if activity.user_id != previous.user_id:
+            # Gone from the previous user's feed
+            record_deletions([previous])
+        apply_activity_changes(added=[activity], removed=[previous])
+
+    def perform_destroy(self, instance):
+        # delete() clears the primary key, which the tombstone records
+        previous = copy.copy(instance)
+        instance.delete()
+        record_deletions([previous])
+        apply_activity_changes(removed=[previous])
+
+    # Largest batch accepted by a single bulk upload
+    bulk_max_items = 5000
+
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Create many activities from a JSON array or an NDJSON body. Invalid
+        items are reported by index; the valid ones are written with one
+        insert_many and the leaderboard is updated once per affected user.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'non_field_errors': ["Expected a list of activities."]})
+        if len(items) > self.bulk_max_items:
+            raise ValidationError({'non_field_errors': [f"At most {self.bulk_max_items} activities per request."]})
+
+        serializer = self.get_serializer()
+        activities, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                activities.append(Activity(_id=ObjectId(), **serializer.run_validation(item)))
+            except ValidationError as exc:
+                errors.append({'index': index, 'errors': exc.detail})
+
+        if activities:
+            # Denormalize the names of every uploader with one lookup
+            user_names = resolve_names(User, [activity.user_id for activity in activities])
+            updated_at = timezone.now()
+            for activity in activities:
+                activity.user_name = user_names.get(activity.user_id)
+                activity.updated_at = updated_at
+            fields = [
+                '_id', 'user_id', 'user_name', 'activity_type', 'duration', 'calories_burned', 'date', 'notes',
+                'updated_at',
+            ]
+            get_collection(Activity).insert_many(
+                [{field: getattr(activity, field) for field in fields} for activity in activities],
+                ordered=False,
+            )
+            apply_activity_changes(added=activities)
+
+        return Response(
+            {
+                'created': len(activities),
+                'ids': [str(activity._id) for activity in activities],
+                'errors': errors,
+            },
+            status=status.HTTP_201_CREATED if activities else status.HTTP_400_BAD_REQUEST,
+        )
+
+    @action(detail=False, url_path='export')
+    def export(self, request):
+        """
+        Stream every matching activity as JSON (default), NDJSON or CSV,
+        chosen with `?output=`. Filters: user_id, team_id, date__gte, date__lte.
+        """
+        return export_response(request.query_params)
+
+
+class LeaderboardViewSet(CachedListMixin, NativeReadMixin, viewsets.ModelViewSet):
     queryset = Leaderboard.objects.all()
     serializer_class = LeaderboardSerializer
+    pagination_class = LeaderboardCursorPagination
+    cache_namespace = 'leaderboard'
+    compiled_list = True
+    filterset_fields = ('user_id', 'team_id')
+    ordering = LeaderboardCursorPagination.ordering
+    ordering_fields = ('rank', 'total_activities', 'total_calories', 'total_duration', '_id')
+
+    def format_documents(self, documents, fields=None):
+        return compiled_leaderboard.to_representation(documents, fields)
 
+    def get_period(self):
+        period = self.request.query_params.get('period', 'all')
+        if period != 'all' and period not in PERIOD_DAYS:
+            raise ValidationError({'period': "Expected one of: day, week, month, all."})
+        return period
 
-class WorkoutViewSet(viewsets.ModelViewSet):
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request is not None:
+            context['period'] = self.get_period()
+        return context
+
+    def list(self, request, *args, **kwargs):
+        period = self.get_period()
+        if period == 'all':
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(request, lambda: self.period_list(request, period))
+
+    def period_list(self, request, period):
+        """
+        One page of a period leaderboard, merged from the daily buckets. Pages
+        are read forwards only, through a cursor on the last entry's (points,
+        user id) that also carries its position and rank, so a page is the
+        merge past that entry cut at the page size.
+        """
+        page_size = self.paginator.get_page_size(request)
+        after = decode_period_cursor(request.query_params.get(self.paginator.cursor_query_param))
+        entries = period_leaderboard(period, limit=page_size + 1, after=after)
+        next_url = None
+        if len(entries) > page_size:
+            entries = entries[:page_size]
+            last = entries[-1]
+            cursor = encode_period_cursor(
+                (after[0] if after else 0) + page_size, last.rank, last.total_points, last.user_id,
+            )
+            next_url = replace_query_param(
+                request.build_absolute_uri(), self.paginator.cursor_query_param, cursor,
+            )
+        serializer = self.get_serializer(entries, many=True)
+        return Response({'next': next_url, 'previous': None, 'results': serializer.data})
+
+    # Entries written directly bypass the incremental re-ranking, so have the
+    # job worker reassign every rank
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        enqueue('recompute_leaderboard')
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        enqueue('recompute_leaderboard')
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        enqueue('recompute_leaderboard')
+        # Deletions leave no updated_at for the index to sync from
+        leaderboard_index.invalidate()
+
+    # Largest `k` accepted by /top/
+    max_top_k = 100
+
+    @action(detail=False, url_path='top')
+    def top(self, request):
+        """The `k` (default 10) entries with the most points, from the in-memory index."""
+        try:
+            k = int(request.query_params.get('k', 10))
+        except ValueError:
+            k = 0
+        if not 1 <= k <= self.max_top_k:
+            raise ValidationError({'k': f"Expected a number from 1 to {self.max_top_k}."})
+        return Response({'results': format_ranked(leaderboard_index.top(k))})
+
+    @action(detail=False, url_path=r'rank/(?P<user_id>[^/.]+)')
+    def rank(self, request, user_id=None):
+        """
+        One user's points rank, from the in-memory index. With `?period=`,
+        the user's standard, dense and team ranks in that rolling window as
+        of the last ranking job instead.
+        """
+        period = self.get_period()
+        if period != 'all':
+            entry = period_rank(period, user_id)
+            if entry is None:
+                raise NotFound("No ranking for this user in this period.")
+            return Response(entry)
+        entry = leaderboard_index.rank(user_id)
+        if entry is None:
+            raise NotFound("No leaderboard entry for this user.")
+        return Response(format_ranked([entry])[0])
+
+    @action(detail=False, url_path='index-check', permission_classes=[IsAdminUser])
+    def index_check(self, request):
+        """
+        Compare this process's in-memory index with ranks computed from
+        scratch by Mongo; `?examples=` mismatches are listed per kind.
+        """
+        try:
+            examples = int(request.query_params.get('examples', 10))
+        except ValueError:
+            raise ValidationError({'examples': "Expected a number."})
+        return Response(leaderboard_index.check(limit=examples))
+
+    @action(detail=False, url_path='teams')
+    def teams(self, request):
+        return Response({'next': None, 'previous': None, 'results': team_leaderboard()})
+
+
+class WorkoutViewSet(CachedListMixin, NativeReadMixin, viewsets.ModelViewSet):
     queryset = Workout.objects.all()
     serializer_class = WorkoutSerializer
+    cache_namespace = 'workout'
+    compiled_list = True
+    filterset_fields = ('activity_type', 'difficulty')
+    ordering = ('_id',)
+    ordering_fields = ('_id', 'name', 'duration', 'calories_estimate')
+
+    def format_documents(self, documents, fields=None):
+        return compiled_workouts.to_representation(documents, fields)